@@ -1,5 +1,8 @@
 import os
+from typing import Optional
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
@@ -9,9 +12,56 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///email_automation.db")
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+_async_engine: Optional[AsyncEngine] = None
+_async_sessionmaker: Optional[async_sessionmaker] = None
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Async engine for the tracking endpoints, with its own pool
+
+    Built on first use so scripts and the scheduler never need the async driver. The
+    URL is DATABASE_URL with its driver swapped (asyncpg for Postgres) unless
+    ASYNC_DATABASE_URL is set.
+    """
+    global _async_engine
+    if _async_engine is None:
+        url = make_url(os.getenv("ASYNC_DATABASE_URL") or DATABASE_URL)
+        backend = url.get_backend_name()
+        url = url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+
+        pool_options = {}
+        if backend != "sqlite":
+            pool_options = {
+                "pool_size": int(os.getenv("TRACKING_DB_POOL_SIZE", 10)),
+                "max_overflow": int(os.getenv("TRACKING_DB_MAX_OVERFLOW", 10)),
+                "pool_timeout": float(os.getenv("TRACKING_DB_POOL_TIMEOUT", 5)),
+                "pool_recycle": 1800,
+                "pool_pre_ping": True
+            }
+        _async_engine = create_async_engine(url, **pool_options)
+    return _async_engine
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        _async_sessionmaker = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_sessionmaker = None
@@ -2,26 +2,56 @@
 import os
 import openai
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import base64
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import uuid
 import logging
 import socket
 import re
 import time
 import requests
+import threading
 from typing import Dict, Optional, Tuple
 from datetime import datetime
+from dataclasses import dataclass
 import pytz
 
 from logger_config import get_logger
 from modern_tracking_service import modern_tracker
+from services.gmail_clients import gmail_clients
+from services.rspamd_client import rspamd_client, RspamdError
+from services.circuit_breaker import CircuitOpenError, openai_breaker
 
 logger = get_logger(__name__)
 
+class GmailHandOffError(Exception):
+    """Gmail's send call failed after the message was handed over, so it may have been sent"""
+
+@dataclass
+class SendResult:
+    """Outcome of sending a single pre-generated draft"""
+    success: bool
+    tracking_id: str
+    gmail_message_id: Optional[str] = None
+    spam_score: Optional[float] = None
+    generation_seconds: Optional[float] = None
+    send_seconds: Optional[float] = None
+    error: Optional[str] = None
+    ambiguous: bool = False  # failed after the hand-off to Gmail; whether it went out is unknown
+
+    def to_dict(self) -> Dict:
+        return {
+            'success': self.success,
+            'tracking_id': self.tracking_id,
+            'gmail_message_id': self.gmail_message_id,
+            'spam_score': self.spam_score,
+            'generation_seconds': self.generation_seconds,
+            'send_seconds': self.send_seconds,
+            'error': self.error,
+            'ambiguous': self.ambiguous
+        }
+
 class EmailService:
     def __init__(self):
         logger.info("Initializing EmailService")
@@ -36,36 +66,59 @@ class EmailService:
             }, exc_info=True)
             raise
             
-        # Initialize Gmail service
-        self.gmail_service = self._setup_gmail()
+        # Gmail clients are built lazily and shared process-wide (services/gmail_clients.py)
         
-        # Rspamd config - use service name for Docker networking
-        self.rspamd_host = "rspamd"
-        self.rspamd_port = 11333  # Controller port (allows scanning)
-        self.rspamd_url = f"http://{self.rspamd_host}:{self.rspamd_port}"
+        # Rspamd scans go through the shared pooled, caching client (services/rspamd_client.py)
+        self.rspamd_url = rspamd_client.base_url
         
-    def _setup_gmail(self):
-        """Setup Gmail API service"""
-        logger.debug("Setting up Gmail API service")
+    def _gmail_key(self, sending_profile=None):
+        """Registry key for a mailbox; includes the stored credentials so rotated tokens get a fresh client"""
+        if sending_profile is not None and sending_profile.has_gmail_credentials:
+            return (sending_profile.id, sending_profile.gmail_client_id, sending_profile.gmail_refresh_token_encrypted)
+        return "default"
+
+    def _gmail_credentials(self, sending_profile=None) -> Credentials:
+        """OAuth credentials for a sending profile's mailbox, or the environment mailbox"""
+        if sending_profile is not None and sending_profile.has_gmail_credentials:
+            from services.credential_crypto import decrypt_secret
+            refresh_token = decrypt_secret(sending_profile.gmail_refresh_token_encrypted)
+            client_id = sending_profile.gmail_client_id or os.getenv('GMAIL_CLIENT_ID')
+            client_secret = decrypt_secret(sending_profile.gmail_client_secret_encrypted) or os.getenv('GMAIL_CLIENT_SECRET')
+        else:
+            refresh_token = os.getenv('GMAIL_REFRESH_TOKEN')
+            client_id = os.getenv('GMAIL_CLIENT_ID')
+            client_secret = os.getenv('GMAIL_CLIENT_SECRET')
         
+        return Credentials(
+            token=None,
+            refresh_token=refresh_token,
+            id_token=None,
+            client_id=client_id,
+            client_secret=client_secret,
+            token_uri='https://oauth2.googleapis.com/token'
+        )
+
+    def _setup_gmail(self, sending_profile=None):
+        """Setup Gmail API service for a sending profile's mailbox, or the environment mailbox"""
+        key = self._gmail_key(sending_profile)
         try:
-            creds = Credentials(
-                token=None,
-                refresh_token=os.getenv('GMAIL_REFRESH_TOKEN'),
-                id_token=None,
-                client_id=os.getenv('GMAIL_CLIENT_ID'),
-                client_secret=os.getenv('GMAIL_CLIENT_SECRET'),
-                token_uri='https://oauth2.googleapis.com/token'
-            )
-            service = build('gmail', 'v1', credentials=creds)
-            logger.info("Gmail API service setup successfully")
-            return service
+            return gmail_clients.get_service(key, lambda: self._gmail_credentials(sending_profile))
         except Exception as e:
+            gmail_clients.forget(key)
             logger.error("Failed to setup Gmail service", extra={
+                "sending_profile_id": sending_profile.id if sending_profile is not None else None,
                 "error": str(e), "error_type": type(e).__name__
             }, exc_info=True)
             return None
 
+    def get_gmail_service(self, sending_profile=None):
+        """Gmail client for the mailbox a sending profile sends through"""
+        return self._setup_gmail(sending_profile)
+
+    @property
+    def gmail_service(self):
+        return self._setup_gmail()
+
     def _generate_ai_email(self, lead, prompt_text, sending_profile=None, is_followup=False, previous_emails=None):
         """Generate email using OpenAI with spam checking"""
         logger.info("AI_GENERATION_STARTED: Starting AI email generation", extra={
@@ -150,11 +203,12 @@ FORMAT:
             try:
                 logger.info(f"AI_ATTEMPT: AI generation attempt {attempt}/{max_attempts}")
                 
-                # Generate with OpenAI
-                response = self.openai_client.chat.completions.create(
+                # Generate with OpenAI; the breaker fails fast during an outage and sets the timeout
+                response = openai_breaker.call(lambda timeout: self.openai_client.chat.completions.create(
                     model="gpt-5-nano",
                     messages=[{"role": "user", "content": ai_prompt}],
-                )
+                    timeout=timeout
+                ))
                 
                 response_text = response.choices[0].message.content.strip()
                 
@@ -181,6 +235,20 @@ FORMAT:
                     "spam_score": spam_score
                 })
                 
+                # Rspamd unavailable: degrade to an unchecked draft, explicitly flagged as such
+                if spam_score is None:
+                    logger.warning("RSPAMD_UNAVAILABLE: Rspamd unavailable, proceeding with unchecked email", extra={
+                        "attempt": attempt,
+                        "spam_report": spam_report
+                    })
+                    return {
+                        'subject': subject,
+                        'content': content,
+                        'spam_score': None,
+                        'spam_report': spam_report,
+                        'spam_check_skipped': True
+                    }
+                
                 # If not spam, return it (our spam detection logic above handles the score threshold)
                 if not is_spam:
                     logger.info(f"SPAM_CHECK_PASSED: Email passed spam check (Score: {spam_score}/7.5, Attempts: {attempt})", extra={
@@ -191,21 +259,8 @@ FORMAT:
                         'subject': subject,
                         'content': content, 
                         'spam_score': spam_score,
-                        'spam_report': spam_report
-                    }
-                
-                # TEMPORARY: If Rspamd fails but we have content, proceed anyway
-                if spam_score == 0.0 and attempt == 1:  # Likely Rspamd connection failed
-                    logger.warning("RSPAMD_UNAVAILABLE: Rspamd unavailable, proceeding with generated email", extra={
-                        "attempt": attempt,
-                        "subject_length": len(subject),
-                        "content_length": len(content)
-                    })
-                    return {
-                        'subject': subject,
-                        'content': content,
-                        'spam_score': 0.0,
-                        'spam_report': 'Rspamd check skipped (service unavailable)'
+                        'spam_report': spam_report,
+                        'spam_check_skipped': False
                     }
                 
                 # If spam, modify prompt for retry
@@ -220,6 +275,11 @@ FORMAT:
                 - Keep it between 110–160 words so it feels balanced and informative"""
 
                 
+            except CircuitOpenError as e:
+                logger.warning("AI_GENERATION_SKIPPED: OpenAI circuit open, failing fast", extra={
+                    "retry_in": e.retry_in
+                })
+                return None
             except Exception as e:
                 logger.error(f"AI generation attempt {attempt} failed", extra={
                     "error": str(e), "error_type": type(e).__name__
@@ -229,77 +289,56 @@ FORMAT:
         logger.error("AI_GENERATION_FAILED: All AI generation attempts failed")
         return None
 
-    def _check_spam(self, subject: str, content: str) -> Tuple[bool, float, str]:
-        """Check email with Rspamd"""
+    def _check_spam(self, subject: str, content: str) -> Tuple[bool, Optional[float], str]:
+        """
+        Check email with Rspamd (pooled connection, cached per normalised subject/body)
+        
+        The score is None when the check could not run (Rspamd down or its circuit open).
+        """
         logger.debug("RSPAMD_CHECK: Checking email with Rspamd")
         
         try:
-            # Format complete email for Rspamd (RFC2822 format)
-            email_text = f"""From: sender@example.com
-To: recipient@example.com
-Subject: {subject}
-Date: {datetime.now().strftime('%a, %d %b %Y %H:%M:%S +0000')}
-Message-ID: <{int(time.time())}.{uuid.uuid4().hex[:8]}@example.com>
-MIME-Version: 1.0
-Content-Type: text/plain; charset=UTF-8
-
-{content}"""
+            scan_result = rspamd_client.scan(subject, content)
             
-            # Send POST request to Rspamd scan endpoint
-            response = requests.post(
-                f"{self.rspamd_url}/scan",
-                data=email_text.encode('utf-8'),
-                headers={
-                    'Content-Type': 'text/plain',
-                },
-                timeout=10
-            )
+            spam_score = scan_result.get('score', 0.0)
+            action = scan_result.get('action', 'no action')
+            required_score = scan_result.get('required_score', 15.0)
             
-            if response.status_code == 200:
-                result = response.json()
-                
-                # Rspamd returns nested structure with 'default' key
-                scan_result = result.get('default', result)
-                
-                spam_score = scan_result.get('score', 0.0)
-                action = scan_result.get('action', 'no action')
-                is_spam_flag = scan_result.get('is_spam', False)
-                required_score = scan_result.get('required_score', 15.0)
-                
-                # Determine if spam based on Rspamd's action and score
-                # Only treat as spam if action is explicitly reject/soft reject or score is very high
-                # Determine if spam based on Rspamd's action and score
-                # Don't use is_spam_flag as it's too strict for our test environment
-                # Focus on actual harmful actions and high scores
-                spam_actions = ['reject', 'soft reject']
-                adjusted_threshold = 7.5  # Allow for 2.5 points from hostname issues in test environment
-                is_spam = action in spam_actions or spam_score >= adjusted_threshold
-                
-                logger.info(f"RSPAMD_COMPLETE: Action={action}, Score={spam_score}/{required_score}, IsSpam={is_spam}", extra={
-                    "is_spam": is_spam,
-                    "spam_score": spam_score,
-                    "action": action,
-                    "required_score": required_score
-                })
-                
-                # Create detailed report
-                report = f"Action: {action}, Score: {spam_score}/{required_score}"
-                
-                return is_spam, spam_score, report
-            else:
-                logger.warning(f"Rspamd returned status {response.status_code}")
-                return False, 0.0, f"Rspamd check failed with status {response.status_code}"
+            # Determine if spam based on Rspamd's action and score
+            # Don't use is_spam_flag as it's too strict for our test environment
+            # Focus on actual harmful actions and high scores
+            spam_actions = ['reject', 'soft reject']
+            adjusted_threshold = 7.5  # Allow for 2.5 points from hostname issues in test environment
+            is_spam = action in spam_actions or spam_score >= adjusted_threshold
+            
+            logger.info(f"RSPAMD_COMPLETE: Action={action}, Score={spam_score}/{required_score}, IsSpam={is_spam}", extra={
+                "is_spam": is_spam,
+                "spam_score": spam_score,
+                "action": action,
+                "required_score": required_score
+            })
+            
+            # Create detailed report
+            report = f"Action: {action}, Score: {spam_score}/{required_score}"
+            
+            return is_spam, spam_score, report
                 
+        except CircuitOpenError as e:
+            logger.warning("Rspamd circuit open, skipping spam check", extra={"retry_in": e.retry_in})
+            return False, None, f"Rspamd check skipped ({e})"
+        except RspamdError as e:
+            logger.warning(str(e))
+            return False, None, f"Rspamd check failed with status {e.status_code}"
         except requests.exceptions.RequestException as e:
             logger.warning("Rspamd check failed, proceeding", extra={
                 "error": str(e), "error_type": type(e).__name__
             })
-            return False, 0.0, f"Rspamd connection failed: {e}"
+            return False, None, f"Rspamd connection failed: {e}"
         except Exception as e:
             logger.warning("Rspamd check failed, proceeding", extra={
                 "error": str(e), "error_type": type(e).__name__
             })
-            return False, 0.0, f"Rspamd check failed: {e}"
+            return False, None, f"Rspamd check failed: {e}"
 
     def _is_within_schedule(self, sending_profile) -> Tuple[bool, str]:
         """Check if current time is within sending profile schedule"""
@@ -345,11 +384,20 @@ Content-Type: text/plain; charset=UTF-8
         """Public method to check if email sending is currently allowed based on schedule"""
         return self._is_within_schedule(sending_profile)
 
-    def _create_and_send_email(self, lead, subject: str, content: str, tracking_id: str, sending_profile=None):
-        """Create email with tracking and send via Gmail"""
-        if not self.gmail_service:
-            logger.error("Gmail service not available")
-            return False
+    def _create_and_send_email(self, lead, subject: str, content: str, tracking_id: str, sending_profile=None) -> Optional[str]:
+        """
+        Create email with tracking and send via Gmail, returning the Gmail message id
+
+        Returns None when nothing was handed to Gmail (no service, or building the message
+        failed). Raises GmailHandOffError when the send call itself fails, since Gmail may
+        have accepted the message anyway.
+        """
+        gmail_service = self.get_gmail_service(sending_profile)
+        if not gmail_service:
+            logger.error("Gmail service not available", extra={
+                "sending_profile_id": sending_profile.id if sending_profile else None
+            })
+            return None
             
         try:
             # Get domain for tracking - use click domain for tracking links
@@ -418,28 +466,109 @@ Unsubscribe: https://click.wegetyouonline.co.uk/api/unsubscribe/{tracking_id}"""
             html_part = MIMEText(html_content, 'html')
             message.attach(html_part)
             
-            # Send via Gmail
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            result = self.gmail_service.users().messages().send(
+            
+        except Exception as e:
+            logger.error("Failed to build email", extra={
+                "lead_email": lead.email,
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+            return None
+        
+        # Send via Gmail; from here on a failure does not mean the email was not sent
+        try:
+            result = gmail_service.users().messages().send(
                 userId='me',
                 body={'raw': raw_message}
             ).execute()
-            
-            logger.info("GMAIL_SEND_SUCCESS: Email sent via Gmail API", extra={
-                "lead_email": lead.email,
-                "message_id": result['id'],
-                "tracking_id": tracking_id
-            })
-            
-            return True
-            
         except Exception as e:
-            logger.error("Failed to send email", extra={
+            logger.error("Gmail send call failed; the email may have been sent", extra={
                 "lead_email": lead.email,
+                "tracking_id": tracking_id,
                 "error": str(e),
                 "error_type": type(e).__name__
             }, exc_info=True)
-            return False
+            raise GmailHandOffError(f"{type(e).__name__}: {e}") from e
+        
+        logger.info("GMAIL_SEND_SUCCESS: Email sent via Gmail API", extra={
+            "lead_email": lead.email,
+            "message_id": result['id'],
+            "tracking_id": tracking_id
+        })
+        
+        return result['id']
+
+    def generate_draft(self, lead, prompt_text: str, sending_profile=None, previous_emails=None) -> Optional[Dict]:
+        """
+        Generate a spam-checked draft once so the exact subject/content can be persisted and sent
+        
+        Returns:
+            dict with subject, content, spam_score, spam_report and generation_seconds, or None on failure
+        """
+        started = time.monotonic()
+        email_data = self._generate_ai_email(
+            lead=lead,
+            prompt_text=prompt_text,
+            sending_profile=sending_profile,
+            is_followup=True,
+            previous_emails=previous_emails
+        )
+        if not email_data:
+            return None
+        
+        email_data['generation_seconds'] = round(time.monotonic() - started, 3)
+        return email_data
+
+    def send_draft(self, lead, subject: str, content: str, tracking_id: str, sending_profile=None,
+                   spam_score: Optional[float] = None) -> SendResult:
+        """Send an already generated draft verbatim and report a structured result"""
+        started = time.monotonic()
+        try:
+            message_id = self._create_and_send_email(
+                lead=lead,
+                subject=subject,
+                content=content,
+                tracking_id=tracking_id,
+                sending_profile=sending_profile
+            )
+        except GmailHandOffError as e:
+            return SendResult(
+                success=False,
+                tracking_id=tracking_id,
+                spam_score=spam_score,
+                send_seconds=round(time.monotonic() - started, 3),
+                error=f"Gmail send outcome unknown: {e}",
+                ambiguous=True
+            )
+        send_seconds = round(time.monotonic() - started, 3)
+        
+        if not message_id:
+            logger.error("EMAIL_SEND_FAILED: Email send failed", extra={
+                "lead_email": lead.email,
+                "tracking_id": tracking_id
+            })
+            return SendResult(
+                success=False,
+                tracking_id=tracking_id,
+                spam_score=spam_score,
+                send_seconds=send_seconds,
+                error="Gmail send failed"
+            )
+        
+        logger.info(f"EMAIL_SEND_SUCCESS: Email sent to {lead.email} (Spam Score: {spam_score if spam_score is not None else 'N/A'})", extra={
+            "lead_email": lead.email,
+            "spam_score": spam_score,
+            "message_id": message_id,
+            "send_seconds": send_seconds
+        })
+        return SendResult(
+            success=True,
+            tracking_id=tracking_id,
+            gmail_message_id=message_id,
+            spam_score=spam_score,
+            send_seconds=send_seconds
+        )
 
         
     def send_email(self, lead, prompt_text: str, tracking_id: str, sending_profile=None, previous_emails=None):
@@ -464,11 +593,10 @@ Unsubscribe: https://click.wegetyouonline.co.uk/api/unsubscribe/{tracking_id}"""
         })
         
         # Generate email with context
-        email_data = self._generate_ai_email(
+        email_data = self.generate_draft(
             lead=lead,
             prompt_text=prompt_text, 
             sending_profile=sending_profile,
-            is_followup=True,
             previous_emails=previous_emails
         )
         
@@ -477,20 +605,25 @@ Unsubscribe: https://click.wegetyouonline.co.uk/api/unsubscribe/{tracking_id}"""
             return False
             
         # Send the email
-        success = self._create_and_send_email(
+        result = self.send_draft(
             lead=lead,
             subject=email_data['subject'],
             content=email_data['content'],
             tracking_id=tracking_id, 
-            sending_profile=sending_profile
+            sending_profile=sending_profile,
+            spam_score=email_data.get('spam_score')
         )
         
-        if success:
-            logger.info(f"EMAIL_SEND_SUCCESS: Email sent to {lead.email} (Spam Score: {email_data.get('spam_score', 'N/A')})", extra={
-                "lead_email": lead.email,
-                "spam_score": email_data.get('spam_score', 'N/A')
-            })
-        else:
-            logger.error("EMAIL_SEND_FAILED: Email send failed")
-            
-        return success
+        return result.success
+
+_email_service = None
+_email_service_lock = threading.Lock()
+
+def get_email_service() -> EmailService:
+    """Process-wide EmailService, created on first use and safe to share between threads"""
+    global _email_service
+    if _email_service is None:
+        with _email_service_lock:
+            if _email_service is None:
+                _email_service = EmailService()
+    return _email_service
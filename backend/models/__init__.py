@@ -1,9 +1,14 @@
 from .base import Base
 from .lead import Lead
 from .campaign import Campaign, CampaignStep, LeadCampaign, CampaignEmail, EmailReply, DailyStats
-from .tracking import LinkClick, EmailTrackingEvent, EmailOpenAnalysis
+from .tracking import LinkClick, EmailTrackingEvent, EmailOpenAnalysis, TrackingEventRollup
 from .groups import LeadGroup, LeadGroupMembership
 from .sending_profile import SendingProfile
+from .send_slot import SendSlot
+from .send_job import SendJob
+from .counter import CounterShard
+from .campaign_stats import CampaignStepStats
+from .activity import ActivityFeedEvent
 from .user import User, APIKey
 from .deliverability import DeliverabilityMetric, PostmasterMetric, BlacklistStatus, DNSAuthRecord, DeliverabilityAlert
 
@@ -11,9 +16,9 @@ __all__ = [
     "Base",
     "Lead", 
     "Campaign", "CampaignStep", "LeadCampaign", "CampaignEmail", "EmailReply", "DailyStats",
-    "LinkClick", "EmailTrackingEvent", "EmailOpenAnalysis",
+    "LinkClick", "EmailTrackingEvent", "EmailOpenAnalysis", "TrackingEventRollup",
     "LeadGroup", "LeadGroupMembership",
-    "SendingProfile",
+    "SendingProfile", "SendSlot", "SendJob", "CounterShard", "CampaignStepStats", "ActivityFeedEvent",
     "User", "APIKey",
     "DeliverabilityMetric", "PostmasterMetric", "BlacklistStatus", "DNSAuthRecord", "DeliverabilityAlert"
 ]
\ No newline at end of file
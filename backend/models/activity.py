@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON
+from datetime import datetime
+from .base import Base
+
+class ActivityFeedEvent(Base):
+    """
+    Append-only dashboard activity (sends, opens, clicks, unsubscribes), written in the
+    same transaction as the change it describes
+
+    Campaign name and lead email are copied in so the feed never joins back to the
+    source tables; rows are never updated, only pruned by age.
+    """
+    __tablename__ = "activity_events"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    event_type = Column(String(32), nullable=False)  # email_sent, email_opened, email_clicked, lead_unsubscribed
+    occurred_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    campaign_id = Column(Integer)
+    campaign_name = Column(String)
+    lead_id = Column(Integer)
+    lead_email = Column(String)
+    sequence_email_id = Column(Integer)
+    details = Column(JSON)
@@ -10,7 +10,7 @@ class Campaign(Base):
     description = Column(Text)
     sending_profile_id = Column(Integer, ForeignKey("sending_profiles.id"))
     status = Column(String, default="active")
-    email_opens = Column(Integer, default=0)
+    email_opens = Column(Integer, default=0)  # opens recorded before the counters; read through read_campaign_email_opens
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
@@ -29,6 +29,7 @@ class CampaignStep(Base):
     is_active = Column(Boolean, default=True)
     include_previous_emails = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
 class LeadCampaign(Base):
     __tablename__ = "lead_sequences"
@@ -43,6 +44,9 @@ class LeadCampaign(Base):
     next_send_at = Column(DateTime)
     completed_at = Column(DateTime)
     stop_reason = Column(String)
+    # Time-limited lease taken by the worker currently processing this row (services/leases.py)
+    claimed_by = Column(String(255))
+    lease_expires_at = Column(DateTime, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
@@ -52,9 +56,15 @@ class CampaignEmail(Base):
     id = Column(Integer, primary_key=True, index=True)
     lead_sequence_id = Column(Integer, ForeignKey("lead_sequences.id"))
     step_id = Column(Integer, ForeignKey("sequence_steps.id"))
-    status = Column(String, default="pending")
+    status = Column(String, default="pending")  # pending, draft, invalidated, sent, failed
     subject = Column(String)
     content = Column(Text)
+    spam_score = Column(Numeric(5, 2))
+    spam_report = Column(Text)
+    spam_check_skipped = Column(Boolean, default=False)  # Generated while Rspamd was unavailable
+    generated_at = Column(DateTime)
+    draft_fingerprint = Column(String(64))
+    gmail_message_id = Column(String)
     sent_at = Column(DateTime)
     opens = Column(Integer, default=0)
     clicks = Column(Integer, default=0)
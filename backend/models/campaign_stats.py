@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+from .base import Base
+
+# step_number of the row holding a campaign's whole-sequence totals
+CAMPAIGN_TOTAL_STEP = 0
+
+class CampaignStepStats(Base):
+    """
+    Running totals per campaign and step, maintained in the same transactions as the
+    sends, status changes and tracking hits they count (services/campaign_stats.py)
+
+    The step 0 row counts enrollments: enrolled/active/completed/stopped/replied, and
+    sent/opened/clicked as distinct leads. Step rows count that step's emails.
+    """
+    __tablename__ = "campaign_step_stats"
+    
+    sequence_id = Column(Integer, ForeignKey("email_sequences.id", ondelete="CASCADE"), primary_key=True)
+    step_number = Column(Integer, primary_key=True)
+    enrolled = Column(Integer, nullable=False, default=0)
+    active = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    stopped = Column(Integer, nullable=False, default=0)
+    replied = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    opened = Column(Integer, nullable=False, default=0)
+    clicked = Column(Integer, nullable=False, default=0)
+    last_sent_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger
+from datetime import datetime
+from .base import Base
+
+class CounterShard(Base):
+    """One shard of a named counter for one bucket (e.g. a day); a counter's value is the sum of its shards"""
+    __tablename__ = "counter_shards"
+    
+    name = Column(String(64), primary_key=True)
+    bucket = Column(String(64), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
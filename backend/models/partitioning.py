@@ -0,0 +1,64 @@
+"""
+Monthly range partitioning for the append-only tracking tables
+
+On Postgres the tables are declared PARTITION BY RANGE on their time column, with the
+primary key (id, <time column>) Postgres requires, and get a DEFAULT partition plus the
+current and next few months when created. Other databases (SQLite in development) get
+a plain table with a single autoincrement id.
+"""
+
+from datetime import date, datetime
+from typing import Dict, Optional
+import os
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn, PrimaryKeyConstraint
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("TRACKING_PARTITION_MONTHS_AHEAD", 2))
+
+def monthly_partitioned(column_name: str) -> Dict:
+    """__table_args__ for a table range-partitioned by month on `column_name`"""
+    return {
+        "postgresql_partition_by": f"RANGE ({column_name})",
+        "info": {"partition_key": column_name}
+    }
+
+def month_start(day: Optional[date] = None) -> date:
+    day = day or datetime.utcnow().date()
+    return date(day.year, day.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_y{month.year}m{month.month:02d}"
+
+def create_month_partition_sql(table_name: str, month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+def create_initial_partitions(table, connection, **kw):
+    """after_create hook: DEFAULT partition plus this month and PARTITION_MONTHS_AHEAD more"""
+    if connection.dialect.name != "postgresql":
+        return
+    connection.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {table.name}_default PARTITION OF {table.name} DEFAULT")
+    for offset in range(PARTITION_MONTHS_AHEAD + 1):
+        connection.exec_driver_sql(create_month_partition_sql(table.name, add_months(month_start(), offset)))
+
+# SQLite cannot autoincrement a column of a composite primary key, so partitioned tables
+# keep a single INTEGER PRIMARY KEY id there
+@compiles(CreateColumn, "sqlite")
+def _sqlite_partitioned_id(element, compiler, **kw):
+    column = element.element
+    if column.table.info.get("partition_key") and column.name == "id":
+        return f"{compiler.preparer.format_column(column)} INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT"
+    return compiler.visit_create_column(element, **kw)
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _sqlite_partitioned_primary_key(constraint, compiler, **kw):
+    if constraint.table.info.get("partition_key"):
+        return None
+    return compiler.visit_primary_key_constraint(constraint, **kw)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from datetime import datetime
+from .base import Base
+
+class SendJob(Base):
+    """A queued run of the send pipeline (draft generation, then paced sending)"""
+    __tablename__ = "send_jobs"
+    
+    id = Column(String(36), primary_key=True)
+    trigger = Column(String, default="manual")  # manual
+    requested_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    status = Column(String, default="queued", index=True)  # queued, generating, sending, done, failed
+    drafts_created = Column(Integer, default=0)
+    drafts_failed = Column(Integer, default=0)
+    slots_planned = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
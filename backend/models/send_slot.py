@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from datetime import datetime
+from .base import Base
+
+class SendSlot(Base):
+    """A planned, paced send time for one ready draft"""
+    __tablename__ = "send_slots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sending_profile_id = Column(Integer, ForeignKey("sending_profiles.id"), nullable=True, index=True)
+    lead_sequence_id = Column(Integer, ForeignKey("lead_sequences.id"))
+    sequence_email_id = Column(Integer, ForeignKey("sequence_emails.id"))
+    send_job_id = Column(String(36), ForeignKey("send_jobs.id"), nullable=True, index=True)
+    slot_index = Column(Integer, default=0)  # Position in the profile's progressive spacing run
+    scheduled_for = Column(DateTime, nullable=False, index=True)
+    # planned, dispatching, sent, failed, cancelled; unconfirmed: dispatch failed after the hand-off to
+    # Gmail, so the email may have gone out and the lead is held until reconciled (reconcile_send_slots.py)
+    status = Column(String, default="planned", index=True)
+    error = Column(Text)
+    dispatched_at = Column(DateTime)  # when the email was handed to Gmail
+    gmail_message_id = Column(String)
+    # Set when a sender claims the slot; a slot stuck in dispatching past SEND_DISPATCH_TIMEOUT_SECONDS is reclaimed
+    dispatch_started_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
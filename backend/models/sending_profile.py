@@ -23,5 +23,29 @@ class SendingProfile(Base):
     schedule_time_to = Column(Time, default=datetime.strptime('17:00', '%H:%M').time())
     schedule_timezone = Column(String, default='UTC')
     
+    # Send pacing policy (seconds); see services/send_pacing.py
+    pacing_initial_delay_min = Column(Integer, default=5)
+    pacing_initial_delay_max = Column(Integer, default=60)
+    pacing_base_delay = Column(Integer, default=30)
+    pacing_delay_increment = Column(Integer, default=10)  # Added per email already sent in the run
+    pacing_jitter_min = Column(Integer, default=-15)
+    pacing_jitter_max = Column(Integer, default=60)
+    pacing_min_delay = Column(Integer, default=15)
+    pacing_max_delay = Column(Integer, default=400)
+    
+    # Mailbox this profile sends through; secrets are Fernet-encrypted (services/credential_crypto.py).
+    # Profiles without credentials send through the GMAIL_* mailbox from the environment.
+    gmail_client_id = Column(String)
+    gmail_client_secret_encrypted = Column(Text)
+    gmail_refresh_token_encrypted = Column(Text)
+    
+    # Per-mailbox quotas; NULL falls back to DAILY_EMAIL_LIMIT / HOURLY_EMAIL_LIMIT
+    daily_send_limit = Column(Integer)
+    hourly_send_limit = Column(Integer)
+    
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def has_gmail_credentials(self) -> bool:
+        return bool(self.gmail_refresh_token_encrypted)
@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Numeric, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Text, ForeignKey, Boolean, Numeric, JSON, Float, event
 from datetime import datetime
 from .base import Base
+from .partitioning import create_initial_partitions, monthly_partitioned
 
 class LinkClick(Base):
     __tablename__ = "link_clicks"
+    __table_args__ = monthly_partitioned("clicked_at")
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     tracking_id = Column(String, index=True, nullable=False)
     lead_sequence_id = Column(Integer, ForeignKey("lead_sequences.id"), nullable=True)
     sequence_email_id = Column(Integer, ForeignKey("sequence_emails.id"), nullable=True)
@@ -13,20 +15,21 @@ class LinkClick(Base):
     ip_address = Column(String(45))
     user_agent = Column(Text)
     referer = Column(Text)
-    clicked_at = Column(DateTime, default=datetime.utcnow)
+    clicked_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class EmailTrackingEvent(Base):
     __tablename__ = "email_tracking_events"
+    __table_args__ = monthly_partitioned("timestamp")
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     tracking_id = Column(String, nullable=False, index=True)
     event_type = Column(String, nullable=False)
     signal_type = Column(String, nullable=False)
     ip_address = Column(String)
     user_agent = Column(Text)
     referer = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow)
     delay_from_send = Column(Integer)
     is_prefetch = Column(Boolean, default=False)
     confidence_score = Column(Numeric(3, 2), default=0.0)
@@ -49,6 +52,30 @@ class EmailOpenAnalysis(Base):
     unique_ip_count = Column(Integer, default=0)
     prefetch_signals = Column(Integer, default=0)
     human_signals = Column(Integer, default=0)
+    # Running stats the analysis is derived from; NULL score_sum means not built yet
+    score_sum = Column(Float)
+    timing_prefetch_signals = Column(Integer)
+    signal_type_mask = Column(Integer)
+    other_signal_types = Column(JSON)  # signal types outside SIGNAL_TYPE_BITS, by name
+    ip_sketch = Column(String(64))
     analysis_data = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class TrackingEventRollup(Base):
+    """One email's raw tracking events for one month, compacted before the month's partition is dropped"""
+    __tablename__ = "tracking_event_rollups"
+    
+    month = Column(Date, primary_key=True)
+    tracking_id = Column(String, primary_key=True)
+    sequence_email_id = Column(Integer, ForeignKey("sequence_emails.id"), nullable=True)
+    event_count = Column(Integer, nullable=False, default=0)
+    prefetch_count = Column(Integer, nullable=False, default=0)
+    click_count = Column(Integer, nullable=False, default=0)
+    signal_counts = Column(JSON)  # {signal_type: events}
+    first_event_at = Column(DateTime)
+    last_event_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+event.listen(LinkClick.__table__, "after_create", create_initial_partitions)
+event.listen(EmailTrackingEvent.__table__, "after_create", create_initial_partitions)
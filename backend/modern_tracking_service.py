@@ -5,28 +5,135 @@ Multi-signal approach to maximize open tracking accuracy
 
 import time
 import json
+import math
 import re
+import zlib
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
 from urllib.parse import unquote
+from sqlalchemy.orm import Session
 import uuid
 
+from services.bot_classifier import BotClassifier, ClientClassification, bot_classifier
+from services.tracking_signals import SignalStore, TrackingSignal, create_signal_store
+
+# Bit positions for the signal-type bitmap; any other type is kept by name in OpenStats.other_signal_types
+SIGNAL_TYPE_BITS = ('logo', 'css', 'interactive', 'view_browser', 'primary',
+                    'secondary', 'content', 'javascript', 'js', 'view')
+IP_SKETCH_BITS = 256
+
+def signal_type_bit(signal_type: str) -> int:
+    """The type's bit in the signal-type bitmap, or 0 for a type outside SIGNAL_TYPE_BITS"""
+    if signal_type in SIGNAL_TYPE_BITS:
+        return 1 << SIGNAL_TYPE_BITS.index(signal_type)
+    return 0
+
 @dataclass
-class TrackingSignal:
-    event_type: str
-    signal_type: str
-    confidence: float
-    metadata: Dict
-    timestamp: datetime
+class OpenStats:
+    """
+    Running statistics an open analysis is derived from
+
+    Each field is updated in O(1) per signal and two OpenStats merge by addition (and
+    OR/union for the type bitmap and set), so folding signals in one at a time scores
+    exactly like a full recompute over the signal list. Known signal types are bits of
+    signal_type_mask and any other type is kept by name, so distinct types are exact.
+    Unique IPs are estimated from a linear-counting bitmap, which is exact in practice
+    for the handful of IPs one email sees.
+    """
+    total_signals: int = 0
+    score_sum: float = 0.0
+    timing_prefetch_signals: int = 0
+    prefetch_signals: int = 0
+    human_signals: int = 0
+    signal_type_mask: int = 0
+    other_signal_types: Set[str] = field(default_factory=set)
+    ip_sketch: int = 0
+    first_signal_at: Optional[datetime] = None
+    last_signal_at: Optional[datetime] = None
+
+    def add(self, signal_type: str, confidence: float, timestamp: datetime, ip_address: Optional[str],
+            score: float, is_prefetch_timing: bool):
+        self.total_signals += 1
+        self.score_sum += score
+        self.timing_prefetch_signals += 1 if is_prefetch_timing else 0
+        self.prefetch_signals += 1 if confidence < 0.3 else 0
+        self.human_signals += 1 if confidence > 0.7 else 0
+        bit = signal_type_bit(signal_type)
+        if bit:
+            self.signal_type_mask |= bit
+        else:
+            self.other_signal_types.add(signal_type)
+        self.ip_sketch |= 1 << (zlib.crc32((ip_address or '').encode("utf-8")) % IP_SKETCH_BITS)
+        if self.first_signal_at is None or timestamp < self.first_signal_at:
+            self.first_signal_at = timestamp
+        if self.last_signal_at is None or timestamp > self.last_signal_at:
+            self.last_signal_at = timestamp
+
+    def merge(self, other: "OpenStats") -> "OpenStats":
+        firsts = [t for t in (self.first_signal_at, other.first_signal_at) if t]
+        lasts = [t for t in (self.last_signal_at, other.last_signal_at) if t]
+        return OpenStats(
+            total_signals=self.total_signals + other.total_signals,
+            score_sum=self.score_sum + other.score_sum,
+            timing_prefetch_signals=self.timing_prefetch_signals + other.timing_prefetch_signals,
+            prefetch_signals=self.prefetch_signals + other.prefetch_signals,
+            human_signals=self.human_signals + other.human_signals,
+            signal_type_mask=self.signal_type_mask | other.signal_type_mask,
+            other_signal_types=self.other_signal_types | other.other_signal_types,
+            ip_sketch=self.ip_sketch | other.ip_sketch,
+            first_signal_at=min(firsts) if firsts else None,
+            last_signal_at=max(lasts) if lasts else None
+        )
+
+    @property
+    def signal_types(self) -> List[str]:
+        """Each distinct signal type once: known types in bit order, then any others sorted"""
+        known = [t for i, t in enumerate(SIGNAL_TYPE_BITS) if self.signal_type_mask & (1 << i)]
+        return known + sorted(self.other_signal_types)
+
+    @property
+    def distinct_signal_types(self) -> int:
+        return bin(self.signal_type_mask).count("1") + len(self.other_signal_types)
+
+    @property
+    def unique_ip_count(self) -> int:
+        empty = IP_SKETCH_BITS - bin(self.ip_sketch).count("1")
+        if empty == 0:
+            return IP_SKETCH_BITS
+        return int(round(-IP_SKETCH_BITS * math.log(empty / IP_SKETCH_BITS)))
 
 class ModernOpenTracker:
     
     # Scanner timing threshold - focus purely on timing behavior
     SCANNER_TIMING_THRESHOLD = 120  # 2 minutes
     
-    def __init__(self):
-        self.tracking_signals = {}
+    # (seconds since send upper bound, looks like prefetch, timing confidence); None = no bound
+    TIMING_BANDS = (
+        (30, True, 0.05),    # 0-30 seconds: definitely automated scanner
+        (120, True, 0.2),    # 30s-2 minutes: likely automated scanner
+        (600, False, 0.6),   # 2-10 minutes: possible user
+        (None, False, 0.9),  # 10+ minutes: definitely user
+    )
+    CLEAN_BASE_CONFIDENCE = 0.8       # signal base confidence without prefetch indicators
+    SUSPICIOUS_BASE_CONFIDENCE = 0.2  # ...and with a prefetch UA/network or prefetch timing
+    DEFAULT_SIGNAL_WEIGHT = 0.1
+    PREFETCH_TIMING_FACTOR = 0.3      # score multiplier for signals with prefetch timing
+    PREFETCH_PENALTY = 0.7            # confidence penalty at 100% prefetch-timed signals
+    DIVERSITY_BONUS_PER_TYPE = 0.1
+    DIVERSITY_BONUS_CAP = 0.3
+    OPEN_THRESHOLD = 0.3
+    
+    def __init__(self, store: Optional[SignalStore] = None, classifier: BotClassifier = bot_classifier):
+        self._store = store
+        self.classifier = classifier
+
+    @property
+    def store(self) -> SignalStore:
+        # Created on first use so scripts that only call the analyzers never touch the database
+        if self._store is None:
+            self._store = create_signal_store()
+        return self._store
     
     def generate_multi_signal_tracking(self, tracking_id: str, domain: str) -> Dict[str, str]:
         """Generate multiple tracking elements for comprehensive detection"""
@@ -71,103 +178,103 @@ class ModernOpenTracker:
             'javascript': js_tracking
         }
     
+    def analyze_client(self, user_agent: str, ip_address: Optional[str] = None) -> ClientClassification:
+        """Label the fetching client (prefetch proxy, link scanner, bot or human) from its UA and IP"""
+        return self.classifier.classify(user_agent, ip_address)
+    
     def analyze_user_agent(self, user_agent: str) -> Tuple[bool, float]:
-        """Simplified user agent analysis - only check for obvious bots"""
-        if not user_agent:
-            return False, 0.8  # Missing UA is fine, focus on timing
-        
-        user_agent_lower = user_agent.lower()
-        
-        # Only flag obvious automation indicators
-        automation_indicators = ['bot', 'crawler', 'spider', 'automated', 'headless']
-        for indicator in automation_indicators:
-            if indicator in user_agent_lower:
-                return True, 0.1  # Definitely automated
-        
-        return False, 0.9  # Default to assuming real user
+        """User agent only analysis; prefer analyze_client, which also knows prefetcher networks"""
+        client = self.analyze_client(user_agent)
+        return client.is_automated, client.confidence
     
     def analyze_timing(self, send_time: datetime, open_time: datetime) -> Tuple[bool, float]:
         """Analyze time-since-send using graduated confidence scoring"""
         time_diff = (open_time - send_time).total_seconds()
         
         # Graduated confidence based on timing
-        if time_diff < 30:  # 0-30 seconds
-            return True, 0.05  # Definitely automated scanner
-        elif time_diff < 120:  # 30s-2 minutes  
-            return True, 0.2   # Likely automated scanner
-        elif time_diff < 600:  # 2-10 minutes
-            return False, 0.6  # Possible user
-        else:  # 10+ minutes
-            return False, 0.9  # Definitely user
+        for upper_bound, is_prefetch, confidence in self.TIMING_BANDS:
+            if upper_bound is None or time_diff < upper_bound:
+                return is_prefetch, confidence
     
-    def calculate_confidence_score(self, signals: List[TrackingSignal], 
-                                 send_time: datetime) -> float:
-        """Calculate overall confidence that the email was actually opened by a human"""
-        if not signals:
-            return 0.0
-        
-        total_confidence = 0.0
-        signal_weights = {
-            'logo': 0.8,         # High confidence - legitimate business logo
-            'css': 0.6,          # Good confidence - CSS background tracking
-            'interactive': 0.8,  # High weight for clicks
-            'view_browser': 0.9, # Very high weight for browser views
-            'primary': 0.4,      # Legacy pixel (keeping for compatibility)
-            'secondary': 0.5,    # Legacy pixel
-            'content': 0.5,      # Legacy pixel
-            'javascript': 0.7    # Legacy JS tracking
-        }
-        
-        # Time-based analysis
-        timing_scores = []
-        prefetch_indicators = 0
+    SIGNAL_WEIGHTS = {
+        'logo': 0.8,         # High confidence - legitimate business logo
+        'css': 0.6,          # Good confidence - CSS background tracking
+        'interactive': 0.8,  # High weight for clicks
+        'view_browser': 0.9, # Very high weight for browser views
+        'primary': 0.4,      # Legacy pixel (keeping for compatibility)
+        'secondary': 0.5,    # Legacy pixel
+        'content': 0.5,      # Legacy pixel
+        'javascript': 0.7    # Legacy JS tracking
+    }
+    
+    def score_signal(self, signal_type: str, confidence: float, timestamp: datetime,
+                     send_time: datetime) -> Tuple[float, bool]:
+        """One signal's weighted, timing-adjusted contribution and whether its timing looks like prefetch"""
+        # Weight by signal type
+        signal_score = confidence * self.SIGNAL_WEIGHTS.get(signal_type, self.DEFAULT_SIGNAL_WEIGHT)
         
+        # Timing analysis
+        is_prefetch, timing_confidence = self.analyze_timing(send_time, timestamp)
+        if is_prefetch:
+            signal_score *= self.PREFETCH_TIMING_FACTOR  # Reduce score for suspicious timing
+        else:
+            signal_score *= timing_confidence
+        return signal_score, is_prefetch
+    
+    def add_signal(self, stats: OpenStats, signal: TrackingSignal, send_time: datetime) -> OpenStats:
+        """Fold one signal into running stats in O(1)"""
+        score, is_prefetch_timing = self.score_signal(
+            signal.signal_type, signal.confidence, signal.timestamp, send_time
+        )
+        stats.add(signal.signal_type, signal.confidence, signal.timestamp,
+                  (signal.metadata or {}).get('ip_address'), score, is_prefetch_timing)
+        return stats
+    
+    def build_stats(self, signals: List[TrackingSignal], send_time: datetime) -> OpenStats:
+        stats = OpenStats()
         for signal in signals:
-            # Weight by signal type
-            weight = signal_weights.get(signal.signal_type, 0.1)
-            signal_score = signal.confidence * weight
-            
-            # Timing analysis
-            is_prefetch, timing_confidence = self.analyze_timing(send_time, signal.timestamp)
-            if is_prefetch:
-                prefetch_indicators += 1
-                signal_score *= 0.3  # Reduce score for suspicious timing
-            else:
-                signal_score *= timing_confidence
-            
-            total_confidence += signal_score
-            timing_scores.append(timing_confidence)
+            self.add_signal(stats, signal, send_time)
+        return stats
+    
+    def confidence_from_stats(self, stats: OpenStats) -> float:
+        """Overall confidence that the email was opened by a human, from running stats"""
+        if not stats.total_signals:
+            return 0.0
         
         # Normalize by number of signals
-        base_confidence = total_confidence / len(signals)
+        base_confidence = stats.score_sum / stats.total_signals
         
         # Apply penalties for prefetch indicators
-        prefetch_ratio = prefetch_indicators / len(signals)
-        prefetch_penalty = 1.0 - (prefetch_ratio * 0.7)
+        prefetch_ratio = stats.timing_prefetch_signals / stats.total_signals
+        prefetch_penalty = 1.0 - (prefetch_ratio * self.PREFETCH_PENALTY)
         
         # Bonus for multiple diverse signals
-        signal_types = set(s.signal_type for s in signals)
-        diversity_bonus = min(len(signal_types) * 0.1, 0.3)
+        diversity_bonus = min(stats.distinct_signal_types * self.DIVERSITY_BONUS_PER_TYPE, self.DIVERSITY_BONUS_CAP)
         
         final_confidence = (base_confidence * prefetch_penalty) + diversity_bonus
         
         return min(max(final_confidence, 0.0), 1.0)
     
-    def record_tracking_signal(self, tracking_id: str, signal_type: str, 
-                             user_agent: str, ip_address: str, 
-                             send_time: datetime) -> TrackingSignal:
-        """Record and analyze a tracking signal"""
+    def calculate_confidence_score(self, signals: List[TrackingSignal], 
+                                 send_time: datetime) -> float:
+        """Calculate overall confidence that the email was actually opened by a human"""
+        return self.confidence_from_stats(self.build_stats(signals, send_time))
+    
+    def build_signal(self, signal_type: str, user_agent: str, ip_address: str,
+                     send_time: datetime, timestamp: Optional[datetime] = None) -> TrackingSignal:
+        """Analyze a tracking hit (seen at `timestamp`, default now) into a scored signal"""
         
-        timestamp = datetime.utcnow()
+        timestamp = timestamp or datetime.utcnow()
         
-        # Analyze user agent
-        is_prefetch_ua, ua_confidence = self.analyze_user_agent(user_agent)
+        # Analyze the client: user agent plus known prefetcher/scanner networks
+        client = self.analyze_client(user_agent, ip_address)
+        is_prefetch_ua, ua_confidence = client.is_automated, client.confidence
         
         # Analyze timing
         is_prefetch_timing, timing_confidence = self.analyze_timing(send_time, timestamp)
         
         # Calculate signal confidence
-        base_confidence = 0.8 if not (is_prefetch_ua or is_prefetch_timing) else 0.2
+        base_confidence = self.CLEAN_BASE_CONFIDENCE if not (is_prefetch_ua or is_prefetch_timing) else self.SUSPICIOUS_BASE_CONFIDENCE
         adjusted_confidence = base_confidence * ua_confidence * timing_confidence
         
         # Create signal
@@ -178,6 +285,7 @@ class ModernOpenTracker:
             metadata={
                 'user_agent': user_agent,
                 'ip_address': ip_address,
+                'client_label': client.label,
                 'is_prefetch_ua': is_prefetch_ua,
                 'is_prefetch_timing': is_prefetch_timing,
                 'ua_confidence': ua_confidence,
@@ -187,18 +295,32 @@ class ModernOpenTracker:
             timestamp=timestamp
         )
         
+        return signal
+    
+    def record_tracking_signal(self, tracking_id: str, signal_type: str, 
+                             user_agent: str, ip_address: str, 
+                             send_time: datetime, db: Optional[Session] = None) -> TrackingSignal:
+        """Record and analyze a tracking signal; with `db` the caller commits the stored event"""
+        signal = self.build_signal(signal_type, user_agent, ip_address, send_time)
+        
         # Store signal
-        if tracking_id not in self.tracking_signals:
-            self.tracking_signals[tracking_id] = []
-        self.tracking_signals[tracking_id].append(signal)
+        self.store.append(tracking_id, signal, send_time, db=db)
         
         return signal
     
-    def get_open_analysis(self, tracking_id: str, send_time: datetime) -> Dict:
+    def get_open_analysis(self, tracking_id: str, send_time: datetime, db: Optional[Session] = None) -> Dict:
         """Get comprehensive open analysis for a tracking ID"""
-        signals = self.tracking_signals.get(tracking_id, [])
-        
-        if not signals:
+        signals = self.store.load(tracking_id, db=db)
+        return self.analysis_from_stats(self.build_stats(signals, send_time))
+    
+    def analysis_from_stats(self, stats: OpenStats) -> Dict:
+        """
+        Open analysis derived from running stats; identical to scoring the full signal list
+
+        'signal_types' lists each distinct type once. It used to hold one entry per signal,
+        repeats included; 'total_signals' still gives the count.
+        """
+        if not stats.total_signals:
             return {
                 'is_opened': False,
                 'confidence_score': 0.0,
@@ -206,31 +328,27 @@ class ModernOpenTracker:
                 'analysis': 'No tracking signals detected'
             }
         
-        confidence_score = self.calculate_confidence_score(signals, send_time)
+        confidence_score = self.confidence_from_stats(stats)
         
         # Determine if opened based on confidence threshold
-        is_opened = confidence_score > 0.3
-        
-        # Detailed analysis
-        signal_types = [s.signal_type for s in signals]
-        unique_ips = len(set(s.metadata.get('ip_address', '') for s in signals))
+        is_opened = confidence_score > self.OPEN_THRESHOLD
         
         analysis = {
             'is_opened': is_opened,
             'confidence_score': confidence_score,
-            'total_signals': len(signals),
-            'signal_types': signal_types,
-            'unique_ip_count': unique_ips,
-            'first_signal_at': min(s.timestamp for s in signals),
-            'last_signal_at': max(s.timestamp for s in signals),
-            'prefetch_signals': sum(1 for s in signals if s.confidence < 0.3),
-            'high_confidence_signals': sum(1 for s in signals if s.confidence > 0.7),
-            'analysis': self._generate_analysis_text(signals, confidence_score)
+            'total_signals': stats.total_signals,
+            'signal_types': stats.signal_types,
+            'unique_ip_count': stats.unique_ip_count,
+            'first_signal_at': stats.first_signal_at,
+            'last_signal_at': stats.last_signal_at,
+            'prefetch_signals': stats.prefetch_signals,
+            'high_confidence_signals': stats.human_signals,
+            'analysis': self._generate_analysis_text(confidence_score)
         }
         
         return analysis
     
-    def _generate_analysis_text(self, signals: List[TrackingSignal], confidence: float) -> str:
+    def _generate_analysis_text(self, confidence: float) -> str:
         """Generate human-readable analysis"""
         if confidence > 0.8:
             return "High confidence: Multiple indicators suggest genuine human engagement"
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Partition Tracking Tables Script
+
+Converts email_tracking_events and link_clicks on an existing Postgres install, created
+before they were partitioned, into the monthly-partitioned tables retention works on.
+Each table is renamed to <table>_unpartitioned, recreated partitioned, and its rows are
+copied into one partition per month. Writes to a table wait while it is copied, so run
+this in a quiet period; clicks keep spooling to disk meanwhile. Check the row counts,
+then drop the old tables with --drop-old (or by hand).
+"""
+
+import sys
+import os
+import argparse
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from database import SessionLocal
+from services.tracking_partitions import PARTITIONED_TABLES, convert_to_partitioned, is_partitioned
+
+def _table_exists(db, table_name):
+    return db.execute(text("SELECT to_regclass(:table)"), {"table": table_name}).scalar() is not None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the tracking tables to monthly partitions")
+    parser.add_argument("--table", choices=PARTITIONED_TABLES, default=None, help="Only this table")
+    parser.add_argument("--drop-old", action="store_true",
+                        help="Drop the <table>_unpartitioned copies left by an earlier conversion")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            print("❌ Partitioning only applies to Postgres")
+            sys.exit(1)
+
+        for table_name in [args.table] if args.table else PARTITIONED_TABLES:
+            old_name = f"{table_name}_unpartitioned"
+            if args.drop_old:
+                if _table_exists(db, old_name):
+                    db.execute(text(f'DROP TABLE "{old_name}"'))
+                    db.commit()
+                    print(f"🗑️  Dropped {old_name}")
+                continue
+
+            if is_partitioned(db, table_name):
+                print(f"✅ {table_name} is already partitioned")
+                continue
+            if _table_exists(db, old_name):
+                print(f"❌ {old_name} already exists; drop it before converting {table_name}")
+                continue
+
+            result = convert_to_partitioned(db, table_name)
+            print(f"✅ {table_name}: copied {result['rows']} rows into {result['months']} monthly partitions")
+            print(f"   The old rows are still in {result['old_table']}; rerun with --drop-old once checked")
+    finally:
+        db.close()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Rebuild Campaign Stats Script
+
+Recomputes the campaign_step_stats rollup (per-campaign and per-step enrolled, active,
+sent, opened, clicked, replied, completed and last send) from lead_sequences and
+sequence_emails. The send pipeline and tracking handlers keep the table current; run
+this after restoring data or editing rows by hand. It locks the table, stalling sends
+and tracking flushes while it runs; --correct instead fixes drift campaign by campaign
+without the table lock, which is what the scheduler does nightly.
+"""
+
+import sys
+import os
+import argparse
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from models import CampaignStepStats
+from services.campaign_stats import COUNTER_COLUMNS, correct_campaign_stats, rebuild_campaign_stats
+
+def _snapshot(db, campaign_id=None):
+    query = db.query(CampaignStepStats)
+    if campaign_id is not None:
+        query = query.filter(CampaignStepStats.sequence_id == campaign_id)
+    return {
+        (row.sequence_id, row.step_number): tuple(getattr(row, column) for column in COUNTER_COLUMNS)
+        for row in query
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the campaign stats rollup from raw data")
+    parser.add_argument("--campaign", type=int, default=None, help="Only this campaign id")
+    parser.add_argument("--correct", action="store_true",
+                        help="Apply only the differences, one campaign at a time, without locking the table")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        before = _snapshot(db, args.campaign)
+        if args.correct:
+            rows = correct_campaign_stats(db, campaign_id=args.campaign)
+        else:
+            rows = rebuild_campaign_stats(db, campaign_id=args.campaign)
+        after = _snapshot(db, args.campaign)
+    finally:
+        db.close()
+
+    drifted = sorted(key for key in set(before) | set(after) if before.get(key) != after.get(key))
+    print(f"✅ {'Corrected' if args.correct else 'Rebuilt'} {rows} campaign stats rows")
+    print(f"📊 Rows that had drifted: {len(drifted)}")
+    for campaign_id, step_number in drifted[:20]:
+        print(f"   campaign {campaign_id} step {step_number}: "
+              f"{dict(zip(COUNTER_COLUMNS, before.get((campaign_id, step_number), ())))} -> "
+              f"{dict(zip(COUNTER_COLUMNS, after.get((campaign_id, step_number), ())))}")
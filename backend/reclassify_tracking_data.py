@@ -4,235 +4,364 @@ Reclassify Historic Tracking Data Script
 
 This script applies updated confidence scoring logic to existing tracking data
 in the database, useful after improving the tracking algorithm.
+
+Emails are processed in chunks, keyset-paginated by tracking id with send times joined
+in SQL. Scoring runs in a process pool while the next chunk is read, and every chunk is
+written with bulk updates and committed together with a checkpoint file, so an
+interrupted run resumes where it stopped with --resume.
 """
 
 import sys
 import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import exists, or_
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
 
 # Add backend directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import get_db, engine
+from database import engine
 from models import EmailTrackingEvent, EmailOpenAnalysis, CampaignEmail
-from modern_tracking_service import ModernOpenTracker
+from modern_tracking_service import ModernOpenTracker, TrackingSignal
+from services.open_analysis import write_stats
+from services.campaign_stats import record_engagement
+from services.tracking_signals import MemorySignalStore
 
-def reclassify_tracking_events():
-    """Reclassify all tracking events using updated logic"""
-    
-    print("🔄 Starting tracking data reclassification...")
-    
-    # Create database session
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".reclassify_checkpoint.json")
+SIGNIFICANT_CHANGE = 0.01
+
+# (tracking_id, campaign_email_id, lead_sequence_id, sent_at, events); events are
+# (id, timestamp, event_type, signal_type, user_agent, ip_address, old_confidence, metadata)
+EmailBatch = Tuple[str, int, int, datetime, List[Tuple]]
+
+_worker_tracker: Optional[ModernOpenTracker] = None
+
+def _init_worker():
+    global _worker_tracker
+    # Scoring only; workers never read or write signals
+    _worker_tracker = ModernOpenTracker(store=MemorySignalStore(maxsize=1))
+
+def score_emails(emails: List[EmailBatch]) -> List[Dict]:
+    """Rescore each email's events and rebuild its running stats; runs in a pool worker"""
+    tracker = _worker_tracker or ModernOpenTracker(store=MemorySignalStore(maxsize=1))
+    results = []
+    for tracking_id, campaign_email_id, lead_sequence_id, send_time, events in emails:
+        event_updates = []
+        signals = []
+        for event_id, timestamp, event_type, signal_type, user_agent, ip_address, old_confidence, metadata in events:
+            scored = tracker.build_signal(signal_type, user_agent or "", ip_address, send_time, timestamp=timestamp)
+            details = {key: value for key, value in scored.metadata.items() if key not in ("user_agent", "ip_address")}
+            event_updates.append({
+                "id": event_id,
+                "timestamp": timestamp,
+                "signal_type": signal_type,
+                "old_confidence": old_confidence,
+                "confidence_score": round(scored.confidence, 2),
+                "is_prefetch": scored.confidence < 0.3,
+                "delay_from_send": int((timestamp - send_time).total_seconds()),
+                "event_metadata": {**(metadata or {}), **details, "confidence": scored.confidence}
+            })
+            signals.append(TrackingSignal(event_type, signal_type, scored.confidence,
+                                          {"ip_address": ip_address}, timestamp))
+
+        stats = tracker.build_stats(signals, send_time)
+        results.append({
+            "tracking_id": tracking_id,
+            "campaign_email_id": campaign_email_id,
+            "lead_sequence_id": lead_sequence_id,
+            "events": event_updates,
+            "stats": stats,
+            "analysis": tracker.analysis_from_stats(stats)
+        })
+    return results
+
+def _emails_with_events(db):
+    return db.query(CampaignEmail).filter(
+        CampaignEmail.sent_at.isnot(None),
+        CampaignEmail.tracking_pixel_id.isnot(None),
+        exists().where(EmailTrackingEvent.tracking_id == CampaignEmail.tracking_pixel_id)
+    )
+
+def fetch_chunk(db, after: str, chunk_size: int) -> List[EmailBatch]:
+    """The next `chunk_size` emails after tracking id `after`, with their events, in two queries"""
+    emails = _emails_with_events(db).with_entities(
+        CampaignEmail.tracking_pixel_id, CampaignEmail.id, CampaignEmail.lead_sequence_id, CampaignEmail.sent_at
+    ).filter(CampaignEmail.tracking_pixel_id > after).order_by(
+        CampaignEmail.tracking_pixel_id
+    ).limit(chunk_size).all()
+    if not emails:
+        return []
+
+    events: Dict[str, List[Tuple]] = {email.tracking_pixel_id: [] for email in emails}
+    rows = db.query(
+        EmailTrackingEvent.id, EmailTrackingEvent.timestamp, EmailTrackingEvent.event_type,
+        EmailTrackingEvent.signal_type, EmailTrackingEvent.user_agent, EmailTrackingEvent.ip_address,
+        EmailTrackingEvent.confidence_score, EmailTrackingEvent.event_metadata, EmailTrackingEvent.tracking_id
+    ).filter(
+        EmailTrackingEvent.tracking_id.in_(list(events))
+    ).order_by(EmailTrackingEvent.tracking_id, EmailTrackingEvent.id)
+    for row in rows:
+        metadata = row.event_metadata or {}
+        old_confidence = metadata.get("confidence", float(row.confidence_score or 0.0))
+        events[row.tracking_id].append((
+            row.id, row.timestamp, row.event_type, row.signal_type, row.user_agent, row.ip_address,
+            old_confidence, metadata
+        ))
+
+    return [(email.tracking_pixel_id, email.id, email.lead_sequence_id, email.sent_at, events[email.tracking_pixel_id])
+            for email in emails]
+
+def _score_chunk(pool: Optional[ProcessPoolExecutor], chunk: List[EmailBatch], workers: int):
+    """Start scoring a chunk; returns a callable that waits for and returns the results"""
+    if pool is None:
+        results = score_emails(chunk)
+        return lambda: results
+    size = max(1, -(-len(chunk) // workers))
+    futures = [pool.submit(score_emails, chunk[start:start + size]) for start in range(0, len(chunk), size)]
+    return lambda: [result for future in futures for result in future.result()]
+
+def write_results(db, results: List[Dict]) -> Dict[str, int]:
+    """Bulk-update events, open analyses and opens for one scored chunk; the caller commits"""
+    db.bulk_update_mappings(EmailTrackingEvent, [
+        {key: event[key] for key in ("id", "timestamp", "confidence_score", "is_prefetch", "delay_from_send", "event_metadata")}
+        for result in results for event in result["events"]
+    ])
+
+    tracking_ids = [result["tracking_id"] for result in results]
+    rows = {row.tracking_id: row for row in db.query(EmailOpenAnalysis).filter(
+        EmailOpenAnalysis.tracking_id.in_(tracking_ids)
+    )}
+    was_opened = {tracking_id: bool(row.is_opened) for tracking_id, row in rows.items()}
+
+    opened_email_ids = []
+    for result in results:
+        row = rows.get(result["tracking_id"])
+        if row is None:
+            row = EmailOpenAnalysis(
+                tracking_id=result["tracking_id"],
+                lead_sequence_id=result["lead_sequence_id"],
+                sequence_email_id=result["campaign_email_id"]
+            )
+            db.add(row)
+        write_stats(row, result["stats"], result["analysis"])
+        if result["analysis"]["is_opened"]:
+            opened_email_ids.append(result["campaign_email_id"])
+
+    newly_opened_ids = []
+    if opened_email_ids:
+        newly_opened_ids = [email_id for (email_id,) in db.query(CampaignEmail.id).filter(
+            CampaignEmail.id.in_(opened_email_ids),
+            or_(CampaignEmail.opens == 0, CampaignEmail.opens.is_(None))
+        )]
+    if newly_opened_ids:
+        db.query(CampaignEmail).filter(CampaignEmail.id.in_(newly_opened_ids)).update(
+            {CampaignEmail.opens: 1}, synchronize_session=False
+        )
+        record_engagement(db, opened_email_ids=newly_opened_ids)
+
+    return {
+        "emails": len(results),
+        "events": sum(len(result["events"]) for result in results),
+        "changed_events": sum(
+            1 for result in results for event in result["events"]
+            if abs(event["event_metadata"]["confidence"] - event["old_confidence"]) > SIGNIFICANT_CHANGE
+        ),
+        "newly_opened": len(newly_opened_ids),
+        "no_longer_opened": sum(
+            1 for result in results
+            if was_opened.get(result["tracking_id"]) and not result["analysis"]["is_opened"]
+        )
+    }
+
+def diff_results(db, results: List[Dict]) -> Dict:
+    """What write_results would change, without writing: counts plus the changed rows"""
+    was_opened = dict(db.query(EmailOpenAnalysis.tracking_id, EmailOpenAnalysis.is_opened).filter(
+        EmailOpenAnalysis.tracking_id.in_([result["tracking_id"] for result in results])
+    ).all())
+    changed_events = [
+        (result["tracking_id"], event["signal_type"], event["old_confidence"], event["event_metadata"]["confidence"])
+        for result in results for event in result["events"]
+        if abs(event["event_metadata"]["confidence"] - event["old_confidence"]) > SIGNIFICANT_CHANGE
+    ]
+    flips = [
+        (result["tracking_id"], bool(was_opened.get(result["tracking_id"])), result["analysis"]["is_opened"],
+         result["analysis"]["confidence_score"])
+        for result in results
+        if bool(was_opened.get(result["tracking_id"])) != result["analysis"]["is_opened"]
+    ]
+    return {
+        "emails": len(results),
+        "events": sum(len(result["events"]) for result in results),
+        "changed_events": changed_events,
+        "flips": flips
+    }
+
+def _load_checkpoint(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def _save_checkpoint(path: str, checkpoint: Dict):
+    checkpoint["updated_at"] = datetime.utcnow().isoformat()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _print_progress(done: int, total: int, events: int, started: float):
+    elapsed = max(time.monotonic() - started, 1e-6)
+    rate = done / elapsed
+    eta = (total - done) / rate if rate else 0
+    print(f"  ⏳ {done}/{total} emails ({done / max(total, 1):.0%}), {events} events, "
+          f"{rate:.0f} emails/s, ETA {eta:.0f}s")
+
+def run_reclassification(chunk_size: int = 500, workers: Optional[int] = None, dry_run: bool = False,
+                         checkpoint_path: str = DEFAULT_CHECKPOINT, resume: bool = False,
+                         limit: Optional[int] = None, on_chunk=None) -> Dict:
+    """
+    Rescore tracking history chunk by chunk
+
+    Applies and commits each chunk and advances the checkpoint, unless `dry_run`, in which
+    case `on_chunk(diff)` receives each chunk's diff_results and nothing is written.
+    `limit` stops after that many emails.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
-    
+
+    checkpoint = {"after": "", "totals": {}, "started_at": datetime.utcnow().isoformat()}
+    if resume and not dry_run and os.path.exists(checkpoint_path):
+        checkpoint = _load_checkpoint(checkpoint_path)
+        print(f"↩️  Resuming after tracking id {checkpoint['after']!r}")
+    totals = checkpoint["totals"]
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers > 1 else None
     try:
-        # Get all tracking events with their campaign email info
-        tracking_events = db.query(EmailTrackingEvent).join(
-            CampaignEmail, 
-            EmailTrackingEvent.tracking_id == CampaignEmail.tracking_pixel_id
-        ).all()
-        
-        if not tracking_events:
-            print("❌ No tracking events found to reclassify")
-            return
-        
-        print(f"📊 Found {len(tracking_events)} tracking events to reclassify")
-        
-        # Initialize tracker with updated logic
-        tracker = ModernOpenTracker()
-        
-        # Group events by tracking_id for batch processing
-        tracking_groups = {}
-        for event in tracking_events:
-            if event.tracking_id not in tracking_groups:
-                tracking_groups[event.tracking_id] = []
-            tracking_groups[event.tracking_id].append(event)
-        
-        print(f"🎯 Processing {len(tracking_groups)} unique tracking IDs")
-        
-        updated_events = 0
-        updated_analyses = 0
-        newly_opened = 0
-        
-        for tracking_id, events in tracking_groups.items():
-            # Get the campaign email for send time
-            campaign_email = db.query(CampaignEmail).filter(
-                CampaignEmail.tracking_pixel_id == tracking_id
-            ).first()
-            
-            if not campaign_email or not campaign_email.sent_at:
-                print(f"⚠️  Skipping {tracking_id} - no send time found")
-                continue
-                
-            send_time = campaign_email.sent_at
-            
-            # Recalculate confidence for each event
-            for event in events:
-                # Apply new timing analysis
-                is_prefetch_timing, timing_confidence = tracker.analyze_timing(
-                    send_time, event.timestamp
-                )
-                
-                # Apply new user agent analysis
-                is_prefetch_ua, ua_confidence = tracker.analyze_user_agent(
-                    event.user_agent or ""
-                )
-                
-                # Calculate new confidence score
-                base_confidence = 0.8 if not (is_prefetch_ua or is_prefetch_timing) else 0.2
-                new_confidence = base_confidence * ua_confidence * timing_confidence
-                
-                # Update the database record
-                old_confidence = float(event.confidence_score) if event.confidence_score else 0.0
-                event.confidence_score = new_confidence
-                event.is_prefetch = new_confidence < 0.3
-                event.delay_from_send = int((event.timestamp - send_time).total_seconds())
-                
-                if abs(new_confidence - old_confidence) > 0.01:  # Only count significant changes
-                    updated_events += 1
-                    print(f"  📝 {tracking_id} {event.signal_type}: {old_confidence:.3f} → {new_confidence:.3f}")
-            
-            # Recalculate aggregated analysis
-            # Simulate the tracker's signal format for analysis
-            signals = []
-            for event in events:
-                signal = type('Signal', (), {
-                    'signal_type': event.signal_type,
-                    'confidence': float(event.confidence_score),
-                    'timestamp': event.timestamp,
-                    'metadata': event.event_metadata or {}
-                })()
-                signals.append(signal)
-            
-            # Calculate overall confidence
-            overall_confidence = tracker.calculate_confidence_score(signals, send_time)
-            is_opened = overall_confidence > 0.3
-            
-            # Update or create EmailOpenAnalysis
-            analysis = db.query(EmailOpenAnalysis).filter(
-                EmailOpenAnalysis.tracking_id == tracking_id
-            ).first()
-            
-            if not analysis:
-                analysis = EmailOpenAnalysis(
-                    tracking_id=tracking_id,
-                    lead_sequence_id=campaign_email.lead_sequence_id,
-                    sequence_email_id=campaign_email.id
-                )
-                db.add(analysis)
-            
-            old_opened_status = analysis.is_opened
-            
-            # Update analysis data
-            analysis.total_signals = len(signals)
-            analysis.confidence_score = overall_confidence
-            analysis.is_opened = is_opened
-            analysis.first_open_at = min(s.timestamp for s in signals) if signals else None
-            analysis.last_activity_at = max(s.timestamp for s in signals) if signals else None
-            analysis.prefetch_signals = sum(1 for s in signals if s.confidence < 0.3)
-            analysis.human_signals = sum(1 for s in signals if s.confidence > 0.7)
-            analysis.updated_at = datetime.utcnow()
-            
-            updated_analyses += 1
-            
-            # Check if this became a newly recognized open
-            if is_opened and not old_opened_status:
-                newly_opened += 1
-                # Update campaign email opens counter
-                campaign_email.opens = max(campaign_email.opens, 1)
-                print(f"  ✅ {tracking_id} now recognized as OPENED (confidence: {overall_confidence:.3f})")
-            elif not is_opened and old_opened_status:
-                print(f"  ❌ {tracking_id} no longer considered opened (confidence: {overall_confidence:.3f})")
-        
-        # Commit all changes
-        db.commit()
-        
-        print("\n🎉 Reclassification Complete!")
-        print(f"📊 Updated {updated_events} individual tracking events")
-        print(f"🔍 Updated {updated_analyses} aggregated analyses")
-        print(f"✅ Newly recognized opens: {newly_opened}")
-        
-        if newly_opened > 0:
-            print(f"📈 Your open rate improved by identifying {newly_opened} additional opens!")
-            
-    except Exception as e:
-        print(f"❌ Error during reclassification: {e}")
+        total = _emails_with_events(db).filter(CampaignEmail.tracking_pixel_id > checkpoint["after"]).count()
+        if limit:
+            total = min(total, limit)
+        print(f"📊 {total} emails with tracking events to process ({workers} worker(s), chunks of {chunk_size})")
+
+        started = time.monotonic()
+        done = 0
+        after = checkpoint["after"]
+        chunk = fetch_chunk(db, after, min(chunk_size, total))
+        while chunk and done < total:
+            pending = _score_chunk(pool, chunk, workers)
+            after = chunk[-1][0]
+            done += len(chunk)
+            # Read the next chunk while the pool scores this one
+            next_chunk = fetch_chunk(db, after, min(chunk_size, total - done)) if done < total else []
+            results = pending()
+
+            if dry_run:
+                diff = diff_results(db, results)
+                db.rollback()
+                for key in ("emails", "events"):
+                    totals[key] = totals.get(key, 0) + diff[key]
+                totals["changed_events"] = totals.get("changed_events", 0) + len(diff["changed_events"])
+                totals["flips"] = totals.get("flips", 0) + len(diff["flips"])
+                if on_chunk:
+                    on_chunk(diff)
+            else:
+                counts = write_results(db, results)
+                db.commit()
+                for key, value in counts.items():
+                    totals[key] = totals.get(key, 0) + value
+                checkpoint["after"] = after
+                _save_checkpoint(checkpoint_path, checkpoint)
+
+            _print_progress(done, total, totals.get("events", 0), started)
+            chunk = next_chunk
+
+        if not dry_run and os.path.exists(checkpoint_path) and done >= total and not limit:
+            os.remove(checkpoint_path)
+        return totals
+    except Exception:
         db.rollback()
         raise
     finally:
+        if pool is not None:
+            pool.shutdown()
         db.close()
 
-def preview_changes():
-    """Preview what changes would be made without applying them"""
-    
+def reclassify_tracking_events(chunk_size: int = 500, workers: Optional[int] = None, resume: bool = False,
+                               checkpoint_path: str = DEFAULT_CHECKPOINT):
+    """Reclassify all tracking events using updated logic"""
+
+    print("🔄 Starting tracking data reclassification...")
+
+    try:
+        totals = run_reclassification(chunk_size=chunk_size, workers=workers, resume=resume,
+                                      checkpoint_path=checkpoint_path)
+    except Exception as e:
+        print(f"❌ Error during reclassification: {e}")
+        print("   Progress up to the last completed chunk is saved; rerun with --resume")
+        raise
+
+    print("\n🎉 Reclassification Complete!")
+    print(f"📊 Rescored {totals.get('events', 0)} tracking events ({totals.get('changed_events', 0)} changed significantly)")
+    print(f"🔍 Updated {totals.get('emails', 0)} aggregated analyses")
+    print(f"✅ Newly recognized opens: {totals.get('newly_opened', 0)}")
+    print(f"❌ No longer considered opened: {totals.get('no_longer_opened', 0)}")
+
+def preview_changes(limit: Optional[int] = None, chunk_size: int = 500, workers: Optional[int] = None,
+                    show: int = 20):
+    """Dry run over the history (or its first `limit` emails): report what would change without writing"""
+
     print("👀 Previewing potential changes...")
-    
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    
+
+    shown = {"events": 0, "flips": 0}
+
+    def print_diff(diff: Dict):
+        for tracking_id, signal_type, old_conf, new_conf in diff["changed_events"]:
+            if shown["events"] < show:
+                shown["events"] += 1
+                print(f"  📝 {tracking_id[:12]}... | {signal_type:12s} | {old_conf:8.3f} → {new_conf:8.3f} | {new_conf - old_conf:+7.3f}")
+        for tracking_id, old_opened, new_opened, confidence in diff["flips"]:
+            if shown["flips"] < show:
+                shown["flips"] += 1
+                status = "✅ would become OPENED" if new_opened else "❌ would no longer be opened"
+                print(f"  {status}: {tracking_id[:12]}... (confidence: {confidence:.3f})")
+
     try:
-        # Get sample of current data
-        events = db.query(EmailTrackingEvent).join(
-            CampaignEmail,
-            EmailTrackingEvent.tracking_id == CampaignEmail.tracking_pixel_id
-        ).limit(10).all()
-        
-        if not events:
-            print("❌ No tracking events found")
-            return
-        
-        tracker = ModernOpenTracker()
-        
-        print(f"📋 Sample of {len(events)} events:")
-        print("Tracking ID | Signal | Old Conf | New Conf | Change")
-        print("-" * 60)
-        
-        for event in events:
-            campaign_email = db.query(CampaignEmail).filter(
-                CampaignEmail.tracking_pixel_id == event.tracking_id
-            ).first()
-            
-            if campaign_email and campaign_email.sent_at:
-                is_prefetch_timing, timing_confidence = tracker.analyze_timing(
-                    campaign_email.sent_at, event.timestamp
-                )
-                is_prefetch_ua, ua_confidence = tracker.analyze_user_agent(
-                    event.user_agent or ""
-                )
-                
-                base_confidence = 0.8 if not (is_prefetch_ua or is_prefetch_timing) else 0.2
-                new_confidence = base_confidence * ua_confidence * timing_confidence
-                
-                old_conf = float(event.confidence_score) if event.confidence_score else 0.0
-                change = new_confidence - old_conf
-                
-                print(f"{event.tracking_id[:12]}... | {event.signal_type:6s} | {old_conf:8.3f} | {new_confidence:8.3f} | {change:+7.3f}")
-                
+        totals = run_reclassification(chunk_size=chunk_size, workers=workers, dry_run=True,
+                                      limit=limit, on_chunk=print_diff)
     except Exception as e:
         print(f"❌ Error during preview: {e}")
-    finally:
-        db.close()
+        return
+
+    print("\n📋 Preview summary (nothing was written):")
+    print(f"   {totals.get('emails', 0)} emails, {totals.get('events', 0)} events")
+    print(f"   {totals.get('changed_events', 0)} events would change confidence by more than {SIGNIFICANT_CHANGE}")
+    print(f"   {totals.get('flips', 0)} emails would change opened status")
 
 if __name__ == "__main__":
     import argparse
-    
+
     parser = argparse.ArgumentParser(description="Reclassify historic tracking data")
     parser.add_argument("--preview", action="store_true", help="Preview changes without applying")
     parser.add_argument("--apply", action="store_true", help="Apply changes to database")
-    
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted --apply run from its checkpoint")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Emails per chunk (one commit each)")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: CPU count; 1 = inline)")
+    parser.add_argument("--limit", type=int, default=None, help="Preview only the first N emails")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Checkpoint file for --apply/--resume")
+
     args = parser.parse_args()
-    
+
     if args.preview:
-        preview_changes()
+        preview_changes(limit=args.limit, chunk_size=args.chunk_size, workers=args.workers)
     elif args.apply:
         response = input("⚠️  This will modify your database. Continue? (yes/no): ")
         if response.lower() == 'yes':
-            reclassify_tracking_events()
+            reclassify_tracking_events(chunk_size=args.chunk_size, workers=args.workers, resume=args.resume,
+                                       checkpoint_path=args.checkpoint)
         else:
             print("Cancelled.")
     else:
         print("Use --preview to see potential changes or --apply to execute")
-        print("Example: python reclassify_tracking_data.py --preview")
\ No newline at end of file
+        print("Example: python reclassify_tracking_data.py --preview")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Reconcile Send Slots Script
+
+Lists send slots held as "unconfirmed": the dispatch failed after the email was handed to
+Gmail, so it may or may not have gone out, and the lead is kept out of planning until
+someone checks. Look for the email in the mailbox's Sent folder, then settle the slot:
+
+    python reconcile_send_slots.py                     # list unconfirmed slots
+    python reconcile_send_slots.py --sent 42 [--gmail-message-id ID]
+    python reconcile_send_slots.py --not-sent 42       # the draft is planned again
+
+Unconfirmed slots that already know their Gmail message id are settled automatically by
+the dispatcher.
+"""
+
+import sys
+import os
+import argparse
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from models import CampaignEmail, Lead, LeadCampaign, SendSlot
+from services.email_batch import resolve_unconfirmed_slot
+
+def list_unconfirmed(db):
+    rows = db.query(SendSlot, CampaignEmail.subject, Lead.email).join(
+        CampaignEmail, SendSlot.sequence_email_id == CampaignEmail.id
+    ).join(
+        LeadCampaign, SendSlot.lead_sequence_id == LeadCampaign.id
+    ).join(
+        Lead, LeadCampaign.lead_id == Lead.id
+    ).filter(SendSlot.status == "unconfirmed").order_by(SendSlot.dispatched_at).all()
+
+    print(f"📋 {len(rows)} unconfirmed send slots")
+    for slot, subject, lead_email in rows:
+        print(f"   slot {slot.id}: {lead_email} \"{subject}\" handed to Gmail {slot.dispatched_at} "
+              f"(mailbox {slot.sending_profile_id or 'default'}) - {slot.error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List and settle send slots whose outcome is unknown")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--sent", type=int, metavar="SLOT_ID", help="The email is in the Sent folder")
+    group.add_argument("--not-sent", type=int, metavar="SLOT_ID", help="The email never went out")
+    parser.add_argument("--gmail-message-id", default=None, help="Message id found in the Sent folder")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.sent is None and args.not_sent is None:
+            list_unconfirmed(db)
+        else:
+            slot_id = args.sent if args.sent is not None else args.not_sent
+            if resolve_unconfirmed_slot(db, slot_id, sent=args.sent is not None, gmail_message_id=args.gmail_message_id):
+                print(f"✅ Slot {slot_id} recorded as {'sent' if args.sent is not None else 'not sent'}")
+            else:
+                print(f"❌ Slot {slot_id} is not unconfirmed")
+                sys.exit(1)
+    finally:
+        db.close()
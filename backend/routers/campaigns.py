@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import List
 from datetime import datetime, timedelta
 
 from database import get_db
 from logger_config import get_logger
-from models import Campaign, CampaignStep, LeadCampaign, Lead, User, CampaignEmail
+from models import Campaign, CampaignStep, LeadCampaign, Lead, User, SendJob, SendSlot, CampaignStepStats
 from dependencies import get_current_active_user
+from services.draft_pregen import invalidate_drafts
+from services.send_jobs import enqueue_send_job
+from services.campaign_stats import campaign_summary_query, record_enrollments, record_status_change
+from services.counters import read_campaign_email_opens
+from services.response_cache import CAMPAIGNS, response_cache
 from schemas.campaign import (
     CampaignCreate, 
     CampaignResponse, 
@@ -19,9 +23,11 @@ from schemas.campaign import (
     CampaignProgress,
     CampaignProgressSummary,
     EnrolledLeadResponse,
-    CampaignWithProgress
+    CampaignWithProgress,
+    CampaignStepStatsResponse
 )
 from schemas.common import PaginationParams, PaginatedResponse
+from schemas.send_job import SendJobResponse, SendJobQueuedResponse, SendJobProgress, SendJobEmailOutcome
 
 router = APIRouter(prefix="/campaigns", tags=["campaigns"])
 logger = get_logger(__name__)
@@ -57,6 +63,7 @@ def create_campaign(campaign: CampaignCreate, db: Session = Depends(get_db), cur
             db.add(db_step)
         
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         db.refresh(db_campaign)
         return db_campaign
         
@@ -64,6 +71,23 @@ def create_campaign(campaign: CampaignCreate, db: Session = Depends(get_db), cur
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Failed to create campaign: {str(e)}")
 
+def _progress_from_stats(stats) -> dict:
+    """List progress fields from a campaign's rolled-up totals (services/campaign_stats.py)"""
+    total_leads = stats.enrolled if stats else 0
+    emails_sent = stats.sent if stats else 0
+    emails_opened = stats.opened if stats else 0
+    emails_clicked = stats.clicked if stats else 0
+    return {
+        "total_leads": total_leads,
+        "emails_sent": emails_sent,
+        "emails_opened": emails_opened,
+        "emails_clicked": emails_clicked,
+        "completion_rate": float(emails_sent / total_leads * 100) if total_leads > 0 else 0.0,
+        "open_rate": float(emails_opened / emails_sent * 100) if emails_sent > 0 else 0.0,
+        "click_rate": float(emails_clicked / emails_sent * 100) if emails_sent > 0 else 0.0,
+        "last_sent_at": stats.last_sent_at if stats else None
+    }
+
 @router.get("/paginated", response_model=PaginatedResponse[CampaignWithProgress])
 def get_campaigns_paginated(
     pagination: PaginationParams = Depends(),
@@ -78,51 +102,30 @@ def get_campaigns_paginated(
         # Calculate offset
         offset = (pagination.page - 1) * pagination.per_page
         
-        # Get paginated campaigns
-        campaigns = (
-            db.query(Campaign)
+        # Campaigns with their rolled-up progress in one query
+        rows = (
+            campaign_summary_query(db)
             .filter(Campaign.status == "active")
+            .order_by(Campaign.id)
             .offset(offset)
             .limit(pagination.per_page)
             .all()
         )
         
-        # Build campaigns with progress data to avoid N+1 queries
         campaigns_with_progress = []
-        for campaign in campaigns:
-            # Calculate progress stats efficiently
-            total_leads = db.query(LeadCampaign).filter(
-                LeadCampaign.sequence_id == campaign.id
-            ).count() or 0
-            
-            emails_sent = db.query(func.distinct(CampaignEmail.lead_sequence_id)).filter(
-                CampaignEmail.lead_sequence_id.in_(
-                    db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign.id)
-                ),
-                CampaignEmail.status == "sent"
-            ).count() or 0
-            
-            emails_opened = db.query(func.distinct(CampaignEmail.lead_sequence_id)).filter(
-                CampaignEmail.lead_sequence_id.in_(
-                    db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign.id)
-                ),
-                CampaignEmail.opens > 0
-            ).count() or 0
-            
-            completion_rate = (emails_sent / total_leads * 100) if total_leads > 0 else 0
-            open_rate = (emails_opened / emails_sent * 100) if emails_sent > 0 else 0
-            
+        for campaign, stats, _ in rows:
+            progress = _progress_from_stats(stats)
             campaigns_with_progress.append(CampaignWithProgress(
                 id=campaign.id,
                 name=campaign.name,
                 description=campaign.description,
                 status=campaign.status,
                 created_at=campaign.created_at,
-                total_leads=total_leads,
-                emails_sent=emails_sent,
-                emails_opened=emails_opened,
-                completion_rate=round(completion_rate, 1),
-                open_rate=round(open_rate, 1)
+                total_leads=progress["total_leads"],
+                emails_sent=progress["emails_sent"],
+                emails_opened=progress["emails_opened"],
+                completion_rate=round(progress["completion_rate"], 1),
+                open_rate=round(progress["open_rate"], 1)
             ))
         
         return PaginatedResponse.create(
@@ -176,6 +179,9 @@ def update_campaign(campaign_id: int, campaign: CampaignCreate, db: Session = De
         db_campaign.sending_profile_id = campaign.sending_profile_id
         db_campaign.updated_at = datetime.utcnow()
         
+        # Steps are recreated below, so any unsent drafts are now stale
+        invalidate_drafts(db, campaign_id=campaign_id, reason="campaign updated")
+        
         # Delete existing steps
         db.query(CampaignStep).filter(CampaignStep.sequence_id == campaign_id).delete()
         
@@ -196,6 +202,7 @@ def update_campaign(campaign_id: int, campaign: CampaignCreate, db: Session = De
             db.add(db_step)
         
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         db.refresh(db_campaign)
         return db_campaign
         
@@ -225,6 +232,7 @@ def delete_campaign(campaign_id: int, db: Session = Depends(get_db), current_use
     campaign.status = "inactive"
     campaign.updated_at = datetime.utcnow()
     db.commit()
+    response_cache.invalidate(CAMPAIGNS)
     
     return {"message": "Sequence deleted successfully"}
 
@@ -256,8 +264,12 @@ def update_campaign_step(
         for field, value in update_data.items():
             setattr(step, field, value)
         
+        if "ai_prompt" in update_data or "include_previous_emails" in update_data:
+            invalidate_drafts(db, step_id=step.id, reason="step prompt updated")
+        
         step.updated_at = datetime.utcnow()
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         db.refresh(step)
         
         logger.info(f"Campaign step {step_id} updated by user {current_user.id}")
@@ -320,7 +332,9 @@ def enroll_leads_in_campaign(
             db.add(lead_campaign)
             created_enrollments.append(lead_campaign)
         
+        record_enrollments(db, campaign_id, len(created_enrollments))
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         
         # Refresh all created enrollments
         for enrollment in created_enrollments:
@@ -379,108 +393,10 @@ def get_campaign_leads(campaign_id: int, db: Session = Depends(get_db), current_
     ]
 
 @router.get("/all/progress", response_model=List[CampaignProgressSummary])
-def get_campaigns_progress(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+def get_campaigns_progress(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Get progress stats for all campaigns (for dashboard)"""
     try:
-        campaigns = db.query(Campaign).filter(Campaign.status == "active").all()
-        logger.debug(f"Found {len(campaigns)} active campaigns", extra={"campaign_count": len(campaigns)})
-        
-        progress_data = []
-        for campaign in campaigns:
-            try:
-                # Get total leads enrolled - ensure it's an integer
-                total_leads = db.query(LeadCampaign).filter(
-                    LeadCampaign.sequence_id == campaign.id
-                ).count() or 0
-                
-                # Get total leads who have received emails - ensure it's an integer
-                emails_sent = db.query(func.distinct(CampaignEmail.lead_sequence_id)).filter(
-                    CampaignEmail.lead_sequence_id.in_(
-                        db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign.id)
-                    ),
-                    CampaignEmail.status == "sent"
-                ).count() or 0
-                
-                # Get total leads who opened and clicked - ensure they're integers
-                emails_opened = db.query(func.distinct(CampaignEmail.lead_sequence_id)).filter(
-                    CampaignEmail.lead_sequence_id.in_(
-                        db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign.id)
-                    ),
-                    CampaignEmail.opens > 0
-                ).count() or 0
-                
-                emails_clicked = db.query(func.distinct(CampaignEmail.lead_sequence_id)).filter(
-                    CampaignEmail.lead_sequence_id.in_(
-                        db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign.id)
-                    ),
-                    CampaignEmail.clicks > 0
-                ).count() or 0
-                
-                # Calculate rates
-                completion_rate = (emails_sent / total_leads * 100) if total_leads > 0 else 0
-                open_rate = (emails_opened / emails_sent * 100) if emails_sent > 0 else 0
-                click_rate = (emails_clicked / emails_sent * 100) if emails_sent > 0 else 0
-                
-                # Get last sent at
-                last_sent_email = db.query(CampaignEmail).filter(
-                    CampaignEmail.lead_sequence_id.in_(
-                        db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign.id)
-                    ),
-                    CampaignEmail.status == "sent"
-                ).order_by(CampaignEmail.sent_at.desc()).first()
-                
-                last_sent_at = last_sent_email.sent_at if last_sent_email else None
-                
-                # Get first step subject as the campaign "subject"
-                first_step = db.query(CampaignStep).filter(
-                    CampaignStep.sequence_id == campaign.id,
-                    CampaignStep.step_number == 1
-                ).first()
-                subject = first_step.subject if first_step and first_step.subject else "No subject"
-                
-                # Ensure all fields have safe values and correct types
-                safe_name = campaign.name or "Unnamed Campaign"
-                safe_status = campaign.status or "unknown"
-                safe_id = int(campaign.id) if campaign.id is not None else 0
-                safe_total_leads = int(total_leads) if total_leads is not None else 0
-                safe_emails_sent = int(emails_sent) if emails_sent is not None else 0
-                safe_emails_opened = int(emails_opened) if emails_opened is not None else 0
-                safe_emails_clicked = int(emails_clicked) if emails_clicked is not None else 0
-                
-                # Also ensure created_at is valid
-                safe_created_at = campaign.created_at if campaign.created_at is not None else datetime.utcnow()
-                
-                logger.debug(f"Campaign {safe_id}: leads={safe_total_leads}, sent={safe_emails_sent}, opened={safe_emails_opened}", extra={
-                    "campaign_id": safe_id,
-                    "total_leads": safe_total_leads, 
-                    "emails_sent": safe_emails_sent,
-                    "emails_opened": safe_emails_opened
-                })
-                
-                progress_data.append(CampaignProgressSummary(
-                    id=safe_id,
-                    name=safe_name,
-                    subject=subject,
-                    status=safe_status,
-                    total_leads=safe_total_leads,
-                    emails_sent=safe_emails_sent,
-                    emails_opened=safe_emails_opened,
-                    emails_clicked=safe_emails_clicked,
-                    completion_rate=float(completion_rate),
-                    open_rate=float(open_rate),
-                    click_rate=float(click_rate),
-                    last_sent_at=last_sent_at,
-                    created_at=safe_created_at
-                ))
-            except Exception as e:
-                logger.error(f"Error processing campaign {campaign.id}: {e}", extra={
-                    "campaign_id": campaign.id,
-                    "error": str(e),
-                    "error_type": type(e).__name__
-                }, exc_info=True)
-                continue
-        
-        return progress_data
+        return response_cache.respond(request, "campaign_progress", current_user, lambda: _campaigns_progress(db))
     
     except Exception as e:
         logger.error(f"Error in get_campaigns_progress: {e}", extra={
@@ -489,6 +405,22 @@ def get_campaigns_progress(db: Session = Depends(get_db), current_user: User = D
         }, exc_info=True)
         return []
 
+def _campaigns_progress(db: Session) -> List[CampaignProgressSummary]:
+    rows = campaign_summary_query(db).filter(Campaign.status == "active").order_by(Campaign.id).all()
+    logger.debug(f"Found {len(rows)} active campaigns", extra={"campaign_count": len(rows)})
+    
+    return [
+        CampaignProgressSummary(
+            id=campaign.id,
+            name=campaign.name or "Unnamed Campaign",
+            subject=subject or "No subject",
+            status=campaign.status or "unknown",
+            created_at=campaign.created_at or datetime.utcnow(),
+            **_progress_from_stats(stats)
+        )
+        for campaign, stats, subject in rows
+    ]
+
 @router.get("/{campaign_id}/progress", response_model=CampaignProgress)
 def get_campaign_progress(campaign_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Get progress stats for a specific campaign"""
@@ -520,9 +452,38 @@ def get_campaign_progress(campaign_id: int, db: Session = Depends(get_db), curre
         completed_leads=completed_leads,
         stopped_leads=stopped_leads,
         replied_leads=replied_leads,
-        avg_step=avg_step
+        avg_step=avg_step,
+        email_opens=read_campaign_email_opens(db, [campaign_id])[campaign_id]
     )
 
+@router.get("/{campaign_id}/step-stats", response_model=List[CampaignStepStatsResponse])
+def get_campaign_step_stats(campaign_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    """Rolled-up totals per step; step 0 is the whole campaign counted per lead"""
+    campaign = db.query(Campaign).filter(Campaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    rows = db.query(CampaignStepStats).filter(
+        CampaignStepStats.sequence_id == campaign_id
+    ).order_by(CampaignStepStats.step_number).all()
+    
+    return [
+        CampaignStepStatsResponse(
+            step_number=row.step_number,
+            enrolled=row.enrolled,
+            active=row.active,
+            completed=row.completed,
+            stopped=row.stopped,
+            replied=row.replied,
+            sent=row.sent,
+            opened=row.opened,
+            clicked=row.clicked,
+            open_rate=round(row.opened / row.sent * 100, 1) if row.sent else 0.0,
+            click_rate=round(row.clicked / row.sent * 100, 1) if row.sent else 0.0,
+            last_sent_at=row.last_sent_at
+        ) for row in rows
+    ]
+
 @router.delete("/{campaign_id}/leads/{lead_id}")
 def remove_lead_from_campaign(campaign_id: int, lead_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     """Remove a lead from a campaign"""
@@ -535,10 +496,12 @@ def remove_lead_from_campaign(campaign_id: int, lead_id: int, db: Session = Depe
     if not lead_campaign:
         raise HTTPException(status_code=404, detail="Lead campaign enrollment not found")
     
+    record_status_change(db, campaign_id, lead_campaign.status, "stopped")
     lead_campaign.status = "stopped"
     lead_campaign.stop_reason = "manually_removed"
     lead_campaign.updated_at = datetime.utcnow()
     db.commit()
+    response_cache.invalidate(CAMPAIGNS)
     
     return {"message": "Lead removed from campaign"}
 
@@ -558,6 +521,7 @@ def pause_campaign(campaign_id: int, db: Session = Depends(get_db), current_user
     campaign.status = "paused"
     campaign.updated_at = datetime.utcnow()
     db.commit()
+    response_cache.invalidate(CAMPAIGNS)
     
     logger.info(f"Campaign {campaign_id} paused by user {current_user.id}")
     return {"message": "Campaign paused successfully", "status": "paused"}
@@ -575,22 +539,71 @@ def unpause_campaign(campaign_id: int, db: Session = Depends(get_db), current_us
     campaign.status = "active"
     campaign.updated_at = datetime.utcnow()
     db.commit()
+    response_cache.invalidate(CAMPAIGNS)
     
     logger.info(f"Campaign {campaign_id} unpaused by user {current_user.id}")
     return {"message": "Campaign unpaused successfully", "status": "active"}
 
-@router.post("/send")
+@router.post("/send", response_model=SendJobQueuedResponse, status_code=202)
 def trigger_campaign_emails(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
-    """Trigger sending of all due campaign emails"""
-    from services.email_batch import send_campaign_batch
-    
+    """Queue a send job for all due campaign emails; poll /campaigns/send/jobs/{job_id} for progress"""
     try:
-        result = send_campaign_batch()
-        return {
-            "message": "Sequence emails processed successfully",
-            "emails_sent": result.get("emails_sent", 0),
-            "campaigns_processed": result.get("campaigns_processed", 0),
-            "errors": result.get("errors", [])
-        }
+        job = enqueue_send_job(db, trigger="manual", user_id=current_user.id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to send campaign emails: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to queue campaign emails: {str(e)}")
+
+    logger.info(f"Send job {job.id} queued by user {current_user.id}")
+    return {
+        "message": "Send job queued",
+        "job_id": job.id,
+        "status": job.status
+    }
+
+@router.get("/send/jobs/{job_id}", response_model=SendJobResponse)
+def get_send_job(job_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    """Progress and per-email outcomes of a send job"""
+    job = db.query(SendJob).filter(SendJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Send job not found")
+
+    slots = db.query(SendSlot, Lead.id, Lead.email).outerjoin(
+        LeadCampaign, SendSlot.lead_sequence_id == LeadCampaign.id
+    ).outerjoin(
+        Lead, LeadCampaign.lead_id == Lead.id
+    ).filter(SendSlot.send_job_id == job_id).order_by(SendSlot.scheduled_for.asc()).all()
+
+    status_counts = {}
+    for slot, _, _ in slots:
+        status_counts[slot.status] = status_counts.get(slot.status, 0) + 1
+
+    return SendJobResponse(
+        id=job.id,
+        status=job.status,
+        trigger=job.trigger,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        progress=SendJobProgress(
+            drafts_created=job.drafts_created or 0,
+            drafts_failed=job.drafts_failed or 0,
+            slots_planned=job.slots_planned or 0,
+            emails_sent=status_counts.get("sent", 0),
+            emails_failed=status_counts.get("failed", 0),
+            emails_cancelled=status_counts.get("cancelled", 0),
+            emails_pending=status_counts.get("planned", 0) + status_counts.get("dispatching", 0)
+        ),
+        emails=[
+            SendJobEmailOutcome(
+                slot_id=slot.id,
+                lead_id=lead_id,
+                lead_email=lead_email,
+                campaign_email_id=slot.sequence_email_id,
+                status=slot.status,
+                scheduled_for=slot.scheduled_for,
+                dispatched_at=slot.dispatched_at,
+                error=slot.error
+            )
+            for slot, lead_id, lead_email in slots
+        ]
+    )
@@ -7,6 +7,7 @@ from database import get_db
 from models import Lead
 from models.user import User
 from models.groups import LeadGroup, LeadGroupMembership
+from services.response_cache import LEADS, response_cache
 from schemas.csv_upload import CSVUploadRequest, CSVPreviewRequest, CSVPreviewResponse
 from schemas.lead import LeadCreate, LeadResponse
 from schemas.groups import LeadGroupCreate
@@ -176,6 +177,7 @@ def upload_csv_leads(csv_request: CSVUploadRequest, db: Session = Depends(get_db
     
     if created_leads:
         db.commit()
+        response_cache.invalidate(LEADS)
         for lead in created_leads:
             db.refresh(lead)
         
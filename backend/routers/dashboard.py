@@ -1,116 +1,69 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import date, datetime, timedelta
+from sqlalchemy import extract, func
+from datetime import date, datetime
+from typing import Optional
+import asyncio
+import json
 import os
 
-from database import get_db
-from models import Lead, Campaign, DailyStats, User, CampaignEmail, EmailTrackingEvent, LinkClick, LeadCampaign
-from schemas.dashboard import DashboardStats, TodayActivity, ActivityEvent, TodaysHighlight
+from database import get_db, SessionLocal
+from models import Lead, Campaign, User, ActivityFeedEvent
+from schemas.dashboard import DashboardStats, TodayActivity, ActivityEvent, ActivityFeedPage, TodaysHighlight
+from schemas.analytics import OpenScoringSimulationRequest, OpenScoringSimulationResponse
 from dependencies import get_current_active_user
+from services.mailboxes import total_daily_capacity
+from services.counters import read_daily_stats
+from services.open_scoring import ScoringParams, simulate_open_rates
+from services.activity_feed import EMAIL_SENT, activity_broadcaster, list_activity, to_feed_item
+from services.response_cache import response_cache
 
 router = APIRouter(tags=["dashboard"])
 
 @router.get("/dashboard", response_model=DashboardStats)
-def get_dashboard_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+def get_dashboard_stats(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    return response_cache.respond(request, "dashboard", current_user, lambda: _dashboard_stats(db))
+
+def _dashboard_stats(db: Session) -> DashboardStats:
     total_leads = db.query(Lead).filter(Lead.status == "active").count()
     active_campaigns = db.query(Campaign).filter(Campaign.status == "active").count()
     
     today = date.today()
-    daily_stats = db.query(DailyStats).filter(DailyStats.date == today).first()
+    daily_stats = read_daily_stats(db, today)
     
-    emails_sent_today = daily_stats.emails_sent if daily_stats else 0
-    emails_opened_today = daily_stats.emails_opened if daily_stats else 0
+    emails_sent_today = daily_stats["emails_sent"]
+    emails_opened_today = daily_stats["emails_opened"]
     
     return DashboardStats(
         total_leads=total_leads,
         emails_sent_today=emails_sent_today,
         emails_opened_today=emails_opened_today,
         active_campaigns=active_campaigns,
-        daily_limit=int(os.getenv("DAILY_EMAIL_LIMIT", 30))
+        daily_limit=total_daily_capacity(db)
     )
 
 @router.get("/dashboard/today-activity", response_model=TodayActivity)
-def get_today_activity(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+def get_today_activity(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    return response_cache.respond(request, "today_activity", current_user, lambda: _today_activity(db))
+
+def _today_activity(db: Session) -> TodayActivity:
     today = date.today()
     today_start = datetime.combine(today, datetime.min.time())
     today_end = datetime.combine(today, datetime.max.time())
     
-    # Get recent events from today (last 20 events)
-    recent_events = []
-    
-    # Email sends today
-    sent_emails = db.query(CampaignEmail).filter(
-        and_(CampaignEmail.sent_at >= today_start, CampaignEmail.sent_at <= today_end)
-    ).order_by(CampaignEmail.sent_at.desc()).limit(10).all()
-    
-    for email in sent_emails:
-        lead_campaign = db.query(LeadCampaign).filter(LeadCampaign.id == email.lead_sequence_id).first()
-        campaign = None
-        if lead_campaign:
-            campaign = db.query(Campaign).filter(Campaign.id == lead_campaign.sequence_id).first()
-        
-        recent_events.append(ActivityEvent(
-            id=email.id,
-            type="email_sent",
-            title="Email Sent",
-            description=f"Email sent: {email.subject[:50]}...",
-            timestamp=email.sent_at,
-            campaign_name=campaign.name if campaign else "Unknown Campaign",
-            lead_email=None,
-            metadata={"subject": email.subject}
-        ))
-    
-    # Email opens today
-    opens_today = db.query(EmailTrackingEvent).filter(
-        and_(
-            EmailTrackingEvent.event_type == "open",
-            EmailTrackingEvent.timestamp >= today_start,
-            EmailTrackingEvent.timestamp <= today_end
-        )
-    ).order_by(EmailTrackingEvent.timestamp.desc()).limit(10).all()
-    
-    for open_event in opens_today:
-        recent_events.append(ActivityEvent(
-            id=open_event.id,
-            type="email_opened",
-            title="Email Opened",
-            description="Email was opened",
-            timestamp=open_event.timestamp,
-            campaign_name=None,
-            lead_email=None,
-            metadata={"tracking_id": open_event.tracking_id}
-        ))
-    
-    # Link clicks today
-    clicks_today = db.query(LinkClick).filter(
-        and_(LinkClick.clicked_at >= today_start, LinkClick.clicked_at <= today_end)
-    ).order_by(LinkClick.clicked_at.desc()).limit(5).all()
-    
-    for click in clicks_today:
-        recent_events.append(ActivityEvent(
-            id=click.id,
-            type="email_clicked",
-            title="Link Clicked",
-            description=f"Clicked: {click.original_url[:50]}...",
-            timestamp=click.clicked_at,
-            campaign_name=None,
-            lead_email=None,
-            metadata={"url": click.original_url}
-        ))
-    
-    # Sort all events by timestamp desc
-    recent_events.sort(key=lambda x: x.timestamp, reverse=True)
-    recent_events = recent_events[:20]  # Keep only the 20 most recent
+    # Most recent 20 events from the activity feed: one range scan, no per-event lookups
+    recent_events = [ActivityEvent(**to_feed_item(event)) for event in list_activity(db, since=today_start, limit=20)]
     
     # Generate highlights
     highlights = []
     
     # Today's stats
-    daily_stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-    emails_sent_today = daily_stats.emails_sent if daily_stats else 0
-    emails_opened_today = daily_stats.emails_opened if daily_stats else 0
-    daily_limit = int(os.getenv("DAILY_EMAIL_LIMIT", 30))
+    daily_stats = read_daily_stats(db, today)
+    emails_sent_today = daily_stats["emails_sent"]
+    emails_opened_today = daily_stats["emails_opened"]
+    daily_limit = total_daily_capacity(db)
     
     # Progress highlight
     if emails_sent_today > 0:
@@ -134,12 +87,15 @@ def get_today_activity(db: Session = Depends(get_db), current_user: User = Depen
             is_positive=open_rate > 20
         ))
     
-    # Generate hourly send rate (simplified - could be enhanced with actual hourly data)
+    # Hourly send rate from today's send events
+    hour = extract("hour", ActivityFeedEvent.occurred_at)
     hourly_send_rate = [0] * 24
-    for email in sent_emails:
-        if email.sent_at:
-            hour = email.sent_at.hour
-            hourly_send_rate[hour] += 1
+    for sent_hour, sent in db.query(hour, func.count()).filter(
+        ActivityFeedEvent.event_type == EMAIL_SENT,
+        ActivityFeedEvent.occurred_at >= today_start,
+        ActivityFeedEvent.occurred_at <= today_end
+    ).group_by(hour).all():
+        hourly_send_rate[int(sent_hour)] = sent
     
     # Live metrics
     live_metrics = {
@@ -154,4 +110,82 @@ def get_today_activity(db: Session = Depends(get_db), current_user: User = Depen
         highlights=highlights,
         hourly_send_rate=hourly_send_rate,
         live_metrics=live_metrics
-    )
\ No newline at end of file
+    )
+
+@router.post("/dashboard/open-scoring/simulate", response_model=OpenScoringSimulationResponse)
+def simulate_open_scoring(request: OpenScoringSimulationRequest, db: Session = Depends(get_db),
+                          current_user: User = Depends(get_current_active_user)):
+    """Per-campaign open rates if open scoring used the given weights/threshold; nothing is written"""
+    overrides = request.model_dump(exclude={"campaign_id", "refresh"}, exclude_none=True)
+    params = ScoringParams.from_tracker().with_overrides(**overrides)
+    return simulate_open_rates(db, params, campaign_id=request.campaign_id, refresh=request.refresh)
+
+@router.get("/dashboard/activity", response_model=ActivityFeedPage)
+def get_activity_feed(
+    cursor: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Activity feed, newest first, paged by event id"""
+    events = list_activity(db, before_id=cursor, limit=limit)
+    return ActivityFeedPage(
+        events=[ActivityEvent(**to_feed_item(event)) for event in events],
+        next_cursor=events[-1].id if len(events) == limit else None
+    )
+
+ACTIVITY_STREAM_HEARTBEAT_SECONDS = float(os.getenv("ACTIVITY_STREAM_HEARTBEAT_SECONDS", 15))
+
+def _server_sent_event(item: dict) -> str:
+    return f"id: {item['id']}\nevent: activity\ndata: {json.dumps(jsonable_encoder(item))}\n\n"
+
+def _activity_after(last_id: int) -> list:
+    db = SessionLocal()
+    try:
+        return [to_feed_item(event) for event in list_activity(db, after_id=last_id, limit=500)]
+    finally:
+        db.close()
+
+@router.get("/dashboard/activity/stream")
+async def stream_activity(
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Server-sent events: one `activity` event per new feed event, as it happens
+
+    A reconnecting client's Last-Event-ID header replays what it missed from the table.
+    """
+    # Only needed for authentication; don't hold a pooled connection for the stream's lifetime
+    db.close()
+    queue = activity_broadcaster.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            replayed = set()
+            if last_event_id and last_event_id.isdigit():
+                for item in await asyncio.to_thread(_activity_after, int(last_event_id)):
+                    replayed.add(item["id"])
+                    yield _server_sent_event(item)
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=ACTIVITY_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break  # fell too far behind; the client reconnects with Last-Event-ID
+                if item["id"] not in replayed:
+                    yield _server_sent_event(item)
+        finally:
+            activity_broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, func, and_
 from datetime import date, datetime, timedelta
@@ -11,6 +11,7 @@ from models import (
 )
 from dependencies import get_current_active_user
 from services.deliverability_monitor import DeliverabilityMonitor
+from services.response_cache import DELIVERABILITY, response_cache
 
 router = APIRouter(prefix="/deliverability", tags=["deliverability"])
 
@@ -124,16 +125,21 @@ def resolve_alert(
     alert.is_resolved = True
     alert.resolved_at = datetime.utcnow()
     db.commit()
+    response_cache.invalidate(DELIVERABILITY)
     
     return {"message": "Alert resolved successfully"}
 
 @router.get("/metrics/trend")
 def get_deliverability_trend(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
     days: int = 30
 ):
     """Get deliverability trend data over time"""
+    return response_cache.respond(request, "deliverability_trend", current_user, lambda: _deliverability_trend(db, days))
+
+def _deliverability_trend(db: Session, days: int) -> List[Dict[str, Any]]:
     start_date = datetime.utcnow() - timedelta(days=days)
     
     # Get daily counts of issues
@@ -230,10 +236,14 @@ def get_postmaster_data(
 
 @router.get("/health-score")
 def get_health_score(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """Get current deliverability health score and breakdown"""
+    return response_cache.respond(request, "deliverability_health", current_user, lambda: _health_score(db))
+
+def _health_score(db: Session) -> Dict[str, Any]:
     monitor = DeliverabilityMonitor()
     summary = monitor.get_deliverability_summary(db)
     
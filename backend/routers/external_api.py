@@ -9,6 +9,9 @@ from models import Lead, User, Campaign, LeadCampaign, APIKey, CampaignStep
 from schemas.lead import LeadCreate, LeadResponse
 from schemas.campaign import CampaignCreate, CampaignResponse, CampaignDetail, CampaignStepResponse, CampaignStepUpdate, EnrolledLeadResponse
 from services.auth import AuthService
+from services.campaign_stats import record_enrollments
+from services.draft_pregen import invalidate_drafts
+from services.response_cache import CAMPAIGNS, LEADS, response_cache
 
 router = APIRouter(prefix="/external", tags=["external-api"])
 logger = get_logger(__name__)
@@ -74,6 +77,7 @@ def create_lead_external(
         db_lead = Lead(**lead_data)
         db.add(db_lead)
         db.commit()
+        response_cache.invalidate(LEADS)
         db.refresh(db_lead)
         
         # If campaign_id provided, enroll lead in campaign
@@ -96,7 +100,9 @@ def create_lead_external(
                     next_send_at=datetime.utcnow()  # Set to now so it sends in next batch
                 )
                 db.add(lead_campaign)
+                record_enrollments(db, campaign_id)
                 db.commit()
+                response_cache.invalidate(LEADS)
                 
                 logger.info(f"External API: Lead {db_lead.id} enrolled in campaign {campaign_id} by user {current_user.id}")
         
@@ -183,6 +189,7 @@ def create_leads_bulk_external(
         
         if created_leads:
             db.commit()
+            response_cache.invalidate(LEADS)
             for lead in created_leads:
                 db.refresh(lead)
             
@@ -207,6 +214,7 @@ def create_leads_bulk_external(
                             next_send_at=datetime.utcnow()  # Set to now so it sends in next batch
                         )
                         db.add(lead_campaign)
+                        record_enrollments(db, campaign_id)
                         
                         logger.info(f"External API: Lead {lead_id} enrolled in campaign {campaign_id}")
                 except Exception as e:
@@ -214,6 +222,7 @@ def create_leads_bulk_external(
             
             # Commit campaign enrollments
             db.commit()
+            response_cache.invalidate(LEADS)
         
         result = {
             "created": len(created_leads),
@@ -401,6 +410,7 @@ def create_campaign_external(
             db.add(db_step)
         
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         db.refresh(db_campaign)
         
         logger.info(f"External API: Campaign created successfully: {db_campaign.id} by user {current_user.id}")
@@ -471,6 +481,9 @@ def update_campaign_external(
         db_campaign.sending_profile_id = campaign.sending_profile_id
         db_campaign.updated_at = datetime.utcnow()
         
+        # Steps are recreated below, so any unsent drafts are now stale
+        invalidate_drafts(db, campaign_id=campaign_id, reason="campaign updated")
+        
         # Delete existing steps
         db.query(CampaignStep).filter(CampaignStep.sequence_id == campaign_id).delete()
         
@@ -491,6 +504,7 @@ def update_campaign_external(
             db.add(db_step)
         
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         db.refresh(db_campaign)
         
         logger.info(f"External API: Campaign {campaign_id} updated by user {current_user.id}")
@@ -545,6 +559,7 @@ def delete_campaign_external(
         campaign.status = "inactive"
         campaign.updated_at = datetime.utcnow()
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         
         logger.info(f"External API: Campaign {campaign_id} deleted (soft) by user {current_user.id}")
         return {
@@ -591,6 +606,7 @@ def pause_campaign_external(
         campaign.status = "paused"
         campaign.updated_at = datetime.utcnow()
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         
         logger.info(f"External API: Campaign {campaign_id} paused by user {current_user.id}")
         return {
@@ -634,6 +650,7 @@ def unpause_campaign_external(
         campaign.status = "active"
         campaign.updated_at = datetime.utcnow()
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         
         logger.info(f"External API: Campaign {campaign_id} unpaused by user {current_user.id}")
         return {
@@ -692,8 +709,12 @@ def update_campaign_step_external(
         for field, value in update_data.items():
             setattr(step, field, value)
         
+        if "ai_prompt" in update_data or "include_previous_emails" in update_data:
+            invalidate_drafts(db, step_id=step.id, reason="step prompt updated")
+        
         step.updated_at = datetime.utcnow()
         db.commit()
+        response_cache.invalidate(CAMPAIGNS)
         db.refresh(step)
         
         logger.info(f"External API: Campaign step {step_id} updated by user {current_user.id}")
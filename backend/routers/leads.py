@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, distinct, func, or_
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import base64
+import json
 
 from database import get_db
 from logger_config import get_logger
 from models import Lead, User, CampaignEmail, LeadCampaign, Campaign, CampaignStep
+from services.campaign_stats import record_enrollments
+from services.response_cache import LEADS, response_cache
 from schemas.lead import LeadCreate, LeadUpdate, LeadResponse
 from schemas.common import PaginationParams, PaginatedResponse
 from dependencies import get_current_active_user
@@ -86,99 +91,117 @@ def filter_leads(
     leads = query.offset(skip).limit(limit).all()
     return leads
 
+def _open_details(db: Session):
+    """Per-lead list of its opened emails as one JSON aggregate (json_agg on Postgres)"""
+    sent_at = CampaignEmail.sent_at
+    if db.get_bind().dialect.name == "sqlite":
+        build, aggregate, sent_at = func.json_object, func.json_group_array, func.replace(sent_at, " ", "T")
+    else:
+        build, aggregate = func.json_build_object, func.json_agg
+    return aggregate(build(
+        "type", "sequence",
+        "name", func.coalesce(Campaign.name, "Unknown"),
+        "id", LeadCampaign.sequence_id,
+        "opens", CampaignEmail.opens,
+        "sent_at", sent_at,
+        "tracking_id", CampaignEmail.tracking_pixel_id
+    ))
+
+def _encode_cursor(last_sent_at: datetime, lead_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([last_sent_at.isoformat(), lead_id]).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        last_sent_at, lead_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(last_sent_at), int(lead_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/opened-emails")  
 def get_leads_who_opened_emails(
     sequence_id: Optional[int] = None,
     campaign_id: Optional[int] = None,
     days: Optional[int] = 30,
-    skip: int = 0,
-    limit: int = 10000,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10000, ge=1, le=10000),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
+    """
+    Leads with opened emails, most recently sent first, each with its opened emails
+
+    One grouped query builds the page and a COUNT(DISTINCT) query the total. Pass the
+    returned `next_cursor` as `cursor` for keyset paging (skip is then ignored).
+    """
+    logger.info(f"get_leads_who_opened_emails called with: sequence_id={sequence_id}, campaign_id={campaign_id}, days={days}", extra={
+        "sequence_id": sequence_id,
+        "campaign_id": campaign_id,
+        "days": days
+    })
+    
+    # Campaigns are sequences now, so campaign_id filters the same way
+    sequence_id = sequence_id or campaign_id
+    after = _decode_cursor(cursor) if cursor else None
+    
     try:
-        from datetime import datetime, timedelta
+        def opened(query):
+            query = query.join(
+                LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+            ).join(
+                Lead, LeadCampaign.lead_id == Lead.id
+            ).filter(CampaignEmail.opens > 0)
+            if days:
+                query = query.filter(CampaignEmail.sent_at >= datetime.utcnow() - timedelta(days=days))
+            if sequence_id:
+                query = query.filter(LeadCampaign.sequence_id == sequence_id)
+            return query
         
-        logger.info(f"get_leads_who_opened_emails called with: sequence_id={sequence_id}, campaign_id={campaign_id}, days={days}", extra={
-            "sequence_id": sequence_id,
-            "campaign_id": campaign_id,
-            "days": days
-        })
+        total = opened(db.query(func.count(distinct(Lead.id))).select_from(CampaignEmail)).scalar() or 0
         
-        result = []
-        cutoff_date = None
-        if days:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
+        last_sent_at = func.coalesce(func.max(CampaignEmail.sent_at), datetime(1970, 1, 1))
+        page = opened(db.query(
+            Lead.id, Lead.email, Lead.first_name, Lead.last_name, Lead.company, Lead.title, Lead.industry,
+            func.sum(CampaignEmail.opens).label("total_opens"),
+            last_sent_at.label("last_sent_at"),
+            _open_details(db).label("opens_data")
+        ).select_from(CampaignEmail)).outerjoin(
+            Campaign, Campaign.id == LeadCampaign.sequence_id
+        ).group_by(Lead.id).order_by(last_sent_at.desc(), Lead.id.desc())
         
-        # Get sequence opens
-        if not campaign_id:  # Include sequences unless specifically asking for campaigns
-            sequence_emails = db.query(CampaignEmail).filter(CampaignEmail.opens > 0)
-            if cutoff_date:
-                sequence_emails = sequence_emails.filter(CampaignEmail.sent_at >= cutoff_date)
-            
-            for se in sequence_emails.all():
-                # Get lead sequence info
-                lead_campaign = db.query(LeadCampaign).filter(LeadCampaign.id == se.lead_sequence_id).first()
-                if not lead_campaign:
-                    continue
-                    
-                # Filter by sequence_id if specified
-                if sequence_id and lead_campaign.sequence_id != sequence_id:
-                    continue
-                
-                # Get lead info
-                lead = db.query(Lead).filter(Lead.id == lead_campaign.lead_id).first()
-                if not lead:
-                    continue
-                
-                # Get sequence info
-                sequence_info = db.query(Campaign).filter(Campaign.id == lead_campaign.sequence_id).first()
-                
-                # Check if lead already in results
-                existing_lead = next((r for r in result if r["id"] == lead.id), None)
-                if existing_lead:
-                    existing_lead["opens_data"].append({
-                        "type": "sequence",
-                        "name": sequence_info.name if sequence_info else "Unknown",
-                        "id": lead_campaign.sequence_id,
-                        "opens": se.opens,
-                        "sent_at": se.sent_at.isoformat() if se.sent_at else None,
-                        "tracking_id": se.tracking_pixel_id
-                    })
-                    existing_lead["total_opens"] += se.opens
-                else:
-                    result.append({
-                        "id": lead.id,
-                        "email": lead.email,
-                        "first_name": lead.first_name,
-                        "last_name": lead.last_name,
-                        "company": lead.company,
-                        "title": lead.title,
-                        "industry": lead.industry,
-                        "opens_data": [{
-                            "type": "sequence",
-                            "name": sequence_info.name if sequence_info else "Unknown",
-                            "id": lead_campaign.sequence_id,
-                            "opens": se.opens,
-                            "sent_at": se.sent_at.isoformat() if se.sent_at else None,
-                            "tracking_id": se.tracking_pixel_id
-                        }],
-                        "total_opens": se.opens
-                    })
+        if after:
+            page = page.having(or_(
+                last_sent_at < after[0],
+                and_(last_sent_at == after[0], Lead.id < after[1])
+            ))
+        else:
+            page = page.offset(skip)
+        rows = page.limit(limit).all()
         
-        # Note: campaigns are now just sequences, no need for separate campaign opens handling
-        
-        # Apply pagination
-        total = len(result)
-        result = result[skip:skip + limit]
+        result = []
+        for row in rows:
+            opens_data = json.loads(row.opens_data) if isinstance(row.opens_data, str) else row.opens_data
+            opens_data.sort(key=lambda open_data: open_data["sent_at"] or "", reverse=True)
+            result.append({
+                "id": row.id,
+                "email": row.email,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "company": row.company,
+                "title": row.title,
+                "industry": row.industry,
+                "opens_data": opens_data,
+                "total_opens": int(row.total_opens or 0)
+            })
         
+        last = rows[-1] if len(rows) == limit else None
         return {
             "leads": result,
-            "total": total
+            "total": total,
+            "next_cursor": _encode_cursor(last.last_sent_at, last.id) if last else None
         }
         
     except Exception as e:
-        import traceback
         logger.error(f"Error in get_leads_who_opened_emails: {str(e)}", extra={
             "sequence_id": sequence_id,
             "campaign_id": campaign_id,
@@ -216,6 +239,7 @@ def create_lead(lead: LeadCreate, db: Session = Depends(get_db), current_user: U
     db_lead = Lead(**lead_data)
     db.add(db_lead)
     db.commit()
+    response_cache.invalidate(LEADS)
     db.refresh(db_lead)
     
     # If campaign_id provided, enroll lead in campaign
@@ -238,7 +262,9 @@ def create_lead(lead: LeadCreate, db: Session = Depends(get_db), current_user: U
                 next_send_at=datetime.utcnow()  # Set to now so it sends in next batch
             )
             db.add(lead_campaign)
+            record_enrollments(db, campaign_id)
             db.commit()
+            response_cache.invalidate(LEADS)
             
             logger.info(f"Lead {db_lead.id} enrolled in campaign {campaign_id}")
     
@@ -264,6 +290,7 @@ def update_lead(lead_id: int, lead_update: LeadUpdate, db: Session = Depends(get
     
     db_lead.updated_at = datetime.utcnow()
     db.commit()
+    response_cache.invalidate(LEADS)
     db.refresh(db_lead)
     return db_lead
 
@@ -287,6 +314,7 @@ def delete_lead(lead_id: int, db: Session = Depends(get_db), current_user: User
     
     db.delete(db_lead)
     db.commit()
+    response_cache.invalidate(LEADS)
     return {"message": "Lead deleted successfully"}
 
 @router.post("/bulk")
@@ -338,6 +366,7 @@ def create_leads_bulk(leads: List[LeadCreate], db: Session = Depends(get_db), cu
     
     if created_leads:
         db.commit()
+        response_cache.invalidate(LEADS)
         for lead in created_leads:
             db.refresh(lead)
         
@@ -362,6 +391,7 @@ def create_leads_bulk(leads: List[LeadCreate], db: Session = Depends(get_db), cu
                         next_send_at=datetime.utcnow()  # Set to now so it sends in next batch
                     )
                     db.add(lead_campaign)
+                    record_enrollments(db, campaign_id)
                     
                     logger.info(f"Lead {lead_id} enrolled in campaign {campaign_id}")
             except Exception as e:
@@ -369,6 +399,7 @@ def create_leads_bulk(leads: List[LeadCreate], db: Session = Depends(get_db), cu
         
         # Commit campaign enrollments
         db.commit()
+        response_cache.invalidate(LEADS)
     
     return {
         "created": len(created_leads),
@@ -1,15 +1,33 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import datetime
 
 from database import get_db
 from models.sending_profile import SendingProfile
 from models import User
 from schemas.sending_profile import SendingProfileCreate, SendingProfileUpdate, SendingProfileResponse
 from dependencies import get_current_active_user
+from services.draft_pregen import invalidate_drafts
+from services.credential_crypto import encrypt_secret, CredentialEncryptionError
 
 router = APIRouter(prefix="/sending-profiles", tags=["sending-profiles"])
 
+SECRET_FIELDS = {
+    "gmail_client_secret": "gmail_client_secret_encrypted",
+    "gmail_refresh_token": "gmail_refresh_token_encrypted",
+}
+
+def _encrypt_secret_fields(data: dict) -> dict:
+    """Swap plaintext mailbox secrets in a create/update payload for their encrypted columns"""
+    for field, column in SECRET_FIELDS.items():
+        if field in data:
+            try:
+                data[column] = encrypt_secret(data.pop(field))
+            except CredentialEncryptionError as e:
+                raise HTTPException(status_code=500, detail=f"Cannot store mailbox credentials: {str(e)}")
+    return data
+
 @router.get("", response_model=List[SendingProfileResponse])
 def get_sending_profiles(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
     profiles = db.query(SendingProfile).all()
@@ -24,7 +42,7 @@ def get_sending_profile(profile_id: int, db: Session = Depends(get_db), current_
 
 @router.post("", response_model=SendingProfileResponse)
 def create_sending_profile(profile: SendingProfileCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
-    db_profile = SendingProfile(**profile.dict())
+    db_profile = SendingProfile(**_encrypt_secret_fields(profile.dict()))
     db.add(db_profile)
     db.commit()
     db.refresh(db_profile)
@@ -36,10 +54,12 @@ def update_sending_profile(profile_id: int, profile_update: SendingProfileUpdate
     if not db_profile:
         raise HTTPException(status_code=404, detail="Sending profile not found")
     
-    update_data = profile_update.dict(exclude_unset=True)
+    update_data = _encrypt_secret_fields(profile_update.dict(exclude_unset=True))
     for field, value in update_data.items():
         setattr(db_profile, field, value)
     
+    db_profile.updated_at = datetime.utcnow()
+    invalidate_drafts(db, sending_profile_id=profile_id, reason="sending profile updated")
     db.commit()
     db.refresh(db_profile)
     return db_profile
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User
+from dependencies import get_current_active_user
+from services.rspamd_client import rspamd_client
+from services.circuit_breaker import breakers
+from modern_tracking_service import modern_tracker
+from services.tracking_ingest import tracking_ingest
+from services.counters import counters
+from services.tracking_partitions import partition_stats
+from services.activity_feed import activity_broadcaster
+from services.response_cache import response_cache
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+@router.get("/rspamd-cache")
+def get_rspamd_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Hit/miss counters of this API process's Rspamd scan cache"""
+    return rspamd_client.cache_stats()
+
+@router.get("/tracking-signal-cache")
+def get_tracking_signal_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Hit/miss counters of this API process's tracking signal cache"""
+    return modern_tracker.store.stats()
+
+@router.get("/bot-classifier")
+def get_bot_classifier_stats(current_user: User = Depends(get_current_active_user)):
+    """Rule counts, last load time and UA cache counters of the tracking bot classifier"""
+    return modern_tracker.classifier.stats()
+
+@router.get("/tracking-partitions")
+def get_tracking_partitions(db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    """Monthly partitions of the tracking tables with estimated row counts, flagging tables retention cannot act on"""
+    return partition_stats(db)
+
+@router.get("/tracking-ingest")
+def get_tracking_ingest_stats(current_user: User = Depends(get_current_active_user)):
+    """Queue depth, throughput and flush latency of this API process's tracking write-behind buffer"""
+    return tracking_ingest.stats()
+
+@router.get("/counters")
+def get_counter_buffer_stats(current_user: User = Depends(get_current_active_user)):
+    """Pending deltas and flush counts of this API process's counter buffer"""
+    return counters.stats()
+
+@router.get("/activity-stream")
+def get_activity_stream_stats(current_user: User = Depends(get_current_active_user)):
+    """Live subscribers and poll/delivery counts of this API process's activity stream"""
+    return activity_broadcaster.stats()
+
+@router.get("/response-cache")
+def get_response_cache_stats(current_user: User = Depends(get_current_active_user)):
+    """Backend, per-endpoint TTLs, hit rate and 304s of the dashboard response cache"""
+    return response_cache.stats()
+
+@router.get("/circuit-breakers")
+def get_circuit_breakers(current_user: User = Depends(get_current_active_user)):
+    """State, adaptive timeout and latency percentiles of each external dependency's breaker"""
+    return [breaker.snapshot() for breaker in breakers.values()]
+
+@router.post("/circuit-breakers/{name}/reset")
+def reset_circuit_breaker(name: str, current_user: User = Depends(get_current_active_user)):
+    """Close a breaker by hand, e.g. once a dependency is known to be back"""
+    breaker = breakers.get(name)
+    if not breaker:
+        raise HTTPException(status_code=404, detail="Circuit breaker not found")
+    breaker.reset()
+    return breaker.snapshot()
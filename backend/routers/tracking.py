@@ -0,0 +1,222 @@
+from fastapi import APIRouter, Depends, Request, HTTPException
+from fastapi.responses import Response, HTMLResponse, RedirectResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import unquote
+
+from database import get_async_db
+from models import CampaignEmail
+from services.tracking_ingest import make_hit, tracking_ingest
+from services.tracking_tokens import decode_tracking_token
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Pixel traffic is async end to end so scanner bursts never occupy the threadpool
+# the authenticated UI endpoints run in; the only query uses the async engine's own pool
+router = APIRouter(tags=["tracking"])
+
+@lru_cache(maxsize=1)
+def _logo_bytes() -> bytes:
+    with open('/app/logo.png', 'rb') as f:
+        return f.read()
+
+@router.get("/logo.png")
+async def serve_logo_with_tracking(
+    t: str = None,  # tracking_id parameter
+    request: Request = None
+):
+    # If tracking parameter provided, queue the hit for the tracking flusher
+    if t:
+        user_agent = request.headers.get("user-agent", "") if request else ""
+        ip_address = request.client.host if request and request.client else ""
+        
+        logger.info(f"LOGO_TRACKING: Logo loaded for tracking_id {t} from {ip_address}", extra={
+            "tracking_id": t,
+            "signal_type": "LOGO",
+            "ip_address": ip_address,
+            "user_agent": user_agent[:100] if user_agent else "",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        
+        try:
+            await tracking_ingest.submit_async(make_hit("signal", t, "logo", user_agent, ip_address))
+        except Exception as e:
+            logger.error("Failed to process logo tracking", extra={
+                "tracking_id": t,
+                "error": str(e)
+            }, exc_info=True)
+    
+    # Serve the actual logo file
+    try:
+        return Response(
+            content=_logo_bytes(),
+            media_type="image/png",
+            headers={
+                "Cache-Control": "no-cache, no-store, must-revalidate",
+                "Pragma": "no-cache", 
+                "Expires": "0"
+            }
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Logo not found")
+
+@router.get("/track/signal/{tracking_id}/{signal_type}")
+async def track_signal(
+    tracking_id: str, 
+    signal_type: str,
+    request: Request
+):
+    user_agent = request.headers.get("user-agent", "")
+    ip_address = request.client.host if request.client else ""
+    
+    logger.info(f"TRACKING_SIGNAL: {signal_type.upper()} triggered for {tracking_id} from {ip_address}", extra={
+        "tracking_id": tracking_id,
+        "signal_type": signal_type.upper(),
+        "ip_address": ip_address,
+        "user_agent": user_agent[:100] if user_agent else "",
+        "timestamp": datetime.utcnow().isoformat(),
+        "tracking_element": f"{signal_type} tracking element fired"
+    })
+    
+    # Additional debug logging for tracking element identification  
+    signal_descriptions = {
+        "primary": "PRIMARY_PIXEL: Basic image pixel loaded immediately",
+        "secondary": "SECONDARY_PIXEL: CSS background image loaded with delay", 
+        "content": "CONTENT_PIXEL: Content-based image loaded",
+        "interactive": "INTERACTIVE_LINK: User clicked tracking link", 
+        "javascript": "JAVASCRIPT_TRACKING: JS execution after 1s delay",
+        "view": "BROWSER_VIEW: Direct browser view tracking"
+    }
+    
+    description = signal_descriptions.get(signal_type, f"UNKNOWN_SIGNAL_TYPE: {signal_type}")
+    logger.info(f"TRACKING_DETAILS: {description}", extra={
+        "signal_type": signal_type,
+        "element_description": description
+    })
+    
+    # Event insert, open analysis and counters are applied in batches by the tracking flusher
+    try:
+        await tracking_ingest.submit_async(make_hit("signal", tracking_id, signal_type, user_agent, ip_address))
+    except Exception as e:
+        logger.error("Failed to record tracking signal", extra={
+            "tracking_id": tracking_id,
+            "signal_type": signal_type,
+            "error": str(e),
+            "error_type": type(e).__name__
+        }, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to record tracking signal")
+    
+    if signal_type in ['primary', 'secondary', 'content']:
+        pixel_data = bytes.fromhex('47494638396101000100800000000000ffffff21f90401000000002c000000000100010000020144003b')
+        return Response(
+            content=pixel_data, 
+            media_type="image/gif",
+            headers={
+                "Cache-Control": "no-cache, no-store, must-revalidate",
+                "Pragma": "no-cache", 
+                "Expires": "0",
+                "Access-Control-Allow-Origin": "*"
+            }
+        )
+    elif signal_type == 'js':
+        return Response(
+            content='{"status":"tracked"}',
+            media_type="application/json",
+            headers={
+                "Cache-Control": "no-cache, no-store, must-revalidate",
+                "Access-Control-Allow-Origin": "*"
+            }
+        )
+    else:
+        return {"status": "tracked"}
+
+@router.get("/track/click/{tracking_id}")
+async def track_link_click(tracking_id: str, url: str, request: Request):
+    user_agent = request.headers.get("user-agent", "")
+    ip_address = request.client.host if request.client else ""
+    referer = request.headers.get("referer", "")
+    original_url = unquote(url)
+    
+    logger.info("Link click tracked", extra={
+        "tracking_id": tracking_id,
+        "original_url": original_url,
+        "ip_address": ip_address,
+        "user_agent": user_agent[:100] if user_agent else "",
+        "referer": referer
+    })
+    
+    # Spooled to local disk and recorded by the tracking flusher after the redirect has gone
+    # out (at-least-once), so click latency does not depend on the database
+    try:
+        await tracking_ingest.submit_deferred(make_hit(
+            "click", tracking_id, "interactive", user_agent, ip_address,
+            url=original_url, referer=referer
+        ))
+    except Exception as e:
+        logger.error("Failed to record link click", extra={
+            "tracking_id": tracking_id,
+            "error": str(e),
+            "error_type": type(e).__name__
+        }, exc_info=True)
+    
+    logger.info("Redirecting user to original URL", extra={
+        "tracking_id": tracking_id,
+        "redirect_url": original_url
+    })
+    
+    return RedirectResponse(url=original_url, status_code=302)
+
+# Legacy endpoint for backwards compatibility
+@router.get("/track/open/{pixel_id}")
+async def track_email_open_legacy(pixel_id: str, request: Request):
+    return await track_signal(pixel_id, "primary", request)
+
+@router.get("/track/view/{tracking_id}")
+async def view_email_in_browser(tracking_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Handle 'View this email in your browser' clicks"""
+    logger.info("Browser view requested", extra={"tracking_id": tracking_id})
+    
+    user_agent = request.headers.get("user-agent", "")
+    ip_address = request.client.host if request.client else ""
+    
+    # The view signal (and the open it implies) is recorded by the tracking flusher
+    try:
+        await tracking_ingest.submit_async(make_hit("signal", tracking_id, "view_browser", user_agent, ip_address))
+    except Exception as e:
+        logger.error("Failed to record browser view", extra={
+            "tracking_id": tracking_id,
+            "error": str(e)
+        }, exc_info=True)
+    
+    claims = decode_tracking_token(tracking_id)
+    lookup = CampaignEmail.id == claims.campaign_email_id if claims else CampaignEmail.tracking_pixel_id == tracking_id
+    campaign_email = (await db.execute(select(CampaignEmail).where(lookup))).scalars().first()
+    
+    # Return simple HTML page with email content if available
+    if campaign_email and campaign_email.content:
+        html_content = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1">
+            <title>Email View</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px; }}
+            </style>
+        </head>
+        <body>
+            <div style="border: 1px solid #ddd; padding: 20px; border-radius: 5px;">
+                <h3>Subject: {campaign_email.subject}</h3>
+                <hr>
+                {campaign_email.content}
+            </div>
+        </body>
+        </html>
+        """
+        return HTMLResponse(content=html_content)
+    else:
+        return HTMLResponse(content="<html><body><h2>Email not found</h2></body></html>")
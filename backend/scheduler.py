@@ -3,14 +3,21 @@ import os
 # os.environ["DISABLE_FILE_LOGGING"] = "1"  # Commented out to enable file logging
 
 import schedule
+import threading
 import time
 from datetime import date
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import DailyStats, Campaign, Lead, LeadCampaign, SendingProfile
-from services.email_batch import send_sequence_batch
+from services.email_batch import send_sequence_batch, dispatch_send_slots
+from services.draft_pregen import pregenerate_drafts
+from services.send_jobs import run_queued_send_jobs
+from services.rspamd_client import rspamd_client
 from services.deliverability_monitor import DeliverabilityMonitor
-from email_service import EmailService
+from services.tracking_partitions import maintain_tracking_partitions
+from services.campaign_stats import correct_campaign_stats, ensure_campaign_stats
+from services.activity_feed import prune_activity
+from email_service import get_email_service
 import logging
 
 from logger_config import get_logger
@@ -24,9 +31,10 @@ class EmailScheduler:
         try:
             self.engine = create_engine(os.getenv("DATABASE_URL"))
             self.SessionLocal = sessionmaker(bind=self.engine)
-            self.email_service = EmailService()
+            self.email_service = get_email_service()
             self.deliverability_monitor = DeliverabilityMonitor()
             self.daily_limit = int(os.getenv("DAILY_EMAIL_LIMIT", 30))
+            self._background = {}
             
             logger.info("EmailScheduler initialized successfully", extra={
                 "daily_limit": self.daily_limit,
@@ -40,8 +48,22 @@ class EmailScheduler:
             raise
     
     
+    def _in_background(self, name: str, job):
+        """
+        Start `job` on its own thread so slow work (OpenAI generation) never delays the
+        schedule loop and with it slot dispatch; a tick is skipped while the last run of
+        that job is still going
+        """
+        running = self._background.get(name)
+        if running and running.is_alive():
+            logger.debug(f"{name} still running; skipping this tick")
+            return
+        thread = threading.Thread(target=job, name=name, daemon=True)
+        self._background[name] = thread
+        thread.start()
+    
     def send_sequence_emails(self):
-        """Send sequence emails that are due"""
+        """Plan paced send slots for sequence emails that are due"""
         logger.info("Starting sequence email batch job")
         
         try:
@@ -54,6 +76,50 @@ class EmailScheduler:
             }, exc_info=True)
             raise
     
+    def dispatch_send_slots(self):
+        """Fire planned send slots that have come due"""
+        try:
+            result = dispatch_send_slots()
+            if result.get("emails_sent"):
+                logger.info("Send slot dispatch completed", extra={
+                    "emails_sent": result["emails_sent"],
+                    "errors": result.get("errors", [])
+                })
+        except Exception as e:
+            logger.error("Failed to dispatch send slots", extra={
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+    
+    def run_send_jobs(self):
+        """Run send jobs queued through the API"""
+        try:
+            ran = run_queued_send_jobs()
+            if ran:
+                logger.info("Queued send jobs completed", extra={"send_jobs_run": ran})
+        except Exception as e:
+            logger.error("Failed to run queued send jobs", extra={
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+    
+    def pregenerate_drafts(self):
+        """Generate drafts ahead of time for sequences due within the look-ahead window"""
+        logger.info("Starting draft pre-generation job")
+        
+        try:
+            result = pregenerate_drafts()
+            logger.info("Draft pre-generation completed successfully", extra={
+                "drafts_created": result.get("drafts_created", 0),
+                "drafts_failed": result.get("drafts_failed", 0),
+                "rspamd_cache": rspamd_client.cache_stats()
+            })
+        except Exception as e:
+            logger.error("Failed to pre-generate drafts", extra={
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+    
     def run_deliverability_check(self):
         """Run deliverability monitoring checks"""
         logger.info("Starting deliverability check job")
@@ -73,26 +139,100 @@ class EmailScheduler:
                 "error_type": type(e).__name__
             }, exc_info=True)
     
+    def maintain_tracking_partitions(self):
+        """Create upcoming tracking partitions and drop (after rolling up) expired ones"""
+        try:
+            db = self.SessionLocal()
+            try:
+                result = maintain_tracking_partitions(db)
+                logger.info("Tracking partition maintenance completed", extra=result)
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error("Failed to maintain tracking partitions", extra={
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+    
+    def reconcile_campaign_stats(self, only_if_empty: bool = False):
+        """Correct drift in the campaign stats rollup campaign by campaign, or backfill an empty one"""
+        try:
+            db = self.SessionLocal()
+            try:
+                if only_if_empty:
+                    if ensure_campaign_stats(db):
+                        logger.info("Campaign stats backfilled")
+                else:
+                    rows = correct_campaign_stats(db)
+                    logger.info("Campaign stats reconciled", extra={"corrected_rows": rows})
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error("Failed to reconcile campaign stats", extra={
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+    
+    def prune_activity_feed(self):
+        """Delete activity feed events past their retention window"""
+        try:
+            db = self.SessionLocal()
+            try:
+                deleted = prune_activity(db)
+                logger.info("Activity feed pruned", extra={"deleted": deleted})
+            finally:
+                db.close()
+        except Exception as e:
+            logger.error("Failed to prune activity feed", extra={
+                "error": str(e),
+                "error_type": type(e).__name__
+            }, exc_info=True)
+    
     def start_scheduler(self):
         """Start the email scheduler"""
         logger.info("Starting email scheduler")
         
-        # Schedule sequence emails every 5 minutes
+        # Pre-generate drafts every minute so the send job only has to send them
+        schedule.every(1).minutes.do(self._in_background, "draft-pregen", self.pregenerate_drafts)
+        
+        # Plan send slots for due sequences every 5 minutes
         schedule.every(5).minutes.do(self.send_sequence_emails)
         
+        # Pick up send jobs queued through the API; they generate drafts too, so off the loop as well
+        schedule.every(5).seconds.do(self._in_background, "send-jobs", self.run_send_jobs)
+        
+        # Fire planned send slots as they come due
+        schedule.every(15).seconds.do(self.dispatch_send_slots)
+        
         # Schedule deliverability checks daily at 6 AM
         schedule.every().day.at("06:00").do(self.run_deliverability_check)
         
+        # Keep monthly tracking partitions ahead of time and apply retention daily
+        schedule.every().day.at("03:30").do(self.maintain_tracking_partitions)
+        self.maintain_tracking_partitions()
+        
+        # Correct drift in the campaign stats rollup nightly; backfill it on first start
+        schedule.every().day.at("04:00").do(self.reconcile_campaign_stats)
+        self.reconcile_campaign_stats(only_if_empty=True)
+        
+        # Trim the activity feed to its retention window
+        schedule.every().day.at("03:45").do(self.prune_activity_feed)
+        
         logger.info("Email scheduler configured", extra={
+            "draft_pregen_interval_minutes": 1,
             "sequence_interval_minutes": 5,
+            "send_job_interval_seconds": 5,
+            "dispatch_interval_seconds": 15,
             "deliverability_check_time": "06:00",
-            "sleep_interval_seconds": 60
+            "tracking_partition_maintenance_time": "03:30",
+            "activity_prune_time": "03:45",
+            "sleep_interval_seconds": 5
         })
         
         try:
             while True:
                 schedule.run_pending()
-                time.sleep(60)
+                time.sleep(5)
         except KeyboardInterrupt:
             logger.info("Email scheduler stopped by user")
         except Exception as e:
@@ -6,7 +6,7 @@ from .campaign import (
 )
 from .sending_profile import SendingProfileCreate, SendingProfileUpdate, SendingProfileResponse
 from .groups import LeadGroupCreate, LeadGroupUpdate, LeadGroupResponse, LeadGroupDetail, GroupMembershipUpdate
-from .analytics import LinkClickResponse, ClickAnalytics
+from .analytics import LinkClickResponse, ClickAnalytics, OpenScoringSimulationRequest, OpenScoringSimulationResponse
 from .csv_upload import CSVUploadRequest, CSVPreviewRequest, CSVPreviewResponse
 from .message_preview import MessagePreviewRequest, MessagePreviewResponse
 from .dashboard import DashboardStats
@@ -23,7 +23,7 @@ __all__ = [
     "LeadCampaignCreate", "LeadCampaignResponse", "CampaignProgressSummary",
     "SendingProfileCreate", "SendingProfileUpdate", "SendingProfileResponse",
     "LeadGroupCreate", "LeadGroupUpdate", "LeadGroupResponse", "LeadGroupDetail", "GroupMembershipUpdate",
-    "LinkClickResponse", "ClickAnalytics",
+    "LinkClickResponse", "ClickAnalytics", "OpenScoringSimulationRequest", "OpenScoringSimulationResponse",
     "CSVUploadRequest", "CSVPreviewRequest", "CSVPreviewResponse",
     "MessagePreviewRequest", "MessagePreviewResponse",
     "DashboardStats"
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class LinkClickResponse(BaseModel):
@@ -22,4 +22,37 @@ class ClickAnalytics(BaseModel):
     unique_clicks: int
     click_rate: float
     most_clicked_links: List[dict]
-    recent_clicks: List[LinkClickResponse]
\ No newline at end of file
+    recent_clicks: List[LinkClickResponse]
+class OpenScoringSimulationRequest(BaseModel):
+    campaign_id: Optional[int] = None
+    open_threshold: Optional[float] = Field(None, ge=0, le=1)
+    signal_weights: Optional[Dict[str, float]] = None      # signal type -> weight
+    client_confidences: Optional[Dict[str, float]] = None  # client label -> UA confidence multiplier
+    automated_clients: Optional[Dict[str, bool]] = None    # client label -> treat as prefetch
+    prefetch_penalty: Optional[float] = Field(None, ge=0, le=1)
+    prefetch_timing_factor: Optional[float] = Field(None, ge=0)
+    diversity_bonus_per_type: Optional[float] = Field(None, ge=0)
+    diversity_bonus_cap: Optional[float] = Field(None, ge=0)
+    refresh: bool = False  # reload events instead of reusing the last few minutes' snapshot
+
+class CampaignOpenRateSimulation(BaseModel):
+    campaign_id: int
+    campaign_name: str
+    emails_sent: int
+    recorded_opens: int
+    baseline_opens: int
+    simulated_opens: int
+    baseline_open_rate: float
+    simulated_open_rate: float
+    open_rate_change: float
+
+class OpenScoringSimulationResponse(BaseModel):
+    signals: int
+    emails_with_signals: int
+    data_loaded_at: datetime
+    open_threshold: float
+    emails_changed: int
+    confidence_histogram: List[int]
+    campaigns: List[CampaignOpenRateSimulation]
+    totals: Dict[str, float]
+    elapsed_ms: float
@@ -103,6 +103,7 @@ class CampaignProgress(BaseModel):
     stopped_leads: int
     replied_leads: int
     avg_step: float
+    email_opens: int = 0  # opened emails across all steps (each counted once)
 
 class CampaignProgressSummary(BaseModel):
     id: int
@@ -137,4 +138,20 @@ class EnrolledLeadResponse(BaseModel):
     lead_status: str
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+class CampaignStepStatsResponse(BaseModel):
+    step_number: int  # 0 = the whole campaign, counted per lead
+    enrolled: int
+    active: int
+    completed: int
+    stopped: int
+    replied: int
+    sent: int
+    opened: int
+    clicked: int
+    open_rate: float
+    click_rate: float
+    last_sent_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
@@ -4,7 +4,7 @@ from typing import List, Optional
 
 class ActivityEvent(BaseModel):
     id: int
-    type: str  # 'email_sent', 'email_opened', 'email_clicked', 'campaign_started', 'lead_added'
+    type: str  # 'email_sent', 'email_opened', 'email_clicked', 'lead_unsubscribed'
     title: str
     description: str
     timestamp: datetime
@@ -30,4 +30,8 @@ class TodayActivity(BaseModel):
     recent_events: List[ActivityEvent]
     highlights: List[TodaysHighlight]
     hourly_send_rate: List[int]  # Array of 24 hours showing sends per hour
-    live_metrics: dict  # Real-time stats like current open rate, etc.
\ No newline at end of file
+    live_metrics: dict  # Real-time stats like current open rate, etc.
+
+class ActivityFeedPage(BaseModel):
+    events: List[ActivityEvent]
+    next_cursor: Optional[int] = None  # pass as ?cursor= for the next (older) page
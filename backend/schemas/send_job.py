@@ -0,0 +1,38 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class SendJobEmailOutcome(BaseModel):
+    slot_id: int
+    lead_id: Optional[int] = None
+    lead_email: Optional[str] = None
+    campaign_email_id: Optional[int] = None
+    status: str
+    scheduled_for: Optional[datetime] = None
+    dispatched_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+class SendJobProgress(BaseModel):
+    drafts_created: int = 0
+    drafts_failed: int = 0
+    slots_planned: int = 0
+    emails_sent: int = 0
+    emails_failed: int = 0
+    emails_cancelled: int = 0
+    emails_pending: int = 0
+
+class SendJobResponse(BaseModel):
+    id: str
+    status: str
+    trigger: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    progress: SendJobProgress
+    emails: List[SendJobEmailOutcome] = []
+
+class SendJobQueuedResponse(BaseModel):
+    message: str
+    job_id: str
+    status: str
@@ -19,6 +19,23 @@ class SendingProfileCreate(BaseModel):
     schedule_time_from: time = time(9, 0)  # 9:00 AM
     schedule_time_to: time = time(17, 0)   # 5:00 PM
     schedule_timezone: str = 'UTC'
+    
+    # Send pacing fields (seconds)
+    pacing_initial_delay_min: int = 5
+    pacing_initial_delay_max: int = 60
+    pacing_base_delay: int = 30
+    pacing_delay_increment: int = 10
+    pacing_jitter_min: int = -15
+    pacing_jitter_max: int = 60
+    pacing_min_delay: int = 15
+    pacing_max_delay: int = 400
+    
+    # Mailbox credentials (write-only, stored encrypted) and quotas
+    gmail_client_id: Optional[str] = None
+    gmail_client_secret: Optional[str] = None
+    gmail_refresh_token: Optional[str] = None
+    daily_send_limit: Optional[int] = None
+    hourly_send_limit: Optional[int] = None
 
 class SendingProfileUpdate(BaseModel):
     name: Optional[str] = None
@@ -37,6 +54,23 @@ class SendingProfileUpdate(BaseModel):
     schedule_time_from: Optional[time] = None
     schedule_time_to: Optional[time] = None
     schedule_timezone: Optional[str] = None
+    
+    # Send pacing fields (seconds)
+    pacing_initial_delay_min: Optional[int] = None
+    pacing_initial_delay_max: Optional[int] = None
+    pacing_base_delay: Optional[int] = None
+    pacing_delay_increment: Optional[int] = None
+    pacing_jitter_min: Optional[int] = None
+    pacing_jitter_max: Optional[int] = None
+    pacing_min_delay: Optional[int] = None
+    pacing_max_delay: Optional[int] = None
+    
+    # Mailbox credentials (write-only, stored encrypted) and quotas
+    gmail_client_id: Optional[str] = None
+    gmail_client_secret: Optional[str] = None
+    gmail_refresh_token: Optional[str] = None
+    daily_send_limit: Optional[int] = None
+    hourly_send_limit: Optional[int] = None
 
 class SendingProfileResponse(BaseModel):
     id: int
@@ -57,6 +91,22 @@ class SendingProfileResponse(BaseModel):
     schedule_time_to: time
     schedule_timezone: str
     
+    # Send pacing fields (seconds)
+    pacing_initial_delay_min: Optional[int] = None
+    pacing_initial_delay_max: Optional[int] = None
+    pacing_base_delay: Optional[int] = None
+    pacing_delay_increment: Optional[int] = None
+    pacing_jitter_min: Optional[int] = None
+    pacing_jitter_max: Optional[int] = None
+    pacing_min_delay: Optional[int] = None
+    pacing_max_delay: Optional[int] = None
+    
+    # Mailbox
+    gmail_client_id: Optional[str] = None
+    has_gmail_credentials: bool = False
+    daily_send_limit: Optional[int] = None
+    hourly_send_limit: Optional[int] = None
+    
     created_at: datetime
 
     class Config:
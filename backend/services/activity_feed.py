@@ -0,0 +1,224 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+import asyncio
+import os
+
+from database import SessionLocal
+from models import ActivityFeedEvent, Campaign, CampaignEmail, Lead, LeadCampaign
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+EMAIL_SENT = "email_sent"
+EMAIL_OPENED = "email_opened"
+EMAIL_CLICKED = "email_clicked"
+LEAD_UNSUBSCRIBED = "lead_unsubscribed"
+
+ACTIVITY_EVENT_RETENTION_DAYS = int(os.getenv("ACTIVITY_EVENT_RETENTION_DAYS", 90))
+
+def record_activity(db: Session, event_type: str, occurred_at: Optional[datetime] = None, **fields):
+    """Append one feed event; the caller commits"""
+    db.add(ActivityFeedEvent(event_type=event_type, occurred_at=occurred_at or datetime.utcnow(), **fields))
+
+def record_email_activity(db: Session, events: Iterable[Tuple[str, int, datetime, Dict]]):
+    """
+    Append (event type, campaign email id, occurred at, details) events; the caller commits
+
+    Campaign and lead for all the emails are resolved in one query.
+    """
+    events = list(events)
+    if not events:
+        return
+    context = {
+        row.id: row for row in db.query(
+            CampaignEmail.id, LeadCampaign.sequence_id, Campaign.name, Lead.id.label("lead_id"), Lead.email
+        ).join(
+            LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+        ).outerjoin(
+            Campaign, Campaign.id == LeadCampaign.sequence_id
+        ).outerjoin(
+            Lead, Lead.id == LeadCampaign.lead_id
+        ).filter(CampaignEmail.id.in_({email_id for _, email_id, _, _ in events}))
+    }
+    rows = []
+    for event_type, email_id, occurred_at, details in events:
+        email = context.get(email_id)
+        rows.append({
+            "event_type": event_type,
+            "occurred_at": occurred_at,
+            "campaign_id": email.sequence_id if email else None,
+            "campaign_name": email.name if email else None,
+            "lead_id": email.lead_id if email else None,
+            "lead_email": email.email if email else None,
+            "sequence_email_id": email_id,
+            "details": details
+        })
+    db.bulk_insert_mappings(ActivityFeedEvent, rows)
+
+def _truncate(text: Optional[str], length: int = 50) -> str:
+    text = text or ""
+    return f"{text[:length]}..." if len(text) > length else text
+
+def to_feed_item(event: ActivityFeedEvent) -> Dict:
+    """The dashboard's ActivityEvent shape for a stored event"""
+    details = event.details or {}
+    if event.event_type == EMAIL_SENT:
+        title, description = "Email Sent", f"Email sent: {_truncate(details.get('subject'))}"
+    elif event.event_type == EMAIL_OPENED:
+        title, description = "Email Opened", "Email was opened"
+    elif event.event_type == EMAIL_CLICKED:
+        title, description = "Link Clicked", f"Clicked: {_truncate(details.get('url'))}"
+    elif event.event_type == LEAD_UNSUBSCRIBED:
+        title, description = "Lead Unsubscribed", f"{event.lead_email or 'A lead'} unsubscribed"
+    else:
+        title, description = event.event_type.replace("_", " ").title(), ""
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "title": title,
+        "description": description,
+        "timestamp": event.occurred_at,
+        "campaign_name": event.campaign_name,
+        "lead_email": event.lead_email,
+        "metadata": details
+    }
+
+def list_activity(db: Session, before_id: Optional[int] = None, after_id: Optional[int] = None,
+                  since: Optional[datetime] = None, limit: int = 20) -> List[ActivityFeedEvent]:
+    """
+    Newest-first page of events older than `before_id`, or oldest-first events newer
+    than `after_id` (for catching up a live stream)
+    """
+    query = db.query(ActivityFeedEvent)
+    if since is not None:
+        query = query.filter(ActivityFeedEvent.occurred_at >= since)
+    if after_id is not None:
+        return query.filter(ActivityFeedEvent.id > after_id).order_by(ActivityFeedEvent.id).limit(limit).all()
+    if before_id is not None:
+        query = query.filter(ActivityFeedEvent.id < before_id)
+    return query.order_by(ActivityFeedEvent.id.desc()).limit(limit).all()
+
+def prune_activity(db: Session, retention_days: int = ACTIVITY_EVENT_RETENTION_DAYS) -> int:
+    """Delete events older than the retention window; commits"""
+    if retention_days <= 0:
+        return 0
+    deleted = db.query(ActivityFeedEvent).filter(
+        ActivityFeedEvent.occurred_at < datetime.utcnow() - timedelta(days=retention_days)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+class ActivityBroadcaster:
+    """
+    Fans new activity events out to this process's live-stream subscribers
+
+    Events are written by other processes too (the scheduler sends), so one poller per
+    process tails the table by id every `poll_interval_seconds` while anyone is
+    subscribed, however many dashboards are connected. Ids are handed out before commit,
+    so each poll re-reads the last `reorder_window` ids and skips the ones already seen,
+    catching a transaction that committed after a later one. A subscriber that falls
+    more than `queue_size` events behind is dropped; its client reconnects with
+    Last-Event-ID and catches up from the table.
+    """
+
+    def __init__(self, poll_interval_seconds: float = 1.0, queue_size: int = 500, reorder_window: int = 100):
+        self.poll_interval_seconds = poll_interval_seconds
+        self.queue_size = queue_size
+        self.reorder_window = reorder_window
+        self._subscribers: List[asyncio.Queue] = []
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[int] = None
+        self._seen: set = set()
+        self.polls = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.append(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def _drop(self, queue: asyncio.Queue):
+        """Discard a lagging subscriber's backlog and tell it to close; it resumes from its last id"""
+        self.unsubscribe(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+        self.dropped_subscribers += 1
+
+    def _fetch(self) -> List[Dict]:
+        """New events since the last poll, oldest first; advances the cursor"""
+        db = SessionLocal()
+        try:
+            if self._last_id is None:
+                # Start at the newest event, treating the window behind it as already seen
+                self._last_id = db.query(func.max(ActivityFeedEvent.id)).scalar() or 0
+                self._seen = {event_id for (event_id,) in db.query(ActivityFeedEvent.id).filter(
+                    ActivityFeedEvent.id > self._last_id - self.reorder_window
+                )}
+                return []
+            events = [
+                event for event in list_activity(db, after_id=max(self._last_id - self.reorder_window, 0), limit=1000)
+                if event.id > self._last_id or event.id not in self._seen
+            ]
+        finally:
+            db.close()
+        if events:
+            self._last_id = max(self._last_id, events[-1].id)
+            self._seen.update(event.id for event in events)
+            self._seen = {event_id for event_id in self._seen if event_id > self._last_id - self.reorder_window}
+        return [to_feed_item(event) for event in events]
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                try:
+                    items = await asyncio.to_thread(self._fetch)
+                    self.polls += 1
+                except Exception as e:
+                    items = []
+                    logger.warning("Activity stream poll failed", extra={"error": str(e), "error_type": type(e).__name__})
+                for item in items:
+                    for queue in list(self._subscribers):
+                        try:
+                            queue.put_nowait(item)
+                            self.delivered += 1
+                        except asyncio.QueueFull:
+                            self._drop(queue)
+                await asyncio.sleep(self.poll_interval_seconds)
+        finally:
+            # Next subscriber starts from the newest event again
+            self._last_id = None
+            self._seen = set()
+
+    async def stop(self):
+        self._subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "polling": self._task is not None and not self._task.done(),
+            "last_event_id": self._last_id,
+            "polls": self.polls,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers
+        }
+
+activity_broadcaster = ActivityBroadcaster(
+    poll_interval_seconds=float(os.getenv("ACTIVITY_STREAM_POLL_SECONDS", 1.0))
+)
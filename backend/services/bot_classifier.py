@@ -0,0 +1,225 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import ipaddress
+import os
+import re
+import socket
+import threading
+import time
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "bot_classifier")
+
+@dataclass(frozen=True)
+class ClientClassification:
+    label: str
+    is_automated: bool
+    confidence: float  # multiplier on the signal's confidence, as analyze_user_agent returned
+
+HUMAN = ClientClassification("human", False, 0.9)
+NO_USER_AGENT = ClientClassification("unknown", False, 0.8)
+
+def _parse_rules(path: str, column_count: int) -> List[Tuple[ClientClassification, str]]:
+    """(classification, value) per `<label> <yes|no> <confidence> <value>` line; # starts a comment"""
+    rules = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split(None, column_count - 1)
+            if len(parts) != column_count or parts[1] not in ("yes", "no"):
+                logger.warning(f"Ignoring malformed classifier rule {path}:{line_number}")
+                continue
+            try:
+                classification = ClientClassification(parts[0], parts[1] == "yes", float(parts[2]))
+            except ValueError:
+                logger.warning(f"Ignoring classifier rule with a bad confidence {path}:{line_number}")
+                continue
+            rules.append((classification, parts[3]))
+    return rules
+
+def _ip_key(ip_address: str) -> Optional[Tuple[int, int]]:
+    """(version bits, integer address) without building ipaddress objects on the hot path"""
+    try:
+        return 32, int.from_bytes(socket.inet_pton(socket.AF_INET, ip_address), "big")
+    except OSError:
+        pass
+    try:
+        return 128, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip_address), "big")
+    except (OSError, ValueError):
+        return None
+
+class NetworkIndex:
+    """
+    Longest-prefix match over CIDR rules
+
+    Networks are bucketed by prefix length into dicts keyed by the masked address, so a
+    lookup is one dict probe per distinct prefix length (a handful), longest first.
+    """
+
+    def __init__(self, rules: List[Tuple[ClientClassification, str]]):
+        self._by_length: Dict[int, Dict[int, Dict[int, ClientClassification]]] = {32: {}, 128: {}}
+        self.size = 0
+        for classification, cidr in rules:
+            try:
+                network = ipaddress.ip_network(cidr.strip(), strict=False)
+            except ValueError:
+                logger.warning(f"Ignoring bad network {cidr!r} in classifier rules")
+                continue
+            bits = network.max_prefixlen
+            self._by_length[bits].setdefault(network.prefixlen, {})[
+                int(network.network_address) >> (bits - network.prefixlen)
+            ] = classification
+            self.size += 1
+        self._lengths = {bits: sorted(tables, reverse=True) for bits, tables in self._by_length.items()}
+
+    def lookup(self, ip_address: str) -> Optional[ClientClassification]:
+        key = _ip_key(ip_address) if ip_address else None
+        if key is None:
+            return None
+        bits, address = key
+        tables = self._by_length[bits]
+        for prefix_length in self._lengths[bits]:
+            match = tables[prefix_length].get(address >> (bits - prefix_length))
+            if match is not None:
+                return match
+        return None
+
+def _trie_pattern(words: List[str]) -> str:
+    """Regex for a set of literals with shared prefixes factored out, e.g. bot|botnet|bing -> b(?:ing|ot(?:net)?)"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        ends_here = "" in node
+        body = branches[0] if len(branches) == 1 and not ends_here else f"(?:{'|'.join(branches)})"
+        return body + ("?" if ends_here else "")
+
+    return build(trie)
+
+class UserAgentMatcher:
+    """
+    All UA substrings compiled into one prefix-trie regex, run once over the lowercased UA
+
+    Capturing groups or re.IGNORECASE per alternative make Python's regex engine an order
+    of magnitude slower, so the matched text is mapped back to its rule with a dict.
+    When several rules match, the lowest confidence wins.
+    """
+
+    def __init__(self, rules: List[Tuple[ClientClassification, str]]):
+        self._rules: Dict[str, ClientClassification] = {}
+        for classification, substring in rules:
+            key = substring.strip().lower()
+            if key not in self._rules or classification.confidence < self._rules[key].confidence:
+                self._rules[key] = classification
+        self._pattern = re.compile(_trie_pattern(list(self._rules))) if self._rules else None
+        self.size = len(rules)
+
+    def match(self, user_agent: str) -> Optional[ClientClassification]:
+        if self._pattern is None:
+            return None
+        best = None
+        for found in self._pattern.findall(user_agent.lower()):
+            classification = self._rules[found]
+            if best is None or classification.confidence < best.confidence:
+                best = classification
+        return best
+
+class BotClassifier:
+    """
+    Labels a tracking hit's client (Apple MPP, image proxy, link scanner, bot, human) from
+    its user agent and IP, using rules in `data_dir`/user_agents.txt and networks.txt
+
+    The rule files are re-read when their mtime changes (checked at most every
+    `reload_interval_seconds`), so ranges can be updated without a deploy. UA results are
+    memoised; a lookup is a few microseconds (see benchmark_bot_classifier.py).
+    """
+
+    def __init__(self, data_dir: str = DEFAULT_DATA_DIR, reload_interval_seconds: float = 60):
+        self.data_dir = data_dir
+        self.reload_interval_seconds = reload_interval_seconds
+        self._lock = threading.Lock()
+        self._mtimes: Tuple = ()
+        self._next_check = 0.0
+        self.loaded_at: Optional[float] = None
+        # Empty rules until the files load, so a missing data dir degrades to "human"
+        self._matcher, self._networks = UserAgentMatcher([]), NetworkIndex([])
+        self._match_user_agent = lru_cache(maxsize=4096)(self._matcher.match)
+        self.load()
+
+    def _paths(self) -> Tuple[str, str]:
+        return os.path.join(self.data_dir, "user_agents.txt"), os.path.join(self.data_dir, "networks.txt")
+
+    def _current_mtimes(self) -> Tuple:
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in self._paths())
+
+    def load(self):
+        """(Re)build the UA matcher and network index from the rule files"""
+        ua_path, network_path = self._paths()
+        mtimes = self._current_mtimes()
+        try:
+            ua_rules = _parse_rules(ua_path, 4) if os.path.exists(ua_path) else []
+            network_rules = _parse_rules(network_path, 4) if os.path.exists(network_path) else []
+        except OSError as e:
+            logger.error("Could not read bot classifier rules; keeping the previous ones", extra={
+                "data_dir": self.data_dir,
+                "error": str(e)
+            })
+            return
+
+        matcher = UserAgentMatcher(ua_rules)
+        networks = NetworkIndex(network_rules)
+        with self._lock:
+            self._matcher, self._networks, self._mtimes = matcher, networks, mtimes
+            self._match_user_agent = lru_cache(maxsize=4096)(matcher.match)
+            self.loaded_at = time.time()
+        logger.info("Bot classifier rules loaded", extra={
+            "user_agent_rules": matcher.size,
+            "network_rules": networks.size
+        })
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval_seconds
+        if self._current_mtimes() != self._mtimes:
+            self.load()
+
+    def classify(self, user_agent: Optional[str], ip_address: Optional[str] = None) -> ClientClassification:
+        self._maybe_reload()
+        by_user_agent = self._match_user_agent(user_agent) if user_agent else None
+        by_network = self._networks.lookup(ip_address) if ip_address else None
+
+        if by_user_agent and by_network:
+            return min(by_user_agent, by_network, key=lambda c: c.confidence)
+        if by_user_agent or by_network:
+            return by_user_agent or by_network
+        return HUMAN if user_agent else NO_USER_AGENT
+
+    def stats(self) -> Dict:
+        cache = self._match_user_agent.cache_info()
+        return {
+            "data_dir": self.data_dir,
+            "user_agent_rules": self._matcher.size,
+            "network_rules": self._networks.size,
+            "loaded_at": self.loaded_at,
+            "user_agent_cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize}
+        }
+
+bot_classifier = BotClassifier(
+    data_dir=os.getenv("BOT_CLASSIFIER_DATA_DIR", DEFAULT_DATA_DIR),
+    reload_interval_seconds=float(os.getenv("BOT_CLASSIFIER_RELOAD_SECONDS", 60))
+)
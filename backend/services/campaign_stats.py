@@ -0,0 +1,304 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, distinct, func, text
+
+from models import Campaign, CampaignEmail, CampaignStep, CampaignStepStats, LeadCampaign
+from models.campaign_stats import CAMPAIGN_TOTAL_STEP
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+COUNTER_COLUMNS = ("enrolled", "active", "completed", "stopped", "replied", "sent", "opened", "clicked")
+
+# Enrollment statuses with their own column; anything else only leaves its old bucket
+STATUS_COLUMNS = {"active": "active", "completed": "completed", "stopped": "stopped"}
+
+Deltas = Dict[Tuple[int, int], Dict[str, int]]
+
+def _upsert(db: Session, deltas: Deltas, last_sent_at: Optional[Dict[Tuple[int, int], datetime]] = None):
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET col = col + n per (campaign, step) row, in the caller's transaction
+
+    Rows are written in key order so concurrent writers touching several rows take their
+    row locks in the same order.
+    """
+    last_sent_at = last_sent_at or {}
+    now = datetime.utcnow()
+    rows = [
+        {
+            "sequence_id": campaign_id,
+            "step_number": step_number,
+            **{column: deltas.get((campaign_id, step_number), {}).get(column, 0) for column in COUNTER_COLUMNS},
+            "last_sent_at": last_sent_at.get((campaign_id, step_number)),
+            "updated_at": now
+        }
+        for campaign_id, step_number in sorted(set(deltas) | set(last_sent_at))
+        if campaign_id is not None and step_number is not None
+    ]
+    rows = [row for row in rows if row["last_sent_at"] or any(row[column] for column in COUNTER_COLUMNS)]
+    if not rows:
+        return
+
+    table = CampaignStepStats
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[table.sequence_id, table.step_number],
+            set_={
+                **{column: getattr(table, column) + getattr(stmt.excluded, column) for column in COUNTER_COLUMNS},
+                "last_sent_at": case(
+                    (stmt.excluded.last_sent_at > table.last_sent_at, stmt.excluded.last_sent_at),
+                    else_=func.coalesce(table.last_sent_at, stmt.excluded.last_sent_at)
+                ),
+                "updated_at": stmt.excluded.updated_at
+            }
+        ), rows)
+        return
+
+    for row in rows:
+        existing = db.query(table).filter(
+            table.sequence_id == row["sequence_id"], table.step_number == row["step_number"]
+        ).with_for_update().first()
+        if existing is None:
+            db.add(table(**row))
+            continue
+        for column in COUNTER_COLUMNS:
+            setattr(existing, column, (getattr(existing, column) or 0) + row[column])
+        if row["last_sent_at"] and (existing.last_sent_at is None or row["last_sent_at"] > existing.last_sent_at):
+            existing.last_sent_at = row["last_sent_at"]
+    db.flush()
+
+def record_enrollments(db: Session, campaign_id: int, n: int = 1):
+    """`n` new active enrollments; the caller commits"""
+    _upsert(db, {(campaign_id, CAMPAIGN_TOTAL_STEP): {"enrolled": n, "active": n}})
+
+def record_status_changes(db: Session, changes: Iterable[Tuple[int, Optional[str], str, Optional[str]]]):
+    """
+    Move enrollments between status buckets; the caller commits
+
+    `changes` holds (campaign id, old status, new status, stop reason) per enrollment.
+    Stops with reason "replied" are also counted as replied.
+    """
+    deltas: Deltas = defaultdict(lambda: defaultdict(int))
+    for campaign_id, old_status, new_status, stop_reason in changes:
+        if old_status == new_status:
+            continue
+        row = deltas[(campaign_id, CAMPAIGN_TOTAL_STEP)]
+        if old_status in STATUS_COLUMNS:
+            row[STATUS_COLUMNS[old_status]] -= 1
+        if new_status in STATUS_COLUMNS:
+            row[STATUS_COLUMNS[new_status]] += 1
+        if new_status == "stopped" and stop_reason == "replied":
+            row["replied"] += 1
+    _upsert(db, deltas)
+
+def record_status_change(db: Session, campaign_id: int, old_status: Optional[str], new_status: str,
+                         stop_reason: Optional[str] = None):
+    record_status_changes(db, [(campaign_id, old_status, new_status, stop_reason)])
+
+def record_send(db: Session, campaign_id: int, step_number: int, sent_at: datetime, first_for_lead: bool):
+    """One email sent; `first_for_lead` when it is the enrollment's first send. The caller commits"""
+    deltas: Deltas = {(campaign_id, step_number): {"sent": 1}}
+    if first_for_lead:
+        deltas[(campaign_id, CAMPAIGN_TOTAL_STEP)] = {"sent": 1}
+    _upsert(db, deltas, {(campaign_id, step_number): sent_at, (campaign_id, CAMPAIGN_TOTAL_STEP): sent_at})
+
+def record_engagement(db: Session, opened_email_ids: Iterable[int] = (), clicked_email_ids: Iterable[int] = ()):
+    """
+    Emails whose opens/clicks just went from zero to non-zero in this transaction; the caller commits
+
+    Their step rows count each email, the campaign row each lead once: a lead is new when
+    all of its opened (clicked) emails are among the ones passed in. Two transactions
+    opening different emails of one lead at the same moment can both count it;
+    correct_campaign_stats() corrects that.
+    """
+    engagement = {"opened": (set(opened_email_ids), CampaignEmail.opens),
+                  "clicked": (set(clicked_email_ids), CampaignEmail.clicks)}
+    email_ids = set().union(*(ids for ids, _ in engagement.values()))
+    if not email_ids:
+        return
+
+    emails = {
+        row.id: row for row in db.query(
+            CampaignEmail.id, CampaignEmail.lead_sequence_id, LeadCampaign.sequence_id, CampaignStep.step_number
+        ).join(
+            LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+        ).outerjoin(
+            CampaignStep, CampaignEmail.step_id == CampaignStep.id
+        ).filter(CampaignEmail.id.in_(email_ids))
+    }
+
+    deltas: Deltas = defaultdict(lambda: defaultdict(int))
+    for column, (ids, counter) in engagement.items():
+        new_by_lead: Dict[int, int] = defaultdict(int)
+        campaign_of: Dict[int, int] = {}
+        for email_id in ids:
+            email = emails.get(email_id)
+            if email is None:
+                continue
+            deltas[(email.sequence_id, email.step_number)][column] += 1
+            new_by_lead[email.lead_sequence_id] += 1
+            campaign_of[email.lead_sequence_id] = email.sequence_id
+        if not new_by_lead:
+            continue
+        engaged = dict(db.query(CampaignEmail.lead_sequence_id, func.count()).filter(
+            CampaignEmail.lead_sequence_id.in_(list(new_by_lead)), counter > 0
+        ).group_by(CampaignEmail.lead_sequence_id).all())
+        for lead_sequence_id, new in new_by_lead.items():
+            if engaged.get(lead_sequence_id, 0) <= new:
+                deltas[(campaign_of[lead_sequence_id], CAMPAIGN_TOTAL_STEP)][column] += 1
+    _upsert(db, deltas)
+
+def _counts(conditions) -> List:
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END) per condition"""
+    return [func.sum(case((condition, 1), else_=0)) for condition in conditions]
+
+def _target_rows(db: Session, campaign_id: Optional[int] = None) -> Dict[Tuple[int, int], Dict]:
+    """What campaign_step_stats should hold, aggregated from lead_sequences and sequence_emails"""
+    def scoped(query):
+        return query.filter(LeadCampaign.sequence_id == campaign_id) if campaign_id is not None else query
+
+    rows: Dict[Tuple[int, int], Dict] = defaultdict(lambda: {column: 0 for column in COUNTER_COLUMNS})
+
+    status = LeadCampaign.status
+    for sequence_id, enrolled, active, completed, stopped, replied in scoped(db.query(
+        LeadCampaign.sequence_id, func.count(),
+        *_counts((status == "active", status == "completed", status == "stopped",
+                  and_(status == "stopped", LeadCampaign.stop_reason == "replied")))
+    )).group_by(LeadCampaign.sequence_id):
+        rows[(sequence_id, CAMPAIGN_TOTAL_STEP)].update(
+            enrolled=enrolled, active=active or 0, completed=completed or 0, stopped=stopped or 0, replied=replied or 0
+        )
+
+    is_sent = CampaignEmail.status == "sent"
+    lead = CampaignEmail.lead_sequence_id
+    for sequence_id, sent, opened, clicked, last_sent_at in scoped(db.query(
+        LeadCampaign.sequence_id,
+        func.count(distinct(case((is_sent, lead)))),
+        func.count(distinct(case((CampaignEmail.opens > 0, lead)))),
+        func.count(distinct(case((CampaignEmail.clicks > 0, lead)))),
+        func.max(case((is_sent, CampaignEmail.sent_at)))
+    ).join(CampaignEmail, CampaignEmail.lead_sequence_id == LeadCampaign.id)).group_by(LeadCampaign.sequence_id):
+        rows[(sequence_id, CAMPAIGN_TOTAL_STEP)].update(sent=sent, opened=opened, clicked=clicked, last_sent_at=last_sent_at)
+
+    for sequence_id, step_number, sent, opened, clicked, last_sent_at in scoped(db.query(
+        LeadCampaign.sequence_id, CampaignStep.step_number,
+        *_counts((is_sent, CampaignEmail.opens > 0, CampaignEmail.clicks > 0)),
+        func.max(case((is_sent, CampaignEmail.sent_at)))
+    ).select_from(CampaignEmail).join(
+        LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).join(
+        CampaignStep, CampaignEmail.step_id == CampaignStep.id
+    )).group_by(LeadCampaign.sequence_id, CampaignStep.step_number):
+        rows[(sequence_id, step_number)].update(
+            sent=sent or 0, opened=opened or 0, clicked=clicked or 0, last_sent_at=last_sent_at
+        )
+    return rows
+
+def rebuild_campaign_stats(db: Session, campaign_id: Optional[int] = None) -> int:
+    """
+    Recompute campaign_step_stats from lead_sequences and sequence_emails; commits
+
+    On Postgres the table is locked against writers for the duration, so increments from
+    sends and tracking hits landing meanwhile apply on top of the rebuilt totals rather
+    than being lost or counted twice. That stalls sends and tracking flushes, so this is
+    for backfills and manual repairs; routine drift checks use correct_campaign_stats().
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE campaign_step_stats IN EXCLUSIVE MODE"))
+
+    rows = _target_rows(db, campaign_id)
+
+    existing = db.query(CampaignStepStats)
+    if campaign_id is not None:
+        existing = existing.filter(CampaignStepStats.sequence_id == campaign_id)
+    existing.delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    db.bulk_insert_mappings(CampaignStepStats, [
+        {"last_sent_at": None, **values, "sequence_id": sequence_id, "step_number": step_number, "updated_at": now}
+        for (sequence_id, step_number), values in sorted(rows.items())
+    ])
+    db.commit()
+
+    logger.info("Rebuilt campaign stats", extra={"campaign_id": campaign_id, "rows": len(rows)})
+    return len(rows)
+
+def correct_campaign_stats(db: Session, campaign_id: Optional[int] = None) -> int:
+    """
+    Fix drift in campaign_step_stats one campaign at a time; commits after each campaign
+
+    Each campaign's rows are row-locked, its totals re-aggregated, and only the
+    differences applied as increments. Writers to other campaigns never wait, and
+    writers to this one wait for a single campaign's aggregation rather than the whole
+    table's. Returns how many rows were corrected.
+    """
+    campaign_ids = [campaign_id] if campaign_id is not None else [row.id for row in db.query(Campaign.id)]
+    corrected = 0
+    for sequence_id in campaign_ids:
+        current = {
+            row.step_number: row for row in db.query(CampaignStepStats).filter(
+                CampaignStepStats.sequence_id == sequence_id
+            ).order_by(CampaignStepStats.step_number).with_for_update()
+        }
+        target = _target_rows(db, sequence_id)
+
+        deltas: Deltas = {}
+        new_last_sent_at: Dict[Tuple[int, int], datetime] = {}
+        drifted = []
+        for step_number in sorted(set(current) | {step for _, step in target}):
+            key = (sequence_id, step_number)
+            row = current.get(step_number)
+            values = target.get(key) or {column: 0 for column in COUNTER_COLUMNS}
+            diff = {column: values[column] - ((getattr(row, column) or 0) if row else 0) for column in COUNTER_COLUMNS}
+            last_sent_at = values.get("last_sent_at")
+            changed = any(diff.values())
+            if changed:
+                deltas[key] = diff
+            # _upsert only moves last_sent_at forward, so a drifted one is set on the locked row
+            if row is None and last_sent_at:
+                new_last_sent_at[key] = last_sent_at
+                changed = True
+            elif row is not None and row.last_sent_at != last_sent_at:
+                row.last_sent_at = last_sent_at
+                changed = True
+            if changed:
+                drifted.append(step_number)
+
+        _upsert(db, deltas, new_last_sent_at)
+        db.commit()
+
+        if drifted:
+            corrected += len(drifted)
+            logger.warning("Corrected campaign stats drift", extra={
+                "campaign_id": sequence_id,
+                "steps": drifted,
+                "deltas": {step: diff for (_, step), diff in deltas.items()}
+            })
+    return corrected
+
+def ensure_campaign_stats(db: Session) -> bool:
+    """Backfill the table from raw data when it is empty but campaigns exist (first deploy)"""
+    if db.query(CampaignStepStats.sequence_id).first() is not None or db.query(Campaign.id).first() is None:
+        return False
+    rebuild_campaign_stats(db)
+    return True
+
+def campaign_summary_query(db: Session):
+    """(Campaign, campaign-wide CampaignStepStats or None, first step subject) rows, in one query"""
+    first_subject = db.query(CampaignStep.subject).filter(
+        CampaignStep.sequence_id == Campaign.id, CampaignStep.step_number == 1
+    ).order_by(CampaignStep.id).limit(1).correlate(Campaign).scalar_subquery()
+    return db.query(Campaign, CampaignStepStats, first_subject.label("subject")).outerjoin(
+        CampaignStepStats, and_(
+            CampaignStepStats.sequence_id == Campaign.id,
+            CampaignStepStats.step_number == CAMPAIGN_TOTAL_STEP
+        )
+    )
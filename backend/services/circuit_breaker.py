@@ -0,0 +1,178 @@
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open; retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class AdaptiveTimeout:
+    """Timeout derived from recent successful latencies: a percentile times a headroom factor, clamped"""
+
+    def __init__(self, minimum: float, maximum: float, percentile: float = 0.99, headroom: float = 2.0,
+                 window: int = 200, min_samples: int = 20):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def _percentile(self, samples: List[float], p: float) -> float:
+        index = min(len(samples) - 1, int(round(p * (len(samples) - 1))))
+        return samples[index]
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None, "samples": 0}
+        return {
+            "p50": round(self._percentile(samples, 0.50), 3),
+            "p95": round(self._percentile(samples, 0.95), 3),
+            "p99": round(self._percentile(samples, 0.99), 3),
+            "samples": len(samples)
+        }
+
+    def current(self) -> float:
+        """Timeout for the next call; the maximum until enough latencies have been observed"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.maximum
+            samples = sorted(self._samples)
+        timeout = self._percentile(samples, self.percentile) * self.headroom
+        return round(min(self.maximum, max(self.minimum, timeout)), 3)
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker around one external dependency
+
+    After `failure_threshold` consecutive failures the breaker opens and calls fail
+    fast with CircuitOpenError. Once `recovery_seconds` have passed a single probe call
+    is let through (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, timeout: AdaptiveTimeout, failure_threshold: int = 5,
+                 recovery_seconds: float = 30):
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.opened_at_wall: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            retry_in = self.recovery_seconds - (time.monotonic() - self.opened_at)
+            if self.state == "open" and retry_in <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(self.name, max(retry_in, 0))
+
+    def record_success(self, seconds: float):
+        self.timeout.observe(seconds)
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            if self.state != "closed":
+                logger.info(f"{self.name} circuit closed", extra={"circuit": self.name})
+            self.state = "closed"
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"{self.name} circuit opened", extra={
+                        "circuit": self.name,
+                        "consecutive_failures": self.consecutive_failures,
+                        "last_error": self.last_error
+                    })
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.opened_at_wall = datetime.utcnow()
+
+    def call(self, func: Callable[[float], Any]) -> Any:
+        """Run `func(timeout_seconds)` through the breaker, timing it for the adaptive timeout"""
+        self._before_call()
+        started = time.monotonic()
+        try:
+            result = func(self.timeout.current())
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.recovery_seconds
+
+    def reset(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+        logger.info(f"{self.name} circuit reset", extra={"circuit": self.name})
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = round(max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at)), 1)
+            state = {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_seconds": self.recovery_seconds,
+                "opened_at": self.opened_at_wall.isoformat() if self.opened_at_wall and self.state != "closed" else None,
+                "retry_in_seconds": retry_in,
+                "last_error": self.last_error,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected
+            }
+        state["timeout_seconds"] = self.timeout.current()
+        state["latency"] = self.timeout.percentiles()
+        return state
+
+openai_breaker = CircuitBreaker("openai", AdaptiveTimeout(minimum=10, maximum=90), failure_threshold=3, recovery_seconds=60)
+rspamd_breaker = CircuitBreaker("rspamd", AdaptiveTimeout(minimum=1, maximum=10), failure_threshold=5, recovery_seconds=30)
+
+breakers: Dict[str, CircuitBreaker] = {
+    breaker.name: breaker for breaker in (openai_breaker, rspamd_breaker)
+}
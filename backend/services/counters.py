@@ -0,0 +1,200 @@
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+import atexit
+import os
+import random
+import threading
+import zlib
+
+from database import SessionLocal
+from models import Campaign, CounterShard, DailyStats
+from services.leases import WORKER_ID
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+DAILY_EMAILS_SENT = "daily.emails_sent"
+DAILY_EMAILS_OPENED = "daily.emails_opened"
+DAILY_LINKS_CLICKED = "daily.links_clicked"
+CAMPAIGN_EMAIL_OPENS = "campaign.email_opens"  # bucketed by campaign id
+
+# Daily counters started out as DailyStats columns; those values are kept and merged in on read
+DAILY_STATS_COLUMNS = {
+    DAILY_EMAILS_SENT: "emails_sent",
+    DAILY_EMAILS_OPENED: "emails_opened",
+    DAILY_LINKS_CLICKED: "links_clicked"
+}
+
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", 16))
+
+def day_bucket(day: Optional[date] = None) -> str:
+    return (day or date.today()).isoformat()
+
+def campaign_bucket(campaign_id: int) -> str:
+    return str(campaign_id)
+
+def _upsert(db: Session, deltas: Dict[Tuple[str, str, int], int]):
+    """INSERT ... ON CONFLICT DO UPDATE SET value = value + n for each (name, bucket, shard)"""
+    rows = [
+        {"name": name, "bucket": bucket, "shard": shard, "value": n, "updated_at": datetime.utcnow()}
+        for (name, bucket, shard), n in sorted(deltas.items()) if n
+    ]
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(CounterShard)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[CounterShard.name, CounterShard.bucket, CounterShard.shard],
+            set_={"value": CounterShard.value + stmt.excluded.value, "updated_at": stmt.excluded.updated_at}
+        ), rows)
+        return
+
+    for row in rows:
+        updated = db.query(CounterShard).filter(
+            CounterShard.name == row["name"], CounterShard.bucket == row["bucket"], CounterShard.shard == row["shard"]
+        ).update({CounterShard.value: CounterShard.value + row["value"]}, synchronize_session=False)
+        if not updated:
+            db.add(CounterShard(**row))
+    db.flush()
+
+def add(db: Session, name: str, bucket: str, n: int = 1):
+    """
+    Add to a counter inside the caller's transaction (the caller commits)
+
+    For increments that must commit or roll back with other writes. A random shard is
+    used so concurrent writers rarely wait on the same row.
+    """
+    _upsert(db, {(name, bucket, random.randrange(COUNTER_SHARDS)): n})
+
+class CounterBuffer:
+    """
+    Per-process counter deltas, flushed as one upsert per counter every `flush_interval_ms`
+
+    Each process writes to its own shard, so flushes from different workers never touch
+    the same row. Pending deltas are applied on stop() and at interpreter exit.
+    """
+
+    def __init__(self, flush_interval_ms: int = 1000, shard: Optional[int] = None):
+        self.flush_interval_ms = flush_interval_ms
+        self.shard = shard if shard is not None else zlib.crc32(WORKER_ID.encode("utf-8")) % COUNTER_SHARDS
+        self._pending: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.flushed_deltas = 0
+        self.failed_flushes = 0
+
+    def incr(self, name: str, bucket: str, n: int = 1):
+        if not n:
+            return
+        with self._lock:
+            self._pending[(name, bucket)] += n
+            if not self._thread or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="counter-flusher", daemon=True)
+                self._thread.start()
+
+    def pending(self, name: str, bucket: str) -> int:
+        with self._lock:
+            return self._pending.get((name, bucket), 0)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval_ms / 1000)
+            self.flush()
+
+    def flush(self) -> int:
+        """Write pending deltas; on failure they are put back for the next flush"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = dict(self._pending), defaultdict(int)
+            if not batch:
+                return 0
+
+            db = SessionLocal()
+            try:
+                _upsert(db, {(name, bucket, self.shard): n for (name, bucket), n in batch.items()})
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                with self._lock:
+                    for key, n in batch.items():
+                        self._pending[key] += n
+                    self.failed_flushes += 1
+                logger.error("Counter flush failed; deltas kept for the next flush", extra={
+                    "counters": len(batch),
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+                return 0
+            finally:
+                db.close()
+
+            with self._lock:
+                self.flushes += 1
+                self.flushed_deltas += len(batch)
+            return len(batch)
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "shard": self.shard,
+                "flush_interval_ms": self.flush_interval_ms,
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "flushed_deltas": self.flushed_deltas,
+                "failed_flushes": self.failed_flushes
+            }
+
+counters = CounterBuffer(flush_interval_ms=int(os.getenv("COUNTER_FLUSH_INTERVAL_MS", 1000)))
+atexit.register(counters.stop)
+
+def read_counters(db: Session, name: str, buckets: Iterable[str]) -> Dict[str, int]:
+    """Merged value per bucket: the sum over all shards plus this process's unflushed delta"""
+    buckets = list(buckets)
+    totals = dict(db.query(CounterShard.bucket, func.sum(CounterShard.value)).filter(
+        CounterShard.name == name, CounterShard.bucket.in_(buckets)
+    ).group_by(CounterShard.bucket).all())
+    return {bucket: int(totals.get(bucket) or 0) + counters.pending(name, bucket) for bucket in buckets}
+
+def read_daily_stats(db: Session, day: Optional[date] = None) -> Dict[str, int]:
+    """A day's sent/opened/clicked totals, merged from its daily_stats row and the counter shards"""
+    day = day or date.today()
+    bucket = day_bucket(day)
+    legacy = db.query(DailyStats).filter(DailyStats.date == day).first()
+    totals = dict(db.query(CounterShard.name, func.sum(CounterShard.value)).filter(
+        CounterShard.name.in_(list(DAILY_STATS_COLUMNS)), CounterShard.bucket == bucket
+    ).group_by(CounterShard.name).all())
+    return {
+        column: (getattr(legacy, column, None) or 0) + int(totals.get(name) or 0) + counters.pending(name, bucket)
+        for name, column in DAILY_STATS_COLUMNS.items()
+    }
+
+def read_campaign_email_opens(db: Session, campaign_ids: Iterable[int]) -> Dict[int, int]:
+    """Opened emails per campaign, merged from the legacy email_sequences.email_opens column and the counter shards"""
+    campaign_ids = list(campaign_ids)
+    legacy = dict(db.query(Campaign.id, Campaign.email_opens).filter(Campaign.id.in_(campaign_ids)).all())
+    totals = read_counters(db, CAMPAIGN_EMAIL_OPENS, [campaign_bucket(campaign_id) for campaign_id in campaign_ids])
+    return {
+        campaign_id: (legacy.get(campaign_id) or 0) + totals[campaign_bucket(campaign_id)]
+        for campaign_id in campaign_ids
+    }
@@ -0,0 +1,35 @@
+from typing import Optional
+import os
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+class CredentialEncryptionError(Exception):
+    """Raised when a stored credential cannot be encrypted or decrypted"""
+
+def _fernet() -> Fernet:
+    key = os.getenv("CREDENTIALS_ENCRYPTION_KEY")
+    if not key:
+        raise CredentialEncryptionError("CREDENTIALS_ENCRYPTION_KEY is not set")
+    try:
+        return Fernet(key.encode("utf-8"))
+    except (ValueError, TypeError) as e:
+        raise CredentialEncryptionError(f"CREDENTIALS_ENCRYPTION_KEY is not a valid Fernet key: {e}")
+
+def encrypt_secret(value: Optional[str]) -> Optional[str]:
+    """Encrypt a secret for storage; empty values are stored as NULL"""
+    if not value:
+        return None
+    return _fernet().encrypt(value.encode("utf-8")).decode("utf-8")
+
+def decrypt_secret(token: Optional[str]) -> Optional[str]:
+    """Decrypt a stored secret, or None if nothing is stored"""
+    if not token:
+        return None
+    try:
+        return _fernet().decrypt(token.encode("utf-8")).decode("utf-8")
+    except InvalidToken:
+        raise CredentialEncryptionError("Stored credential could not be decrypted with the current key")
@@ -6,6 +6,7 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from logger_config import get_logger
+from services.response_cache import DELIVERABILITY, response_cache
 
 from models import (
     DeliverabilityMetric, PostmasterMetric, BlacklistStatus, 
@@ -443,6 +444,10 @@ class DeliverabilityMonitor:
         except Exception as e:
             logger.error(f"Failed to run full deliverability check: {e}")
             return results
+        
+        finally:
+            # The individual checks commit as they go, so even a failed run may have written results
+            response_cache.invalidate(DELIVERABILITY)
 
     def get_deliverability_summary(self, db: Session) -> Dict:
         """Get current deliverability status summary"""
@@ -0,0 +1,372 @@
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, exists, or_
+import hashlib
+import os
+import uuid
+
+from database import SessionLocal
+from models import (
+    Campaign, Lead, LeadCampaign, CampaignStep, CampaignEmail, EmailReply,
+    SendingProfile
+)
+from services.circuit_breaker import rspamd_breaker
+from services.leases import WORKER_ID, claim_lead_sequences, release_lead_sequences
+from services.campaign_stats import record_status_change, record_status_changes
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+def compute_draft_fingerprint(step: CampaignStep, sending_profile: Optional[SendingProfile]) -> str:
+    """Fingerprint of everything a draft was generated from; a mismatch means the draft is stale"""
+    parts = [
+        str(step.id),
+        step.ai_prompt or "",
+        str(bool(step.include_previous_emails)),
+    ]
+    if sending_profile:
+        parts.extend([
+            str(sending_profile.id),
+            sending_profile.sender_name or "",
+            sending_profile.sender_title or "",
+            sending_profile.sender_company or "",
+            sending_profile.sender_email or "",
+        ])
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def invalidate_drafts(db: Session, campaign_id: Optional[int] = None, step_id: Optional[int] = None,
+                      sending_profile_id: Optional[int] = None, reason: str = "changed") -> int:
+    """Mark unsent drafts as invalidated so they are regenerated; the caller commits"""
+    query = db.query(CampaignEmail).filter(CampaignEmail.status == "draft")
+
+    if step_id is not None:
+        query = query.filter(CampaignEmail.step_id == step_id)
+    if campaign_id is not None:
+        query = query.filter(CampaignEmail.lead_sequence_id.in_(
+            db.query(LeadCampaign.id).filter(LeadCampaign.sequence_id == campaign_id)
+        ))
+    if sending_profile_id is not None:
+        query = query.filter(CampaignEmail.lead_sequence_id.in_(
+            db.query(LeadCampaign.id).join(Campaign, LeadCampaign.sequence_id == Campaign.id).filter(
+                Campaign.sending_profile_id == sending_profile_id
+            )
+        ))
+
+    invalidated = query.update({CampaignEmail.status: "invalidated"}, synchronize_session=False)
+    if invalidated:
+        logger.info(f"Invalidated {invalidated} drafts ({reason})", extra={
+            "invalidated_drafts": invalidated,
+            "campaign_id": campaign_id,
+            "step_id": step_id,
+            "sending_profile_id": sending_profile_id,
+            "reason": reason
+        })
+    return invalidated
+
+def invalidate_stale_drafts(db: Session) -> int:
+    """
+    Safety net for drafts whose step prompt or sending profile changed since generation; the caller commits
+
+    The write paths that change prompts and profiles invalidate their drafts directly, so this
+    only fingerprints drafts generated before their step or profile was last updated.
+    """
+    drafts = db.query(CampaignEmail, CampaignStep, SendingProfile).join(
+        CampaignStep, CampaignEmail.step_id == CampaignStep.id
+    ).join(
+        LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).join(
+        Campaign, LeadCampaign.sequence_id == Campaign.id
+    ).outerjoin(
+        SendingProfile, Campaign.sending_profile_id == SendingProfile.id
+    ).filter(
+        CampaignEmail.status == "draft",
+        or_(
+            CampaignEmail.generated_at.is_(None),
+            CampaignStep.updated_at > CampaignEmail.generated_at,
+            SendingProfile.updated_at > CampaignEmail.generated_at
+        )
+    ).all()
+
+    stale_ids = [
+        draft.id for draft, step, profile in drafts
+        if draft.draft_fingerprint != compute_draft_fingerprint(step, profile)
+    ]
+    if stale_ids:
+        db.query(CampaignEmail).filter(CampaignEmail.id.in_(stale_ids)).update(
+            {CampaignEmail.status: "invalidated"}, synchronize_session=False
+        )
+        logger.info(f"Invalidated {len(stale_ids)} stale drafts", extra={"invalidated_drafts": len(stale_ids)})
+    return len(stale_ids)
+
+def has_reply():
+    """Correlated EXISTS for a reply from the lead in this sequence; negate it for an anti-join on LeadCampaign"""
+    return exists().where(and_(
+        EmailReply.lead_id == LeadCampaign.lead_id,
+        EmailReply.sequence_id == LeadCampaign.sequence_id
+    ))
+
+def stop_replied_sequences(db: Session) -> int:
+    """Stop active sequences whose lead has replied and drop their drafts, set-based; the caller commits"""
+    replied = db.query(LeadCampaign.id, LeadCampaign.sequence_id).filter(
+        LeadCampaign.status == "active",
+        has_reply()
+    ).all()
+    if not replied:
+        return 0
+    replied_ids = [lead_seq_id for lead_seq_id, _ in replied]
+
+    db.query(LeadCampaign).filter(LeadCampaign.id.in_(replied_ids)).update(
+        {LeadCampaign.status: "stopped", LeadCampaign.stop_reason: "replied"}, synchronize_session=False
+    )
+    db.query(CampaignEmail).filter(
+        CampaignEmail.lead_sequence_id.in_(replied_ids),
+        CampaignEmail.status == "draft"
+    ).update({CampaignEmail.status: "invalidated"}, synchronize_session=False)
+    record_status_changes(db, [(sequence_id, "active", "stopped", "replied") for _, sequence_id in replied])
+
+    logger.info(f"Stopped {len(replied_ids)} sequences after a reply", extra={"stopped_sequences": len(replied_ids)})
+    return len(replied_ids)
+
+def load_active_steps(db: Session, sequence_ids: Iterable[int]) -> Dict[Tuple[int, int], CampaignStep]:
+    """Active steps of the given sequences keyed by (sequence_id, step_number)"""
+    sequence_ids = set(sequence_ids)
+    if not sequence_ids:
+        return {}
+    steps = db.query(CampaignStep).filter(
+        CampaignStep.sequence_id.in_(sequence_ids),
+        CampaignStep.is_active == "true"
+    ).all()
+    return {(step.sequence_id, step.step_number): step for step in steps}
+
+def _sent_emails_by_sequence(db: Session, lead_sequence_ids: Iterable[int]) -> Dict[int, List[Tuple[int, str, str]]]:
+    """(step_number, subject, content) of every sent email per lead sequence, in step order"""
+    lead_sequence_ids = set(lead_sequence_ids)
+    if not lead_sequence_ids:
+        return {}
+
+    rows = db.query(
+        CampaignEmail.lead_sequence_id, CampaignStep.step_number, CampaignEmail.subject, CampaignEmail.content
+    ).join(CampaignStep, CampaignEmail.step_id == CampaignStep.id).filter(
+        CampaignEmail.lead_sequence_id.in_(lead_sequence_ids),
+        CampaignEmail.status == "sent"
+    ).order_by(CampaignEmail.lead_sequence_id, CampaignStep.step_number).all()
+
+    sent = {}
+    for lead_sequence_id, step_number, subject, content in rows:
+        sent.setdefault(lead_sequence_id, []).append((step_number, subject, content))
+    return sent
+
+def _previous_emails_for(sent_emails: List[Tuple[int, str, str]], step: CampaignStep) -> Optional[List[Dict]]:
+    """Previously sent emails in this sequence, used as context for follow-ups"""
+    if not step.include_previous_emails or step.step_number <= 1:
+        return None
+
+    return [
+        {'subject': subject, 'content': content}
+        for step_number, subject, content in sent_emails
+        if step_number < step.step_number and subject and content
+    ]
+
+def recheck_unchecked_drafts(db: Session, email_service, limit: int) -> int:
+    """Spam-check drafts generated while Rspamd was unavailable; spammy ones are invalidated. The caller commits"""
+    if rspamd_breaker.is_open:
+        return 0
+
+    drafts = db.query(CampaignEmail).filter(
+        CampaignEmail.status == "draft",
+        CampaignEmail.spam_check_skipped == True
+    ).order_by(CampaignEmail.generated_at.asc()).limit(limit).all()
+
+    checked = 0
+    for draft in drafts:
+        is_spam, spam_score, spam_report = email_service._check_spam(draft.subject, draft.content)
+        if spam_score is None:
+            break  # Still unavailable; try again on the next pass
+
+        draft.spam_score = spam_score
+        draft.spam_report = spam_report
+        draft.spam_check_skipped = False
+        if is_spam:
+            draft.status = "invalidated"
+        checked += 1
+
+    if checked:
+        logger.info(f"Spam-checked {checked} previously unchecked drafts", extra={"drafts_checked": checked})
+    return checked
+
+def pregenerate_drafts(lookahead_minutes: Optional[int] = None, concurrency: Optional[int] = None,
+                       batch_size: Optional[int] = None) -> Dict:
+    """
+    Generate spam-checked drafts ahead of time for sequences due within the look-ahead window
+
+    Generation (OpenAI + Rspamd) runs on a bounded thread pool; all database writes
+    happen on the calling thread once the results are in.
+    """
+    from email_service import get_email_service
+
+    lookahead_minutes = lookahead_minutes if lookahead_minutes is not None else int(os.getenv("DRAFT_LOOKAHEAD_MINUTES", 30))
+    concurrency = concurrency if concurrency is not None else int(os.getenv("DRAFT_PREGEN_CONCURRENCY", 4))
+    batch_size = batch_size if batch_size is not None else int(os.getenv("DRAFT_PREGEN_BATCH_SIZE", 20))
+
+    db = SessionLocal()
+    drafts_created = 0
+    drafts_failed = 0
+    stale_drafts = 0
+
+    try:
+        now = datetime.utcnow()
+        horizon = now + timedelta(minutes=lookahead_minutes)
+
+        email_service = get_email_service()
+        stale_drafts = invalidate_stale_drafts(db)
+        stop_replied_sequences(db)
+        recheck_unchecked_drafts(db, email_service, batch_size)
+
+        ready_draft = exists().where(and_(
+            CampaignEmail.lead_sequence_id == LeadCampaign.id,
+            CampaignEmail.step_id == CampaignStep.id,
+            CampaignEmail.status == "draft"
+        ))
+        # A step already sent but not yet advanced past (see reconcile_recorded_sends) must not be drafted again
+        sent_step = exists().where(and_(
+            CampaignEmail.lead_sequence_id == LeadCampaign.id,
+            CampaignEmail.step_id == CampaignStep.id,
+            CampaignEmail.status == "sent"
+        ))
+
+        def with_candidate_joins(query):
+            return query.join(
+                Campaign, LeadCampaign.sequence_id == Campaign.id
+            ).join(
+                Lead, LeadCampaign.lead_id == Lead.id
+            ).outerjoin(CampaignStep, and_(
+                CampaignStep.sequence_id == LeadCampaign.sequence_id,
+                CampaignStep.step_number == LeadCampaign.current_step,
+                CampaignStep.is_active == "true"
+            )).outerjoin(
+                SendingProfile, Campaign.sending_profile_id == SendingProfile.id
+            )
+
+        # Lease the candidates so parallel schedulers never generate drafts for the same lead;
+        # inactive leads and replied leads never come back. Generation can be slow, hence the long lease.
+        due_query = with_candidate_joins(db.query(LeadCampaign.id)).filter(
+            LeadCampaign.status == "active",
+            LeadCampaign.next_send_at <= horizon,
+            Campaign.status == "active",
+            Lead.status == "active",
+            ~has_reply(),
+            ~ready_draft,
+            ~sent_step
+        ).order_by(LeadCampaign.current_step.desc(), LeadCampaign.next_send_at.asc())
+        claimed_ids = claim_lead_sequences(db, due_query, limit=batch_size, now=now, lease_seconds=900)
+
+        # Working set for the claimed rows in one query
+        candidates = with_candidate_joins(db.query(LeadCampaign, CampaignStep, Lead, SendingProfile)).filter(
+            LeadCampaign.id.in_(claimed_ids),
+            LeadCampaign.claimed_by == WORKER_ID
+        ).order_by(LeadCampaign.current_step.desc(), LeadCampaign.next_send_at.asc()).all() if claimed_ids else []
+
+        if not candidates:
+            release_lead_sequences(db, claimed_ids)
+            db.commit()
+            logger.debug("No drafts to pre-generate", extra={"lookahead_minutes": lookahead_minutes})
+            return {"drafts_created": 0, "drafts_failed": 0, "stale_drafts": stale_drafts, "candidates": 0}
+
+        sent_emails = _sent_emails_by_sequence(db, [
+            lead_seq.id for lead_seq, step, _, _ in candidates
+            if step and step.include_previous_emails and step.step_number > 1
+        ])
+        work = []
+
+        for lead_seq, step, lead, sending_profile in candidates:
+            if not step:
+                record_status_change(db, lead_seq.sequence_id, lead_seq.status, "completed")
+                lead_seq.status = "completed"
+                lead_seq.completed_at = now
+                lead_seq.next_send_at = None
+                continue
+
+            work.append({
+                "lead_seq": lead_seq,
+                "step": step,
+                "lead": lead,
+                "sending_profile": sending_profile,
+                "prompt": step.ai_prompt or f"Write a professional email. This is step {step.step_number} in our sequence.",
+                "previous_emails": _previous_emails_for(sent_emails.get(lead_seq.id, []), step),
+                "fingerprint": compute_draft_fingerprint(step, sending_profile)
+            })
+
+        logger.info(f"Pre-generating {len(work)} drafts with concurrency {concurrency}", extra={
+            "draft_candidates": len(work),
+            "concurrency": concurrency,
+            "lookahead_minutes": lookahead_minutes
+        })
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="draft-pregen") as executor:
+            futures = {
+                executor.submit(
+                    email_service.generate_draft,
+                    lead=item["lead"],
+                    prompt_text=item["prompt"],
+                    sending_profile=item["sending_profile"],
+                    previous_emails=item["previous_emails"]
+                ): index
+                for index, item in enumerate(work)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.error("Draft generation raised", extra={
+                        "lead_id": work[index]["lead"].id,
+                        "error": str(e),
+                        "error_type": type(e).__name__
+                    }, exc_info=True)
+                    results[index] = None
+
+        for index, item in enumerate(work):
+            draft = results.get(index)
+            if not draft:
+                drafts_failed += 1
+                continue
+
+            db.add(CampaignEmail(
+                lead_sequence_id=item["lead_seq"].id,
+                step_id=item["step"].id,
+                status="draft",
+                subject=draft['subject'],
+                content=draft['content'],
+                spam_score=draft.get('spam_score'),
+                spam_report=draft.get('spam_report'),
+                spam_check_skipped=draft.get('spam_check_skipped', False),
+                generated_at=datetime.utcnow(),
+                draft_fingerprint=item["fingerprint"],
+                tracking_pixel_id=str(uuid.uuid4())
+            ))
+            drafts_created += 1
+
+        release_lead_sequences(db, claimed_ids)
+        db.commit()
+
+        logger.info(f"Draft pre-generation completed: {drafts_created} created, {drafts_failed} failed", extra={
+            "drafts_created": drafts_created,
+            "drafts_failed": drafts_failed,
+            "stale_drafts": stale_drafts
+        })
+
+        return {
+            "drafts_created": drafts_created,
+            "drafts_failed": drafts_failed,
+            "stale_drafts": stale_drafts,
+            "candidates": len(candidates)
+        }
+
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -1,241 +1,161 @@
-from datetime import datetime, date, timedelta
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, exists, or_
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 import os
-import uuid
-import time
-import random
 
 from database import SessionLocal
 from models import (
-    Campaign, Lead, DailyStats,
-    LeadCampaign, CampaignStep, CampaignEmail, EmailReply,
-    SendingProfile
+    Campaign, Lead,
+    LeadCampaign, CampaignStep, CampaignEmail,
+    SendingProfile, SendSlot, SendJob
 )
+from services.draft_pregen import (
+    compute_draft_fingerprint, pregenerate_drafts, has_reply, stop_replied_sequences, load_active_steps
+)
+from services.send_pacing import plan_send_slots
+from services.leases import WORKER_ID, claim_lead_sequences, release_lead_sequences
+from services.tracking_tokens import issue_tracking_token
+from services.counters import DAILY_EMAILS_SENT, add as counter_add, day_bucket, read_daily_stats
+from services.campaign_stats import record_send, record_status_change
+from services.activity_feed import EMAIL_SENT, record_activity, record_email_activity
+from services.response_cache import SENDS, response_cache
+from services.mailboxes import mailbox_key, mailbox_limits, mailbox_usage, remaining_mailbox_quota
 from logger_config import get_logger
 
 logger = get_logger(__name__)
 
 def send_campaign_batch():
-    """Send campaign emails using the same generation method as preview"""
+    """Pre-generate drafts for anything due, then plan and dispatch the ready drafts"""
+    pregenerate_drafts(lookahead_minutes=0)
     return send_sequence_batch()
 
 def send_email_batch():
     """Legacy function - now redirects to sequence batch since campaigns are sequences"""
     return send_sequence_batch()
 
-def send_sequence_batch():
-    """Background task to send sequence emails that are due"""
-    from email_service import EmailService
-    
+def send_sequence_batch(send_job_id: Optional[str] = None):
+    """
+    Plan paced send slots for the ready drafts of sequences that are due, then fire any slot already due
+
+    Nothing here sleeps: the human-like spacing lives in the planned slot times and the
+    scheduler's dispatcher sends each slot when it comes due.
+    """
+    from email_service import get_email_service
+
     db = SessionLocal()
-    email_service = EmailService()
-    
-    emails_sent = 0
+    email_service = get_email_service()
+
     sequences_processed = 0
-    errors = []
+    slots_planned = 0
     skipped_summaries = {}
-    
+
     try:
-        # Check daily limit first
-        today = date.today()
-        daily_stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-        if not daily_stats:
-            daily_stats = DailyStats(date=today, emails_sent=0)
-            db.add(daily_stats)
-            db.commit()
-        
-        daily_limit = int(os.getenv("DAILY_EMAIL_LIMIT", 30))
-        remaining_quota = daily_limit - daily_stats.emails_sent
-        
-        if remaining_quota <= 0:
-            logger.info(f"Daily limit of {daily_limit} emails already reached ({daily_stats.emails_sent} sent)")
-            return {"emails_sent": 0, "sequences_processed": 0, "errors": ["Daily limit reached"]}
-        
         now = datetime.utcnow()
-        due_sequences = db.query(LeadCampaign).join(Campaign, LeadCampaign.sequence_id == Campaign.id).filter(
+        already_planned = exists().where(and_(
+            SendSlot.sequence_email_id == CampaignEmail.id,
+            SendSlot.status.in_(["planned", "dispatching", "unconfirmed"])
+        ))
+
+        stop_replied_sequences(db)
+
+        # Only sequences with a ready (pre-generated) draft for their current step are picked up;
+        # inactive leads and leads that replied are excluded in SQL
+        due_query = db.query(LeadCampaign.id).join(
+            Campaign, LeadCampaign.sequence_id == Campaign.id
+        ).join(
+            Lead, LeadCampaign.lead_id == Lead.id
+        ).join(CampaignStep, and_(
+            CampaignStep.sequence_id == LeadCampaign.sequence_id,
+            CampaignStep.step_number == LeadCampaign.current_step
+        )).join(CampaignEmail, and_(
+            CampaignEmail.lead_sequence_id == LeadCampaign.id,
+            CampaignEmail.step_id == CampaignStep.id,
+            CampaignEmail.status == "draft"
+        )).filter(
             LeadCampaign.status == "active",
             LeadCampaign.next_send_at <= now,
-            Campaign.status == "active"  # Skip paused campaigns
-        ).order_by(LeadCampaign.current_step.desc(), LeadCampaign.next_send_at.asc()).limit(min(remaining_quota, 50)).all()
-        
+            Campaign.status == "active",  # Skip paused campaigns
+            Lead.status == "active",
+            ~has_reply(),
+            ~already_planned
+        ).order_by(LeadCampaign.current_step.desc(), LeadCampaign.next_send_at.asc())
+
+        # Lease the due rows first so parallel schedulers or a manual send never plan the same lead
+        claimed_ids = claim_lead_sequences(db, due_query, limit=200, now=now)
+
+        # The whole working set for the claimed rows comes back in one query.
+        # Quotas are enforced per mailbox below.
+        due_sequences = db.query(
+            LeadCampaign, CampaignEmail, CampaignStep, Lead, Campaign, SendingProfile,
+            (CampaignStep.is_active == "true").label("step_active")
+        ).join(
+            Campaign, LeadCampaign.sequence_id == Campaign.id
+        ).join(
+            Lead, LeadCampaign.lead_id == Lead.id
+        ).join(CampaignStep, and_(
+            CampaignStep.sequence_id == LeadCampaign.sequence_id,
+            CampaignStep.step_number == LeadCampaign.current_step
+        )).join(CampaignEmail, and_(
+            CampaignEmail.lead_sequence_id == LeadCampaign.id,
+            CampaignEmail.step_id == CampaignStep.id,
+            CampaignEmail.status == "draft"
+        )).outerjoin(
+            SendingProfile, Campaign.sending_profile_id == SendingProfile.id
+        ).filter(
+            LeadCampaign.id.in_(claimed_ids),
+            LeadCampaign.claimed_by == WORKER_ID,
+            ~already_planned
+        ).order_by(LeadCampaign.current_step.desc(), LeadCampaign.next_send_at.asc()).all() if claimed_ids else []
+
         sequences_processed = len(due_sequences)
-        
-        # Log status even when no emails are due
-        if sequences_processed == 0:
-            logger.info(f"No emails scheduled to send right now. Daily quota: {daily_stats.emails_sent}/{daily_limit}")
-            return {"emails_sent": 0, "sequences_processed": 0, "errors": []}
-        
-        # Limit to smaller batches to mimic human sending patterns (max 10 per batch)
-        max_batch_size = min(10, remaining_quota)
-        if len(due_sequences) > max_batch_size:
-            due_sequences = due_sequences[:max_batch_size]
-            sequences_processed = len(due_sequences)
-            logger.info(f"Limiting batch to {max_batch_size} emails to mimic human sending patterns")
-        
+
+        # Remaining quota per mailbox, limited to smaller batches (max 10 per mailbox) to mimic human sending patterns
+        mailbox_quota = {}
+        schedule_checks = {}
+
         # Sequences are ordered by current_step (desc) then next_send_at (asc) to prioritize sequence completion
-        logger.info(f"Processing {len(due_sequences)} emails with follow-ups prioritized over first emails")
-        
-        # Add a small initial random delay to spread out batch processing
-        initial_delay = random.randint(5, 60)
-        logger.info(f"Starting email batch with {initial_delay} second initial delay...")
-        time.sleep(initial_delay)
-        
-        for i, lead_seq in enumerate(due_sequences):
-            try:
-                current_step = db.query(CampaignStep).filter(
-                    CampaignStep.sequence_id == lead_seq.sequence_id,
-                    CampaignStep.step_number == lead_seq.current_step,
-                    CampaignStep.is_active == "true"
-                ).first()
-                
-                if not current_step:
-                    lead_seq.status = "completed"
-                    lead_seq.completed_at = now
-                    continue
-                
-                lead = db.query(Lead).filter(Lead.id == lead_seq.lead_id).first()
-                sequence = db.query(Campaign).filter(Campaign.id == lead_seq.sequence_id).first()
-                
-                if not lead or not sequence or lead.status != "active":
-                    continue
-                
-                # Get sending profile for the sequence
-                sending_profile = None
-                if sequence.sending_profile_id:
-                    sending_profile = db.query(SendingProfile).filter(SendingProfile.id == sequence.sending_profile_id).first()
-                
-                # Check if sending is allowed based on schedule (skip this email if not)
-                is_allowed, schedule_reason = email_service.is_sending_allowed(sending_profile)
-                if not is_allowed:
-                    if schedule_reason not in skipped_summaries:
-                        skipped_summaries[schedule_reason] = []
-                    skipped_summaries[schedule_reason].append(lead_seq.lead_id)
-                    continue
-                
-                reply_check = db.query(EmailReply).filter(
-                    EmailReply.lead_id == lead.id,
-                    EmailReply.sequence_id == sequence.id
-                ).first()
-                
-                if reply_check:
-                    lead_seq.status = "stopped"
-                    lead_seq.stop_reason = "replied"
-                    continue
-                
-                sequence_email = CampaignEmail(
-                    lead_sequence_id=lead_seq.id,
-                    step_id=current_step.id
-                )
-                db.add(sequence_email)
-                db.flush()
-                
-                # Check if we should include previous emails for context
-                previous_emails = None
-                if current_step.include_previous_emails and current_step.step_number > 1:
-                    # Get previously sent emails from this sequence for this lead
-                    previous_sent_emails = db.query(CampaignEmail).join(CampaignStep).filter(
-                        CampaignEmail.lead_sequence_id == lead_seq.id,
-                        CampaignEmail.status == "sent",
-                        CampaignStep.step_number < current_step.step_number
-                    ).order_by(CampaignStep.step_number).all()
-                    
-                    previous_emails = []
-                    for prev_email in previous_sent_emails:
-                        if prev_email.subject and prev_email.content:
-                            previous_emails.append({
-                                'subject': prev_email.subject,
-                                'content': prev_email.content
-                            })
-                
-                # Generate tracking ID for this email
-                import uuid
-                tracking_id = str(uuid.uuid4())
-                
-                # Use email function with spam checking and tracking
-                ai_prompt = current_step.ai_prompt or f"Write a professional email. This is step {current_step.step_number} in our sequence."
-                success = email_service.send_email(
-                    lead=lead,
-                    prompt_text=ai_prompt,
-                    tracking_id=tracking_id,
-                    sending_profile=sending_profile,
-                    previous_emails=previous_emails
-                )
-                
-                # For logging purposes, we'll need to get the email data separately for subject/content
-                # Generate email data for storage (without sending)
-                email_data = None
-                if success:
-                    generated_email = email_service._generate_ai_email(
-                        lead=lead,
-                        prompt_text=ai_prompt,
-                        sending_profile=sending_profile,
-                        is_followup=True,
-                        previous_emails=previous_emails
-                    )
-                    if generated_email:
-                        email_data = (generated_email['subject'], generated_email['content'])
-                
-                if success and email_data:
-                    email_subject, email_content = email_data
-                    sequence_email.status = "sent"
-                    sequence_email.sent_at = now
-                    sequence_email.subject = email_subject
-                    sequence_email.content = email_content
-                    sequence_email.tracking_pixel_id = tracking_id
-                    
-                    lead_seq.last_sent_at = now
-                    lead_seq.current_step += 1
-                    
-                    next_step = db.query(CampaignStep).filter(
-                        CampaignStep.sequence_id == lead_seq.sequence_id,
-                        CampaignStep.step_number == lead_seq.current_step,
-                        CampaignStep.is_active == "true"
-                    ).first()
-                    
-                    if next_step:
-                        lead_seq.next_send_at = now + timedelta(
-                            days=next_step.delay_days,
-                            hours=next_step.delay_hours
-                        )
-                    else:
-                        lead_seq.status = "completed"
-                        lead_seq.completed_at = now
-                        lead_seq.next_send_at = None
-                        
-                    today = date.today()
-                    daily_stats = db.query(DailyStats).filter(DailyStats.date == today).first()
-                    if not daily_stats:
-                        daily_stats = DailyStats(date=today, emails_sent=0)
-                        db.add(daily_stats)
-                    daily_stats.emails_sent += 1
-                    emails_sent += 1
-                    
-                    # Add human-like delay between sends to avoid being flagged as bulk mail
-                    if i < len(due_sequences) - 1:  # Don't delay after the last email
-                        # Progressive delays: shorter early on, longer as we send more
-                        base_delay = 30 + (i * 10)  # Increase base delay as we send more
-                        variation = random.randint(-15, 60)  # Add random variation
-                        delay_seconds = max(15, base_delay + variation)  # Minimum 15 seconds
-                        delay_seconds = min(delay_seconds, 400)  # Maximum ~6.5 minutes
-                        
-                        logger.info(f"Email {i+1}/{len(due_sequences)} sent. Waiting {delay_seconds} seconds before next email...")
-                        time.sleep(delay_seconds)
-                    
-                else:
-                    sequence_email.status = "failed"
-                    errors.append(f"Failed to send email for lead {lead_seq.lead_id}")
-                    
-            except Exception as e:
-                error_msg = f"Failed to send sequence email for lead {lead_seq.lead_id}: {e}"
-                logger.error(error_msg, extra={
-                    "lead_id": lead_seq.lead_id,
-                    "error": str(e),
-                    "error_type": type(e).__name__
-                }, exc_info=True)
-                errors.append(error_msg)
-        
+        to_plan = []
+        for lead_seq, sequence_email, current_step, lead, sequence, sending_profile, step_active in due_sequences:
+            if not step_active:
+                sequence_email.status = "invalidated"
+                continue
+
+            mailbox_id = mailbox_key(sending_profile)
+            if mailbox_id not in mailbox_quota:
+                mailbox_quota[mailbox_id] = min(10, remaining_mailbox_quota(db, sending_profile, now))
+            if mailbox_quota[mailbox_id] <= 0:
+                skipped_summaries.setdefault("Mailbox send limit reached", []).append(lead_seq.lead_id)
+                continue
+
+            # Check if sending is allowed based on schedule (skip this email if not)
+            profile_id = sending_profile.id if sending_profile else None
+            if profile_id not in schedule_checks:
+                schedule_checks[profile_id] = email_service.is_sending_allowed(sending_profile)
+            is_allowed, schedule_reason = schedule_checks[profile_id]
+            if not is_allowed:
+                skipped_summaries.setdefault(schedule_reason, []).append(lead_seq.lead_id)
+                continue
+
+            # Never send a draft generated from an outdated prompt or sender profile
+            if sequence_email.draft_fingerprint != compute_draft_fingerprint(current_step, sending_profile):
+                sequence_email.status = "invalidated"
+                logger.info("Skipping stale draft; it will be regenerated", extra={
+                    "campaign_email_id": sequence_email.id,
+                    "lead_sequence_id": lead_seq.id
+                })
+                continue
+
+            to_plan.append((lead_seq.id, sequence_email.id, sending_profile))
+            mailbox_quota[mailbox_id] -= 1
+
+        slots_planned = len(plan_send_slots(db, to_plan, now=now, send_job_id=send_job_id))
+
+        # Planned drafts are now guarded by their slots; give the rows back to the queue
+        release_lead_sequences(db, claimed_ids)
         db.commit()
-        
+
         # Log skip summaries if any emails were skipped
         for reason, lead_ids in skipped_summaries.items():
             logger.info(f"Skipped {len(lead_ids)} emails: {reason}", extra={
@@ -243,21 +163,485 @@ def send_sequence_batch():
                 "skip_reason": reason,
                 "lead_ids": lead_ids
             })
-        
-        logger.info(f"Batch completed: {emails_sent} emails sent, {sequences_processed} sequences processed", extra={
-            "emails_sent": emails_sent,
-            "sequences_processed": sequences_processed,
-            "daily_quota_used": f"{daily_stats.emails_sent}/{daily_limit}"
+
+    finally:
+        db.close()
+
+    # Fire anything already due; later slots are picked up by the scheduler's dispatcher
+    dispatch_result = dispatch_send_slots()
+
+    logger.info(f"Batch completed: {slots_planned} send slots planned, {dispatch_result['emails_sent']} emails sent, {sequences_processed} sequences processed", extra={
+        "slots_planned": slots_planned,
+        "emails_sent": dispatch_result["emails_sent"],
+        "sequences_processed": sequences_processed
+    })
+
+    return {
+        **dispatch_result,
+        "sequences_processed": sequences_processed,
+        "slots_planned": slots_planned
+    }
+
+def _record_delivery(slot: SendSlot, sequence_email: CampaignEmail, gmail_message_id: str, sent_at: datetime):
+    """The send itself: slot and email marked sent with Gmail's message id; the caller commits"""
+    slot.status = "sent"
+    slot.gmail_message_id = gmail_message_id
+    sequence_email.status = "sent"
+    sequence_email.sent_at = sent_at
+    sequence_email.gmail_message_id = gmail_message_id
+
+def _advance_after_send(db: Session, lead_seq: LeadCampaign, sent_at: datetime,
+                        steps: Optional[Dict[Tuple[int, int], CampaignStep]] = None):
+    """Stats, daily counter and the sequence's next step after a recorded send; the caller commits"""
+    record_send(db, lead_seq.sequence_id, lead_seq.current_step, sent_at, first_for_lead=lead_seq.last_sent_at is None)
+    lead_seq.last_sent_at = sent_at
+    lead_seq.current_step += 1
+
+    if steps is None:
+        steps = load_active_steps(db, [lead_seq.sequence_id])
+    next_step = steps.get((lead_seq.sequence_id, lead_seq.current_step))
+
+    if next_step:
+        lead_seq.next_send_at = sent_at + timedelta(
+            days=next_step.delay_days,
+            hours=next_step.delay_hours
+        )
+    else:
+        record_status_change(db, lead_seq.sequence_id, lead_seq.status, "completed")
+        lead_seq.status = "completed"
+        lead_seq.completed_at = sent_at
+        lead_seq.next_send_at = None
+
+    # Sharded so parallel mailbox workers never queue on one daily_stats row; commits with the send
+    counter_add(db, DAILY_EMAILS_SENT, day_bucket())
+
+def _dispatch_slot(db: Session, email_service, slot: SendSlot,
+                   steps: Optional[Dict[Tuple[int, int], CampaignStep]] = None) -> dict:
+    """Send the draft behind one due slot in its own short transaction"""
+    # Re-validate everything the send depends on in a single round-trip
+    row = db.query(
+        CampaignEmail, LeadCampaign, Lead, SendingProfile, CampaignStep.step_number, has_reply().label("replied"),
+        Campaign.name.label("campaign_name")
+    ).join(
+        LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).join(
+        Lead, LeadCampaign.lead_id == Lead.id
+    ).join(
+        CampaignStep, CampaignEmail.step_id == CampaignStep.id
+    ).outerjoin(
+        SendingProfile, SendingProfile.id == slot.sending_profile_id
+    ).outerjoin(
+        Campaign, Campaign.id == LeadCampaign.sequence_id
+    ).filter(CampaignEmail.id == slot.sequence_email_id).first()
+
+    sequence_email, lead_seq, lead, sending_profile, step_number, replied, campaign_name = (
+        row if row else (None, None, None, None, None, False, None)
+    )
+
+    outcome = {
+        "slot_id": slot.id,
+        "lead_sequence_id": slot.lead_sequence_id,
+        "campaign_email_id": slot.sequence_email_id,
+        "success": False
+    }
+
+    def cancel(reason):
+        slot.status = "cancelled"
+        slot.error = reason
+        db.commit()
+        outcome["error"] = reason
+        return outcome
+
+    if not sequence_email or sequence_email.status != "draft" or not lead_seq or lead_seq.status != "active":
+        return cancel("Draft or sequence no longer active")
+
+    # A draft for a step the sequence has already moved past must never go out
+    if step_number != lead_seq.current_step:
+        sequence_email.status = "invalidated"
+        return cancel("Draft is for a step that was already sent")
+
+    outcome["lead_id"] = lead_seq.lead_id
+    if not lead or lead.status != "active":
+        return cancel("Lead no longer active")
+
+    is_allowed, schedule_reason = email_service.is_sending_allowed(sending_profile)
+    if not is_allowed:
+        # The draft stays ready and is re-planned once the schedule window opens
+        return cancel(schedule_reason)
+
+    if replied:
+        record_status_change(db, lead_seq.sequence_id, lead_seq.status, "stopped", stop_reason="replied")
+        lead_seq.status = "stopped"
+        lead_seq.stop_reason = "replied"
+        sequence_email.status = "invalidated"
+        return cancel("Lead replied")
+
+    # Signed tokens let the tracking endpoints skip looking the email up; the send time
+    # they carry has second precision, so the recorded sent_at is truncated to match
+    sent_at = datetime.utcnow().replace(microsecond=0)
+    tracking_token = issue_tracking_token(sequence_email.id, lead_seq.id, lead_seq.sequence_id, sent_at)
+
+    # Durable hand-off marker: once set, a failure may mean the email went out (see _run_mailbox_sender)
+    slot.dispatched_at = sent_at
+    db.commit()
+
+    result = email_service.send_draft(
+        lead=lead,
+        subject=sequence_email.subject,
+        content=sequence_email.content,
+        tracking_id=tracking_token or sequence_email.tracking_pixel_id,
+        sending_profile=sending_profile,
+        spam_score=float(sequence_email.spam_score) if sequence_email.spam_score is not None else None
+    )
+    outcome.update(result.to_dict())
+
+    if result.success:
+        # The send is committed on its own before anything else, so a failure in the follow-up
+        # writes can never get the email planned and sent again (reconcile_recorded_sends finishes them)
+        _record_delivery(slot, sequence_email, result.gmail_message_id, sent_at)
+        if tracking_token:
+            sequence_email.tracking_pixel_id = tracking_token
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            db.query(SendSlot).filter(SendSlot.id == slot.id).update({
+                SendSlot.status: "unconfirmed",
+                SendSlot.gmail_message_id: result.gmail_message_id,
+                SendSlot.error: "Sent, but recording the send failed"
+            }, synchronize_session=False)
+            db.commit()
+            raise
+
+        _advance_after_send(db, lead_seq, sent_at, steps)
+        record_activity(
+            db, EMAIL_SENT, occurred_at=sent_at, campaign_id=lead_seq.sequence_id, campaign_name=campaign_name,
+            lead_id=lead.id, lead_email=lead.email, sequence_email_id=sequence_email.id,
+            details={"subject": sequence_email.subject}
+        )
+    elif result.ambiguous:
+        # Gmail may have accepted it: hold the slot (and so the lead) and keep the draft
+        # as it is until reconcile_send_slots.py says whether it went out
+        slot.status = "unconfirmed"
+        slot.error = result.error
+    else:
+        slot.status = "failed"
+        slot.error = result.error
+        sequence_email.status = "failed"
+    db.commit()
+    response_cache.invalidate(SENDS)
+
+    return outcome
+
+def reclaim_stale_dispatches(db: Session, now: Optional[datetime] = None,
+                             timeout_seconds: Optional[int] = None) -> int:
+    """
+    Resolve slots left in dispatching by a sender that died mid-send; commits
+
+    Like an expired lead lease, a slot still dispatching `timeout_seconds` after it was
+    claimed is given up on. If its email was recorded as sent (or has a Gmail message id)
+    the slot is marked sent. If the draft is still ready and was never handed to Gmail the
+    slot goes back to planned, so the next dispatch re-validates and sends it; if it was
+    handed over, whether it went out is unknown and the slot is held as unconfirmed.
+    Otherwise it is cancelled.
+    """
+    now = now or datetime.utcnow()
+    timeout_seconds = timeout_seconds if timeout_seconds is not None else int(os.getenv("SEND_DISPATCH_TIMEOUT_SECONDS", 600))
+
+    stale = db.query(SendSlot, CampaignEmail.status, CampaignEmail.gmail_message_id).outerjoin(
+        CampaignEmail, SendSlot.sequence_email_id == CampaignEmail.id
+    ).filter(
+        SendSlot.status == "dispatching",
+        or_(SendSlot.dispatch_started_at.is_(None), SendSlot.dispatch_started_at < now - timedelta(seconds=timeout_seconds))
+    ).with_for_update(skip_locked=True, of=SendSlot).all()
+
+    for slot, email_status, gmail_message_id in stale:
+        if email_status == "sent" or gmail_message_id:
+            slot.status = "sent"
+        elif email_status == "draft" and slot.dispatched_at is not None:
+            slot.status = "unconfirmed"
+            slot.error = "Interrupted after the hand-off to Gmail; may have been sent"
+        elif email_status == "draft":
+            slot.status = "planned"
+            slot.dispatch_started_at = None
+            slot.error = "Reclaimed after an interrupted dispatch"
+        else:
+            slot.status = "cancelled"
+            slot.error = "Interrupted dispatch; draft no longer ready"
+        logger.warning("Reclaimed stale dispatching slot", extra={
+            "slot_id": slot.id,
+            "campaign_email_id": slot.sequence_email_id,
+            "email_status": email_status,
+            "new_status": slot.status
+        })
+    db.commit()
+    return len(stale)
+
+def reconcile_recorded_sends(db: Session, now: Optional[datetime] = None, grace_minutes: int = 5) -> int:
+    """
+    Finish sends whose delivery is known but whose follow-up writes never committed; commits
+
+    Unconfirmed slots that carry a Gmail message id did go out and are recorded as sent.
+    Then every slot sent in the last day (and at least `grace_minutes` ago, leaving live
+    dispatches alone) whose sequence still sits on the sent step gets its stats, counter,
+    activity event and step advance.
+    """
+    now = now or datetime.utcnow()
+
+    for slot, sequence_email in db.query(SendSlot, CampaignEmail).join(
+        CampaignEmail, SendSlot.sequence_email_id == CampaignEmail.id
+    ).filter(SendSlot.status == "unconfirmed", SendSlot.gmail_message_id.isnot(None)).all():
+        _record_delivery(slot, sequence_email, slot.gmail_message_id, slot.dispatched_at or now)
+    db.commit()
+
+    pending = db.query(LeadCampaign, CampaignEmail).join(
+        CampaignEmail, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).join(
+        SendSlot, SendSlot.sequence_email_id == CampaignEmail.id
+    ).join(
+        CampaignStep, CampaignEmail.step_id == CampaignStep.id
+    ).filter(
+        SendSlot.status == "sent",
+        SendSlot.dispatched_at >= now - timedelta(days=1),
+        SendSlot.dispatched_at < now - timedelta(minutes=grace_minutes),
+        CampaignEmail.status == "sent",
+        LeadCampaign.status == "active",
+        CampaignStep.sequence_id == LeadCampaign.sequence_id,
+        CampaignStep.step_number == LeadCampaign.current_step
+    ).with_for_update(skip_locked=True, of=LeadCampaign).all()
+
+    for lead_seq, sequence_email in pending:
+        _advance_after_send(db, lead_seq, sequence_email.sent_at)
+        record_email_activity(db, [(EMAIL_SENT, sequence_email.id, sequence_email.sent_at, {"subject": sequence_email.subject})])
+        logger.warning("Reconciled a send whose follow-up writes were lost", extra={
+            "campaign_email_id": sequence_email.id,
+            "lead_sequence_id": lead_seq.id
         })
+    db.commit()
+    if pending:
+        response_cache.invalidate(SENDS)
+    return len(pending)
+
+def resolve_unconfirmed_slot(db: Session, slot_id: int, sent: bool, gmail_message_id: Optional[str] = None) -> bool:
+    """
+    Settle an unconfirmed slot by hand once the mailbox's Sent folder has been checked; commits
+
+    sent=True records the send and advances the sequence; sent=False cancels the slot, which
+    lets the still-ready draft be planned again. Returns False if the slot isn't unconfirmed.
+    """
+    row = db.query(SendSlot, CampaignEmail, LeadCampaign).join(
+        CampaignEmail, SendSlot.sequence_email_id == CampaignEmail.id
+    ).join(
+        LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).filter(SendSlot.id == slot_id, SendSlot.status == "unconfirmed").with_for_update(of=SendSlot).first()
+    if not row:
+        return False
+
+    slot, sequence_email, lead_seq = row
+    if not sent:
+        slot.status = "cancelled"
+        slot.error = "Confirmed not sent"
+        db.commit()
+        return True
+
+    sent_at = slot.dispatched_at or datetime.utcnow()
+    _record_delivery(slot, sequence_email, gmail_message_id or slot.gmail_message_id, sent_at)
+    db.commit()
+    if lead_seq.status == "active":
+        _advance_after_send(db, lead_seq, sent_at)
+    record_email_activity(db, [(EMAIL_SENT, sequence_email.id, sent_at, {"subject": sequence_email.subject})])
+    db.commit()
+    response_cache.invalidate(SENDS)
+    return True
+
+def _finish_send_jobs(db: Session):
+    """Mark sending jobs as done once none of their slots are still outstanding"""
+    outstanding = exists().where(and_(
+        SendSlot.send_job_id == SendJob.id,
+        SendSlot.status.in_(["planned", "dispatching"])
+    ))
+    finished = db.query(SendJob).filter(SendJob.status == "sending", ~outstanding).update(
+        {SendJob.status: "done", SendJob.finished_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return finished
+
+def _run_mailbox_sender(email_service, mailbox_id: Optional[int], slot_ids: List[int]) -> Dict:
+    """
+    Send one mailbox's due slots in order, enforcing that mailbox's quotas
+
+    Runs on its own thread and session, so a mailbox with bad credentials or a
+    failing send never holds up the others.
+    """
+    db = SessionLocal()
+    result = {"mailbox_id": mailbox_id, "emails_sent": 0, "errors": [], "results": []}
+
+    def cancel_remaining(remaining_ids, reason):
+        # Drafts stay ready, so the sequences are re-planned on a later pass
+        db.query(SendSlot).filter(
+            SendSlot.id.in_(remaining_ids),
+            SendSlot.status == "planned"
+        ).update({SendSlot.status: "cancelled", SendSlot.error: reason}, synchronize_session=False)
+        db.commit()
+        result["errors"].append(f"Mailbox {mailbox_id or 'default'}: {reason}")
+
+    try:
+        # The environment mailbox (None) is shared by every profile without its own credentials
+        sending_profile = None
+        if mailbox_id is not None:
+            sending_profile = db.query(SendingProfile).filter(SendingProfile.id == mailbox_id).first()
+
+        if not email_service.get_gmail_service(sending_profile):
+            cancel_remaining(slot_ids, "Gmail credentials unavailable")
+            return result
+
+        daily_limit, hourly_limit = mailbox_limits(sending_profile)
+        steps = load_active_steps(db, [
+            sequence_id for (sequence_id,) in db.query(LeadCampaign.sequence_id).join(
+                SendSlot, SendSlot.lead_sequence_id == LeadCampaign.id
+            ).filter(SendSlot.id.in_(slot_ids)).distinct().all()
+        ])
+
+        for position, slot_id in enumerate(slot_ids):
+            usage = mailbox_usage(db, mailbox_id)
+            if usage["sent_today"] >= daily_limit:
+                cancel_remaining(slot_ids[position:], "Mailbox daily limit reached")
+                break
+            if hourly_limit is not None and usage["sent_last_hour"] >= hourly_limit:
+                # Leave the rest planned; they go out once the hourly window frees up
+                logger.info(f"Mailbox {mailbox_id or 'default'} reached its hourly limit", extra={
+                    "mailbox_id": mailbox_id,
+                    "hourly_limit": hourly_limit
+                })
+                break
+
+            claimed = db.query(SendSlot).filter(
+                SendSlot.id == slot_id,
+                SendSlot.status == "planned"
+            ).update({SendSlot.status: "dispatching", SendSlot.dispatch_started_at: datetime.utcnow()},
+                     synchronize_session=False)
+            db.commit()
+            if not claimed:
+                continue
+
+            slot = db.query(SendSlot).filter(SendSlot.id == slot_id).first()
+            try:
+                outcome = _dispatch_slot(db, email_service, slot, steps)
+                result["results"].append(outcome)
+                if outcome.get("success"):
+                    result["emails_sent"] += 1
+                elif outcome.get("error"):
+                    result["errors"].append(f"Slot {slot_id} for lead {outcome.get('lead_id')}: {outcome['error']}")
+
+            except Exception as e:
+                db.rollback()
+                # Once handed to Gmail the email may have gone out, so the slot is held as unconfirmed
+                # (keeping its lead out of planning) until reconciled rather than failed and re-planned
+                handed_off = db.query(SendSlot.dispatched_at).filter(SendSlot.id == slot_id).scalar() is not None
+                db.query(SendSlot).filter(SendSlot.id == slot_id, SendSlot.status == "dispatching").update(
+                    {SendSlot.status: "unconfirmed" if handed_off else "failed", SendSlot.error: str(e)},
+                    synchronize_session=False
+                )
+                db.commit()
+                error_msg = f"Failed to dispatch send slot {slot_id}: {e}"
+                logger.error(error_msg, extra={
+                    "slot_id": slot_id,
+                    "mailbox_id": mailbox_id,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+                result["errors"].append(error_msg)
+
+        return result
+
+    finally:
+        db.close()
+
+def dispatch_send_slots(limit: int = 50):
+    """
+    Send every planned slot that has come due, without sleeping
+
+    Due slots are grouped by mailbox and each mailbox gets its own sender worker, so
+    adding sending profiles scales volume. Each slot is claimed with a conditional
+    update before sending, so overlapping dispatchers never send the same draft twice.
+    """
+    from email_service import get_email_service
+
+    db = SessionLocal()
+
+    try:
+        now = datetime.utcnow()
+        reclaim_stale_dispatches(db, now=now)
+        reconcile_recorded_sends(db, now=now)
+
+        due_slots = db.query(SendSlot.id, SendingProfile).outerjoin(
+            SendingProfile, SendSlot.sending_profile_id == SendingProfile.id
+        ).filter(
+            SendSlot.status == "planned",
+            SendSlot.scheduled_for <= now
+        ).order_by(SendSlot.scheduled_for.asc()).limit(limit).all()
+
+        if not due_slots:
+            _finish_send_jobs(db)
+            return {"emails_sent": 0, "errors": [], "results": []}
+
+        by_mailbox: Dict[Optional[int], List[int]] = {}
+        for slot_id, sending_profile in due_slots:
+            by_mailbox.setdefault(mailbox_key(sending_profile), []).append(slot_id)
+    finally:
+        db.close()
+
+    email_service = get_email_service()
+    emails_sent = 0
+    errors = []
+    send_results = []
+    mailbox_results = []
+
+    max_workers = max(1, min(len(by_mailbox), int(os.getenv("SENDER_MAX_WORKERS", 8))))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mailbox-sender") as executor:
+        futures = {
+            executor.submit(_run_mailbox_sender, email_service, mailbox_id, slot_ids): mailbox_id
+            for mailbox_id, slot_ids in by_mailbox.items()
+        }
+        for future in as_completed(futures):
+            mailbox_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error("Mailbox sender crashed", extra={
+                    "mailbox_id": mailbox_id,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+                errors.append(f"Mailbox {mailbox_id or 'default'}: {e}")
+                continue
+
+            emails_sent += result["emails_sent"]
+            errors.extend(result["errors"])
+            send_results.extend(result["results"])
+            mailbox_results.append({
+                "mailbox_id": mailbox_id,
+                "emails_sent": result["emails_sent"],
+                "errors": len(result["errors"])
+            })
+
+    db = SessionLocal()
+    try:
+        _finish_send_jobs(db)
+        db.commit()
+        daily_emails_sent = read_daily_stats(db)["emails_sent"]
         if emails_sent > 0:
-            logger.info(f"Daily stats: {daily_stats.emails_sent}/{daily_limit} emails sent today")
-        
+            logger.info(f"Daily stats: {daily_emails_sent} emails sent today across {len(by_mailbox)} mailboxes", extra={
+                "emails_sent": emails_sent,
+                "mailboxes": mailbox_results
+            })
+
         return {
             "emails_sent": emails_sent,
-            "sequences_processed": sequences_processed,
             "errors": errors,
-            "daily_limit_status": f"{daily_stats.emails_sent}/{daily_limit}"
+            "results": send_results,
+            "mailboxes": mailbox_results,
+            "daily_emails_sent": daily_emails_sent
         }
-        
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
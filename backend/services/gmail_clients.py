@@ -0,0 +1,85 @@
+from typing import Callable, Dict, Hashable, Optional
+import json
+import threading
+
+import httplib2
+import requests
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+class GmailClientRegistry:
+    """
+    Process-wide Gmail API clients
+
+    Each mailbox keeps one Credentials object, so its access token is reused until it
+    nears expiry and is then refreshed once under a lock. Services are built from the
+    discovery document bundled with google-api-python-client (parsed once), and each
+    thread gets its own keep-alive HTTP connection because httplib2 is not thread-safe.
+    """
+
+    def __init__(self, http_timeout: int = 30):
+        self.http_timeout = http_timeout
+        self._lock = threading.Lock()
+        self._credentials: Dict[Hashable, Credentials] = {}
+        self._refresh_locks: Dict[Hashable, threading.Lock] = {}
+        self._local = threading.local()
+        self._discovery_doc: Optional[dict] = None
+        self._token_session = requests.Session()
+
+    def _discovery(self) -> dict:
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    self._discovery_doc = json.loads(get_static_doc("gmail", "v1"))
+        return self._discovery_doc
+
+    def _credentials_for(self, key: Hashable, factory: Callable[[], Credentials]) -> Credentials:
+        with self._lock:
+            if key not in self._credentials:
+                self._credentials[key] = factory()
+                self._refresh_locks[key] = threading.Lock()
+            credentials = self._credentials[key]
+            refresh_lock = self._refresh_locks[key]
+
+        # `valid` is False once the token is within google-auth's refresh threshold of expiry
+        if not credentials.valid:
+            with refresh_lock:
+                if not credentials.valid:
+                    credentials.refresh(Request(session=self._token_session))
+                    logger.info("Refreshed Gmail access token", extra={
+                        "mailbox": str(key),
+                        "expires_at": credentials.expiry.isoformat() if credentials.expiry else None
+                    })
+        return credentials
+
+    def get_service(self, key: Hashable, credentials_factory: Callable[[], Credentials]):
+        """Gmail service for a mailbox on the calling thread, building it on first use"""
+        credentials = self._credentials_for(key, credentials_factory)
+
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._local.services = {}
+
+        cached = services.get(key)
+        if cached is not None and cached[0] is credentials:
+            return cached[1]
+
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.http_timeout))
+        service = build_from_document(self._discovery(), http=http)
+        services[key] = (credentials, service)
+        return service
+
+    def forget(self, key: Hashable):
+        """Drop a mailbox's cached credentials, e.g. after they were rejected"""
+        with self._lock:
+            self._credentials.pop(key, None)
+            self._refresh_locks.pop(key, None)
+
+gmail_clients = GmailClientRegistry()
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from sqlalchemy.orm import Query, Session
+from sqlalchemy import or_
+import os
+import socket
+
+from models import LeadCampaign
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+def lease_available(now: datetime):
+    """Filter for lead sequences nobody holds a live lease on; expired leases count as free"""
+    return or_(LeadCampaign.lease_expires_at.is_(None), LeadCampaign.lease_expires_at < now)
+
+def claim_lead_sequences(db: Session, due_query: Query, limit: int, now: Optional[datetime] = None,
+                         lease_seconds: Optional[int] = None, worker_id: str = WORKER_ID) -> List[int]:
+    """
+    Lease up to `limit` due lead sequences to this worker and return their ids
+
+    `due_query` selects LeadCampaign.id with the caller's due filters and ordering. Rows are
+    picked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent claimers never block on or
+    take the same rows, then stamped with the claiming worker and a lease expiry and
+    committed. A crashed worker's rows become claimable again once the lease runs out.
+    """
+    now = now or datetime.utcnow()
+    lease_seconds = lease_seconds if lease_seconds is not None else int(os.getenv("LEAD_LEASE_SECONDS", 300))
+
+    rows = due_query.filter(lease_available(now)).limit(limit).with_for_update(
+        skip_locked=True, of=LeadCampaign
+    ).all()
+    claimed_ids = list(dict.fromkeys(row[0] for row in rows))
+
+    if claimed_ids:
+        db.query(LeadCampaign).filter(LeadCampaign.id.in_(claimed_ids)).update({
+            LeadCampaign.claimed_by: worker_id,
+            LeadCampaign.lease_expires_at: now + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+    db.commit()
+
+    if claimed_ids:
+        logger.debug(f"Claimed {len(claimed_ids)} lead sequences", extra={
+            "worker_id": worker_id,
+            "claimed": len(claimed_ids),
+            "lease_seconds": lease_seconds
+        })
+    return claimed_ids
+
+def release_lead_sequences(db: Session, lead_sequence_ids: Iterable[int], worker_id: str = WORKER_ID) -> int:
+    """Give back leases this worker still holds; the caller commits"""
+    lead_sequence_ids = list(lead_sequence_ids)
+    if not lead_sequence_ids:
+        return 0
+    return db.query(LeadCampaign).filter(
+        LeadCampaign.id.in_(lead_sequence_ids),
+        LeadCampaign.claimed_by == worker_id
+    ).update({LeadCampaign.claimed_by: None, LeadCampaign.lease_expires_at: None}, synchronize_session=False)
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
+import os
+
+from models import SendSlot, SendingProfile
+
+# A mailbox is identified by the id of the sending profile that owns its credentials.
+# Profiles without credentials all share the environment (GMAIL_*) mailbox, keyed as None.
+
+def mailbox_key(sending_profile: Optional[SendingProfile]) -> Optional[int]:
+    """Mailbox a sending profile sends through"""
+    if sending_profile is not None and sending_profile.has_gmail_credentials:
+        return sending_profile.id
+    return None
+
+def _env_limits() -> Tuple[int, Optional[int]]:
+    hourly = os.getenv("HOURLY_EMAIL_LIMIT")
+    return int(os.getenv("DAILY_EMAIL_LIMIT", 30)), (int(hourly) if hourly else None)
+
+def mailbox_limits(sending_profile: Optional[SendingProfile]) -> Tuple[int, Optional[int]]:
+    """(daily, hourly) send limits for the mailbox a profile sends through; hourly is None when uncapped"""
+    daily_limit, hourly_limit = _env_limits()
+    if mailbox_key(sending_profile) is None:
+        return daily_limit, hourly_limit
+
+    if sending_profile.daily_send_limit is not None:
+        daily_limit = sending_profile.daily_send_limit
+    if sending_profile.hourly_send_limit is not None:
+        hourly_limit = sending_profile.hourly_send_limit
+    return daily_limit, hourly_limit
+
+def filter_mailbox_slots(db: Session, query, mailbox_id: Optional[int]):
+    """Restrict a SendSlot query to the slots sent through one mailbox"""
+    if mailbox_id is not None:
+        return query.filter(SendSlot.sending_profile_id == mailbox_id)
+
+    shared_profiles = db.query(SendingProfile.id).filter(SendingProfile.gmail_refresh_token_encrypted.is_(None))
+    return query.filter(or_(
+        SendSlot.sending_profile_id.is_(None),
+        SendSlot.sending_profile_id.in_(shared_profiles)
+    ))
+
+def mailbox_usage(db: Session, mailbox_id: Optional[int], now: Optional[datetime] = None) -> Dict[str, int]:
+    """Emails a mailbox sent today and in the last hour, plus slots still waiting to go out"""
+    now = now or datetime.utcnow()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    sent_today, sent_last_hour = filter_mailbox_slots(db, db.query(
+        func.count(SendSlot.id),
+        func.count(SendSlot.id).filter(SendSlot.dispatched_at >= now - timedelta(hours=1))
+    ).filter(
+        SendSlot.status.in_(["sent", "unconfirmed"]),  # unconfirmed ones may well have gone out
+        SendSlot.dispatched_at >= day_start
+    ), mailbox_id).one()
+
+    outstanding = filter_mailbox_slots(db, db.query(func.count(SendSlot.id)).filter(
+        SendSlot.status.in_(["planned", "dispatching"])
+    ), mailbox_id).scalar()
+
+    return {
+        "sent_today": sent_today or 0,
+        "sent_last_hour": sent_last_hour or 0,
+        "outstanding": outstanding or 0
+    }
+
+def remaining_mailbox_quota(db: Session, sending_profile: Optional[SendingProfile], now: Optional[datetime] = None) -> int:
+    """How many more sends can be planned for a profile's mailbox, counting slots already planned"""
+    daily_limit, hourly_limit = mailbox_limits(sending_profile)
+    usage = mailbox_usage(db, mailbox_key(sending_profile), now)
+
+    remaining = daily_limit - usage["sent_today"] - usage["outstanding"]
+    if hourly_limit is not None:
+        remaining = min(remaining, hourly_limit - usage["sent_last_hour"] - usage["outstanding"])
+    return max(remaining, 0)
+
+def total_daily_capacity(db: Session) -> int:
+    """Combined daily limit of the environment mailbox and every profile mailbox"""
+    daily_limit, _ = _env_limits()
+    mailboxes = db.query(SendingProfile).filter(SendingProfile.gmail_refresh_token_encrypted.isnot(None)).all()
+    return daily_limit + sum(mailbox_limits(profile)[0] for profile in mailboxes)
@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from models import CampaignEmail, EmailOpenAnalysis
+from modern_tracking_service import SIGNAL_TYPE_BITS, ModernOpenTracker, OpenStats, TrackingSignal, modern_tracker
+
+def stats_from_row(row: EmailOpenAnalysis) -> OpenStats:
+    return OpenStats(
+        total_signals=row.total_signals or 0,
+        score_sum=row.score_sum or 0.0,
+        timing_prefetch_signals=row.timing_prefetch_signals or 0,
+        prefetch_signals=row.prefetch_signals or 0,
+        human_signals=row.human_signals or 0,
+        signal_type_mask=row.signal_type_mask or 0,
+        other_signal_types=set(row.other_signal_types or ()),
+        ip_sketch=int(row.ip_sketch, 16) if row.ip_sketch else 0,
+        first_signal_at=row.first_open_at,
+        last_signal_at=row.last_activity_at
+    )
+
+def write_stats(row: EmailOpenAnalysis, stats: OpenStats, analysis: Dict):
+    """Store running stats plus the summary fields derived from them on the analysis row"""
+    row.total_signals = stats.total_signals
+    row.score_sum = stats.score_sum
+    row.timing_prefetch_signals = stats.timing_prefetch_signals
+    row.prefetch_signals = stats.prefetch_signals
+    row.human_signals = stats.human_signals
+    row.signal_type_mask = stats.signal_type_mask
+    row.other_signal_types = sorted(stats.other_signal_types)
+    row.ip_sketch = f"{stats.ip_sketch:x}"
+    row.first_open_at = stats.first_signal_at
+    row.last_activity_at = stats.last_signal_at
+    row.unique_ip_count = analysis.get('unique_ip_count', 0)
+    row.confidence_score = analysis['confidence_score']
+    row.is_opened = analysis['is_opened']
+    # The JSON column cannot hold datetimes
+    row.analysis_data = {
+        **analysis,
+        'first_signal_at': stats.first_signal_at.isoformat() if stats.first_signal_at else None,
+        'last_signal_at': stats.last_signal_at.isoformat() if stats.last_signal_at else None
+    }
+    row.updated_at = datetime.utcnow()
+
+def _has_running_stats(row: EmailOpenAnalysis) -> bool:
+    # Rows written before other_signal_types existed hashed unknown types into mask bits past SIGNAL_TYPE_BITS
+    if row.score_sum is None:
+        return False
+    return row.other_signal_types is not None or not (row.signal_type_mask or 0) >> len(SIGNAL_TYPE_BITS)
+
+def _analysis_row(db: Session, tracking_id: str, campaign_email: Optional[CampaignEmail]) -> EmailOpenAnalysis:
+    # Row lock so concurrent hits for one email fold their signals in one after another
+    row = db.query(EmailOpenAnalysis).filter(
+        EmailOpenAnalysis.tracking_id == tracking_id
+    ).with_for_update().first()
+    if not row:
+        row = EmailOpenAnalysis(
+            tracking_id=tracking_id,
+            lead_sequence_id=campaign_email.lead_sequence_id if campaign_email else None,
+            sequence_email_id=campaign_email.id if campaign_email else None
+        )
+        db.add(row)
+    return row
+
+def apply_open_signals(db: Session, tracking_id: str, signals: List[TrackingSignal], send_time: datetime,
+                       campaign_email: Optional[CampaignEmail] = None,
+                       tracker: ModernOpenTracker = modern_tracker) -> Dict:
+    """
+    Fold just-recorded signals of one email into its open analysis and return the analysis
+
+    O(1) per signal once the row carries running stats. Rows created before running stats
+    existed, or with the old hashed bits for unknown signal types, are built once from the
+    stored signal history, which already includes `signals`.
+    The caller commits.
+    """
+    row = _analysis_row(db, tracking_id, campaign_email)
+
+    if not _has_running_stats(row):
+        stats = tracker.build_stats(tracker.store.load(tracking_id, db=db), send_time)
+    else:
+        stats = stats_from_row(row)
+        for signal in signals:
+            tracker.add_signal(stats, signal, send_time)
+
+    analysis = tracker.analysis_from_stats(stats)
+    write_stats(row, stats, analysis)
+    return analysis
+
+def apply_open_signal(db: Session, tracking_id: str, signal: TrackingSignal, send_time: datetime,
+                      campaign_email: Optional[CampaignEmail] = None,
+                      tracker: ModernOpenTracker = modern_tracker) -> Dict:
+    return apply_open_signals(db, tracking_id, [signal], send_time, campaign_email, tracker)
+
+def rebuild_open_analysis(db: Session, tracking_id: str, signals: List[TrackingSignal], send_time: datetime,
+                          campaign_email: Optional[CampaignEmail] = None,
+                          tracker: ModernOpenTracker = modern_tracker) -> EmailOpenAnalysis:
+    """Recompute an email's running stats from its full signal list, e.g. after rescoring; the caller commits"""
+    row = _analysis_row(db, tracking_id, campaign_email)
+    stats = tracker.build_stats(signals, send_time)
+    write_stats(row, stats, tracker.analysis_from_stats(stats))
+    return row
@@ -0,0 +1,259 @@
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import case, func
+import numpy as np
+import os
+import time
+
+from models import Campaign, CampaignEmail, EmailTrackingEvent, LeadCampaign
+from modern_tracking_service import ModernOpenTracker, modern_tracker
+from services.bot_classifier import ClientClassification
+from services.ttl_cache import TTLCache
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass(frozen=True)
+class ScoringParams:
+    """Every knob of open scoring; from_tracker() reproduces ModernOpenTracker exactly"""
+    timing_bands: Tuple[Tuple[Optional[float], bool, float], ...]
+    clean_base_confidence: float
+    suspicious_base_confidence: float
+    signal_weights: Dict[str, float]
+    default_signal_weight: float
+    prefetch_timing_factor: float
+    prefetch_penalty: float
+    diversity_bonus_per_type: float
+    diversity_bonus_cap: float
+    open_threshold: float
+    # Per client label (see services/bot_classifier.py): replacement UA confidence / automated flag
+    client_confidences: Dict[str, float] = field(default_factory=dict)
+    automated_clients: Dict[str, bool] = field(default_factory=dict)
+
+    @classmethod
+    def from_tracker(cls, tracker: ModernOpenTracker = modern_tracker) -> "ScoringParams":
+        return cls(
+            timing_bands=tuple(tracker.TIMING_BANDS),
+            clean_base_confidence=tracker.CLEAN_BASE_CONFIDENCE,
+            suspicious_base_confidence=tracker.SUSPICIOUS_BASE_CONFIDENCE,
+            signal_weights=dict(tracker.SIGNAL_WEIGHTS),
+            default_signal_weight=tracker.DEFAULT_SIGNAL_WEIGHT,
+            prefetch_timing_factor=tracker.PREFETCH_TIMING_FACTOR,
+            prefetch_penalty=tracker.PREFETCH_PENALTY,
+            diversity_bonus_per_type=tracker.DIVERSITY_BONUS_PER_TYPE,
+            diversity_bonus_cap=tracker.DIVERSITY_BONUS_CAP,
+            open_threshold=tracker.OPEN_THRESHOLD
+        )
+
+    def with_overrides(self, **overrides) -> "ScoringParams":
+        """Copy with the given fields replaced; dict fields are merged, None values ignored"""
+        changes = {}
+        for name, value in overrides.items():
+            if value is None:
+                continue
+            current = getattr(self, name)
+            changes[name] = {**current, **value} if isinstance(current, dict) else value
+        return replace(self, **changes)
+
+@dataclass
+class EventColumns:
+    """Tracking events of sent emails as columnar arrays, one row per signal"""
+    email_index: np.ndarray       # int64 row -> position in email_ids
+    delay_seconds: np.ndarray     # float64 seconds between send and signal
+    signal_type_code: np.ndarray  # int32 row -> position in signal_types
+    client_code: np.ndarray       # int32 row -> position in clients
+    email_ids: np.ndarray         # int64 campaign email id per email
+    email_campaign_ids: np.ndarray
+    signal_types: List[str]
+    clients: List[ClientClassification]
+    loaded_at: datetime
+
+    @property
+    def signal_count(self) -> int:
+        return len(self.email_index)
+
+def load_event_columns(db: Session, campaign_id: Optional[int] = None, since: Optional[datetime] = None,
+                       tracker: ModernOpenTracker = modern_tracker, batch_size: int = 50000) -> EventColumns:
+    """
+    Stream tracking events joined to their email's send time and campaign into arrays
+
+    The client classifier runs once per distinct (user agent, IP) pair rather than per row.
+    """
+    query = db.query(
+        EmailTrackingEvent.timestamp, EmailTrackingEvent.signal_type, EmailTrackingEvent.user_agent,
+        EmailTrackingEvent.ip_address, CampaignEmail.id, CampaignEmail.sent_at, LeadCampaign.sequence_id
+    ).join(
+        CampaignEmail, EmailTrackingEvent.tracking_id == CampaignEmail.tracking_pixel_id
+    ).join(
+        LeadCampaign, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).filter(CampaignEmail.sent_at.isnot(None))
+    if campaign_id is not None:
+        query = query.filter(LeadCampaign.sequence_id == campaign_id)
+    if since is not None:
+        query = query.filter(EmailTrackingEvent.timestamp >= since)
+
+    emails: Dict[int, int] = {}
+    email_campaigns: List[int] = []
+    signal_types: Dict[str, int] = {}
+    clients: Dict[ClientClassification, int] = {}
+    client_by_source: Dict[Tuple[str, str], int] = {}
+    email_index, delays, type_codes, client_codes = [], [], [], []
+
+    for timestamp, signal_type, user_agent, ip_address, email_id, sent_at, campaign in query.yield_per(batch_size):
+        if email_id not in emails:
+            emails[email_id] = len(emails)
+            email_campaigns.append(campaign)
+        source = (user_agent or "", ip_address or "")
+        code = client_by_source.get(source)
+        if code is None:
+            classification = tracker.analyze_client(*source)
+            code = client_by_source[source] = clients.setdefault(classification, len(clients))
+        email_index.append(emails[email_id])
+        delays.append((timestamp - sent_at).total_seconds())
+        type_codes.append(signal_types.setdefault(signal_type, len(signal_types)))
+        client_codes.append(code)
+
+    return EventColumns(
+        email_index=np.asarray(email_index, dtype=np.int64),
+        delay_seconds=np.asarray(delays, dtype=np.float64),
+        signal_type_code=np.asarray(type_codes, dtype=np.int32),
+        client_code=np.asarray(client_codes, dtype=np.int32),
+        email_ids=np.fromiter(emails, dtype=np.int64, count=len(emails)),
+        email_campaign_ids=np.asarray(email_campaigns, dtype=np.int64),
+        signal_types=list(signal_types),
+        clients=list(clients),
+        loaded_at=datetime.utcnow()
+    )
+
+def score_columns(columns: EventColumns, params: ScoringParams) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Open confidence and opened flag per email in columns.email_ids
+
+    Vectorised form of build_signal -> score_signal -> confidence_from_stats: every step
+    is an array operation over all signals, then per-email sums via bincount.
+    """
+    emails = len(columns.email_ids)
+    if not columns.signal_count:
+        return np.zeros(emails), np.zeros(emails, dtype=bool)
+
+    # Timing: the band each delay falls in
+    bounds = np.array([band[0] for band in params.timing_bands if band[0] is not None], dtype=np.float64)
+    band_prefetch = np.array([band[1] for band in params.timing_bands])
+    band_confidence = np.array([band[2] for band in params.timing_bands], dtype=np.float64)
+    band = np.searchsorted(bounds, columns.delay_seconds, side="right")
+    timing_prefetch = band_prefetch[band]
+    timing_confidence = band_confidence[band]
+
+    # Client (UA + network) lookups per code, with what-if overrides by label
+    client_automated = np.array([params.automated_clients.get(c.label, c.is_automated) for c in columns.clients])
+    client_confidence = np.array([params.client_confidences.get(c.label, c.confidence) for c in columns.clients],
+                                 dtype=np.float64)
+    automated = client_automated[columns.client_code]
+
+    base = np.where(automated | timing_prefetch, params.suspicious_base_confidence, params.clean_base_confidence)
+    confidence = base * client_confidence[columns.client_code] * timing_confidence
+
+    weights = np.array([params.signal_weights.get(t, params.default_signal_weight) for t in columns.signal_types],
+                       dtype=np.float64)
+    score = confidence * weights[columns.signal_type_code]
+    score *= np.where(timing_prefetch, params.prefetch_timing_factor, timing_confidence)
+
+    # Per-email aggregation
+    total = np.bincount(columns.email_index, minlength=emails).astype(np.float64)
+    score_sum = np.bincount(columns.email_index, weights=score, minlength=emails)
+    prefetch_count = np.bincount(columns.email_index, weights=timing_prefetch.astype(np.float64), minlength=emails)
+
+    # Distinct signal types per email: each type has its own code
+    type_count = max(len(columns.signal_types), 1)
+    pairs = np.unique(columns.email_index * type_count + columns.signal_type_code)
+    distinct_types = np.bincount(pairs // type_count, minlength=emails)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base_confidence = np.where(total > 0, score_sum / total, 0.0)
+        penalty = 1.0 - np.where(total > 0, prefetch_count / total, 0.0) * params.prefetch_penalty
+    bonus = np.minimum(distinct_types * params.diversity_bonus_per_type, params.diversity_bonus_cap)
+    open_confidence = np.clip(base_confidence * penalty + bonus, 0.0, 1.0)
+    open_confidence[total == 0] = 0.0
+    return open_confidence, open_confidence > params.open_threshold
+
+_columns_cache = TTLCache(maxsize=8, ttl_seconds=float(os.getenv("OPEN_SCORING_CACHE_TTL_SECONDS", 300)),
+                          name="open_scoring_columns")
+
+def cached_event_columns(db: Session, campaign_id: Optional[int] = None, refresh: bool = False) -> EventColumns:
+    """load_event_columns, reused for a few minutes so repeated what-ifs skip the table scan"""
+    columns = None if refresh else _columns_cache.get(campaign_id)
+    if columns is None:
+        columns = load_event_columns(db, campaign_id=campaign_id)
+        _columns_cache.set(campaign_id, columns)
+    return columns
+
+def _rate(opens: int, sent: int) -> float:
+    return round(opens / sent * 100, 2) if sent else 0.0
+
+def simulate_open_rates(db: Session, params: ScoringParams, campaign_id: Optional[int] = None,
+                        refresh: bool = False) -> Dict:
+    """
+    Open rate per campaign under `params` next to the current rules; read-only
+
+    `baseline` rescoring with today's rules over the same events, so the delta isolates the
+    rule change; `recorded_opens` is what the campaign emails currently say.
+    """
+    started = time.monotonic()
+    columns = cached_event_columns(db, campaign_id, refresh=refresh)
+    _, baseline_opened = score_columns(columns, ScoringParams.from_tracker())
+    simulated_confidence, simulated_opened = score_columns(columns, params)
+
+    campaigns_present = np.unique(columns.email_campaign_ids)
+    baseline_by_campaign = dict(zip(campaigns_present.tolist(), [
+        int(baseline_opened[columns.email_campaign_ids == c].sum()) for c in campaigns_present
+    ]))
+    simulated_by_campaign = dict(zip(campaigns_present.tolist(), [
+        int(simulated_opened[columns.email_campaign_ids == c].sum()) for c in campaigns_present
+    ]))
+
+    sent_query = db.query(
+        LeadCampaign.sequence_id, Campaign.name, func.count(CampaignEmail.id),
+        func.sum(case((CampaignEmail.opens > 0, 1), else_=0))
+    ).join(
+        CampaignEmail, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).join(
+        Campaign, Campaign.id == LeadCampaign.sequence_id
+    ).filter(CampaignEmail.sent_at.isnot(None)).group_by(LeadCampaign.sequence_id, Campaign.name)
+    if campaign_id is not None:
+        sent_query = sent_query.filter(LeadCampaign.sequence_id == campaign_id)
+
+    campaigns = []
+    totals = {"emails_sent": 0, "recorded_opens": 0, "baseline_opens": 0, "simulated_opens": 0}
+    for campaign, name, sent, recorded in sent_query.all():
+        row = {
+            "campaign_id": campaign,
+            "campaign_name": name,
+            "emails_sent": sent,
+            "recorded_opens": int(recorded or 0),
+            "baseline_opens": baseline_by_campaign.get(campaign, 0),
+            "simulated_opens": simulated_by_campaign.get(campaign, 0)
+        }
+        for key in totals:
+            totals[key] += row[key]
+        row["baseline_open_rate"] = _rate(row["baseline_opens"], sent)
+        row["simulated_open_rate"] = _rate(row["simulated_opens"], sent)
+        row["open_rate_change"] = round(row["simulated_open_rate"] - row["baseline_open_rate"], 2)
+        campaigns.append(row)
+
+    totals["baseline_open_rate"] = _rate(totals["baseline_opens"], totals["emails_sent"])
+    totals["simulated_open_rate"] = _rate(totals["simulated_opens"], totals["emails_sent"])
+    totals["open_rate_change"] = round(totals["simulated_open_rate"] - totals["baseline_open_rate"], 2)
+
+    return {
+        "signals": columns.signal_count,
+        "emails_with_signals": len(columns.email_ids),
+        "data_loaded_at": columns.loaded_at.isoformat(),
+        "open_threshold": params.open_threshold,
+        "emails_changed": int((simulated_opened != baseline_opened).sum()),
+        "confidence_histogram": np.histogram(simulated_confidence, bins=10, range=(0.0, 1.0))[0].tolist(),
+        "campaigns": sorted(campaigns, key=lambda row: row["campaign_id"]),
+        "totals": totals,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+    }
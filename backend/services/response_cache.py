@@ -0,0 +1,250 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+import hashlib
+import json
+import os
+import threading
+
+from services.ttl_cache import TTLCache
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Invalidation tags: what a cached response was computed from
+SENDS = "sends"
+TRACKING = "tracking"
+LEADS = "leads"
+CAMPAIGNS = "campaigns"
+DELIVERABILITY = "deliverability"
+
+# Endpoint -> (default TTL seconds, tags). RESPONSE_CACHE_TTL_<ENDPOINT> overrides a TTL; 0 disables it.
+# Sharded counter flushes do not invalidate anything: the TTL bounds how stale those numbers get
+ENDPOINTS: Dict[str, Tuple[float, Tuple[str, ...]]] = {
+    "dashboard": (15, (SENDS, TRACKING, LEADS, CAMPAIGNS)),
+    "today_activity": (10, (SENDS, TRACKING, LEADS)),
+    "campaign_progress": (30, (SENDS, TRACKING, LEADS, CAMPAIGNS)),
+    "deliverability_health": (300, (DELIVERABILITY,)),
+    "deliverability_trend": (300, (DELIVERABILITY,)),
+}
+
+# Browsers keep the body but revalidate every time, so repeat loads of unchanged data get a 304
+CACHE_CONTROL = "private, no-cache"
+
+Entry = Tuple[str, bytes]  # (etag, JSON body)
+
+class MemoryBackend:
+    """Entries and tag generations in this process; invalidations from other processes are not seen"""
+
+    name = "memory"
+
+    def __init__(self, maxsize: int = 1024):
+        self.entries = TTLCache(maxsize=maxsize, ttl_seconds=60, name="response_cache")
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generations(self, tags: Iterable[str]) -> List[int]:
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def get(self, key: str) -> Optional[Entry]:
+        return self.entries.get(key)
+
+    def set(self, key: str, entry: Entry, ttl_seconds: float):
+        self.entries.set(key, entry, ttl_seconds=ttl_seconds)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            generations = dict(self._generations)
+        return {**self.entries.stats(), "generations": generations}
+
+class RedisBackend:
+    """Entries and tag generations shared by every worker and the scheduler through Redis"""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "response_cache:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def _generation_key(self, tag: str) -> str:
+        return f"{self.prefix}gen:{tag}"
+
+    def generations(self, tags: Iterable[str]) -> List[int]:
+        return [int(value or 0) for value in self.client.mget([self._generation_key(tag) for tag in tags])]
+
+    def bump(self, tags: Iterable[str]):
+        pipe = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(self._generation_key(tag))
+        pipe.execute()
+
+    def get(self, key: str) -> Optional[Entry]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return etag.decode(), body
+
+    def set(self, key: str, entry: Entry, ttl_seconds: float):
+        etag, body = entry
+        self.client.set(self.prefix + key, etag.encode() + b"\n" + body, ex=max(1, int(ttl_seconds)))
+
+    def stats(self) -> Dict:
+        return {"name": "response_cache", "keys": self.client.dbsize()}
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+class ResponseCache:
+    """
+    Read-through cache for JSON read endpoints, with ETags and tag-based invalidation
+
+    Keys combine the endpoint, the current generation of each of its tags, the user and
+    the sorted query string. invalidate(tag) bumps the tag's generation, so every entry
+    built from it stops matching at once and simply ages out. Writers call it after
+    committing: a request that sees the new generation then also reads the new data.
+
+    With the memory backend each process caches (and invalidates) on its own, so writes
+    made by the scheduler only show up once the entry's TTL runs out; the Redis backend
+    shares both across processes. Backend errors are logged and the response is
+    computed uncached.
+    """
+
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self.not_modified = 0
+        self.builds = 0
+        self.backend_errors = 0
+
+    def ttl(self, endpoint: str) -> float:
+        return float(os.getenv(f"RESPONSE_CACHE_TTL_{endpoint.upper()}", ENDPOINTS[endpoint][0]))
+
+    def _key(self, endpoint: str, request: Request, user) -> Optional[str]:
+        try:
+            generations = self.backend.generations(ENDPOINTS[endpoint][1])
+        except Exception as e:
+            self._backend_failed("generations", e)
+            return None
+        query = urlencode(sorted(request.query_params.multi_items()))
+        user_id = getattr(user, "id", None)
+        return f"{endpoint}:{'.'.join(map(str, generations))}:{user_id}:{query}"
+
+    def _get(self, key: str) -> Optional[Entry]:
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            self._backend_failed("get", e)
+            return None
+
+    def _set(self, key: str, entry: Entry, ttl_seconds: float):
+        try:
+            self.backend.set(key, entry, ttl_seconds)
+        except Exception as e:
+            self._backend_failed("set", e)
+
+    def _backend_failed(self, operation: str, error: Exception):
+        self.backend_errors += 1
+        logger.warning("Response cache backend error; serving uncached", extra={
+            "backend": self.backend.name,
+            "operation": operation,
+            "error": str(error),
+            "error_type": type(error).__name__
+        })
+
+    def _build_lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            if len(self._build_locks) > 1024:
+                self._build_locks = {k: lock for k, lock in self._build_locks.items() if lock.locked()}
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def _build(self, build: Callable[[], Any]) -> Entry:
+        self.builds += 1
+        body = json.dumps(
+            jsonable_encoder(build()), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+        return f'"{hashlib.sha1(body).hexdigest()}"', body
+
+    def _response(self, request: Request, entry: Entry, status: str) -> Response:
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "X-Cache": status}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def respond(self, request: Request, endpoint: str, user, build: Callable[[], Any]) -> Response:
+        """
+        The cached JSON response for `endpoint`, or build() serialised and cached
+
+        Concurrent misses for one key in this process wait for a single build. Responses
+        carry an ETag either way; a matching If-None-Match gets a 304.
+        """
+        ttl = self.ttl(endpoint)
+        key = self._key(endpoint, request, user) if self.enabled and ttl > 0 else None
+        if key is None:
+            return self._response(request, self._build(build), "BYPASS")
+
+        entry = self._get(key)
+        if entry is not None:
+            return self._response(request, entry, "HIT")
+        with self._build_lock(key):
+            entry = self._get(key)
+            if entry is not None:
+                return self._response(request, entry, "HIT")
+            entry = self._build(build)
+            self._set(key, entry, ttl)
+        return self._response(request, entry, "MISS")
+
+    def invalidate(self, *tags: str):
+        """Drop every cached response built from these tags; call after the write commits"""
+        if not self.enabled or not tags:
+            return
+        try:
+            self.backend.bump(tags)
+        except Exception as e:
+            self._backend_failed("invalidate", e)
+
+    def stats(self) -> Dict:
+        try:
+            backend_stats = self.backend.stats()
+        except Exception as e:
+            backend_stats = {"error": str(e)}
+        return {
+            "backend": self.backend.name,
+            "enabled": self.enabled,
+            "ttls": {endpoint: self.ttl(endpoint) for endpoint in ENDPOINTS},
+            "builds": self.builds,
+            "not_modified": self.not_modified,
+            "backend_errors": self.backend_errors,
+            **backend_stats
+        }
+
+def _create_response_cache() -> ResponseCache:
+    backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    if backend_name == "redis":
+        try:
+            return ResponseCache(RedisBackend(os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")))
+        except ImportError:
+            logger.error("RESPONSE_CACHE_BACKEND=redis but the redis package is not installed; using memory")
+    return ResponseCache(
+        MemoryBackend(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", 1024))),
+        enabled=backend_name != "off"
+    )
+
+response_cache = _create_response_cache()
@@ -0,0 +1,104 @@
+from email.utils import formatdate
+from typing import Dict, Optional
+import hashlib
+import os
+import re
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.ttl_cache import TTLCache
+from services.circuit_breaker import rspamd_breaker
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+def normalize_for_scan(subject: str, content: str) -> tuple:
+    """Canonical (subject, body) so cosmetic whitespace differences share one scan result"""
+    subject = re.sub(r"\s+", " ", subject or "").strip()
+    lines = (content or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    body = "\n".join(line.rstrip() for line in lines).strip()
+    return subject, body
+
+def content_hash(subject: str, content: str) -> str:
+    subject, body = normalize_for_scan(subject, content)
+    return hashlib.sha256(f"{subject}\x00{body}".encode("utf-8")).hexdigest()
+
+class RspamdClient:
+    """
+    Shared Rspamd client: keep-alive connection pool plus an LRU/TTL cache of scan results
+
+    Results are keyed on a hash of the normalised content rather than on the raw message
+    (which carries a Date header), so retries, previews and re-sends of the same draft
+    are served from the cache. The Message-ID is derived from that hash as well.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10, pool_size: int = 10,
+                 cache_size: int = 1024, cache_ttl_seconds: float = 3600):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = TTLCache(maxsize=cache_size, ttl_seconds=cache_ttl_seconds, name="rspamd_scan")
+
+    def _format_message(self, subject: str, body: str, digest: str) -> str:
+        return f"""From: sender@example.com
+To: recipient@example.com
+Subject: {subject}
+Date: {formatdate(usegmt=True)}
+Message-ID: <{digest[:32]}@example.com>
+MIME-Version: 1.0
+Content-Type: text/plain; charset=UTF-8
+
+{body}"""
+
+    def scan(self, subject: str, content: str, timeout: Optional[float] = None) -> Dict:
+        """
+        Scan a message and return Rspamd's result (the 'default' section)
+
+        Raises requests exceptions, RspamdError or CircuitOpenError on failure; failures are never cached.
+        """
+        digest = content_hash(subject, content)
+        cached = self.cache.get(digest)
+        if cached is not None:
+            logger.debug("Rspamd scan served from cache", extra={"content_hash": digest[:12]})
+            return cached
+
+        subject, body = normalize_for_scan(subject, content)
+        message = self._format_message(subject, body, digest).encode("utf-8")
+
+        def post(adaptive_timeout: float):
+            response = self.session.post(
+                f"{self.base_url}/scan",
+                data=message,
+                headers={"Content-Type": "text/plain"},
+                timeout=min(timeout or self.timeout, adaptive_timeout)
+            )
+            if response.status_code != 200:
+                raise RspamdError(f"Rspamd returned status {response.status_code}", response.status_code)
+            return response.json()
+
+        # Raises CircuitOpenError without touching the network while Rspamd is failing
+        result = rspamd_breaker.call(post)
+        scan_result = result.get("default", result)
+        self.cache.set(digest, scan_result)
+        return scan_result
+
+    def cache_stats(self) -> Dict:
+        return self.cache.stats()
+
+class RspamdError(Exception):
+    """Rspamd answered with a non-200 status"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+rspamd_client = RspamdClient(
+    base_url=os.getenv("RSPAMD_URL", "http://rspamd:11333"),
+    pool_size=int(os.getenv("RSPAMD_POOL_SIZE", 10)),
+    cache_size=int(os.getenv("RSPAMD_CACHE_SIZE", 1024)),
+    cache_ttl_seconds=float(os.getenv("RSPAMD_CACHE_TTL_SECONDS", 3600))
+)
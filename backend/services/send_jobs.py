@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+import os
+import threading
+import uuid
+import zlib
+
+from database import SessionLocal, engine
+from models import SendJob
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+ACTIVE_JOB_STATUSES = ["queued", "generating", "sending"]
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+@contextmanager
+def pipeline_lock(name: str = "send-pipeline"):
+    """
+    Non-blocking, cross-process lock around the send pipeline; yields whether it was acquired
+
+    On Postgres this is a session-level advisory lock held on a dedicated connection, so only
+    one scheduler replica runs queued jobs at a time and job progress stays attributable.
+    Individual lead sequences are protected by leases (services/leases.py).
+    Other databases fall back to an in-process lock.
+    """
+    if engine.dialect.name == "postgresql":
+        key = zlib.crc32(name.encode("utf-8"))
+        connection = engine.connect()
+        try:
+            acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        finally:
+            connection.close()
+        return
+
+    with _local_locks_guard:
+        lock = _local_locks.setdefault(name, threading.Lock())
+    acquired = lock.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
+
+def enqueue_send_job(db: Session, trigger: str = "manual", user_id: Optional[int] = None) -> SendJob:
+    """Queue a send job, reusing the one still waiting to run if there is one"""
+    queued = db.query(SendJob).filter(SendJob.status == "queued").order_by(SendJob.created_at.asc()).first()
+    if queued:
+        return queued
+
+    job = SendJob(id=str(uuid.uuid4()), trigger=trigger, requested_by=user_id, status="queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    logger.info("Send job queued", extra={"send_job_id": job.id, "trigger": trigger, "user_id": user_id})
+    return job
+
+def _update_job(job_id: str, **fields):
+    db = SessionLocal()
+    try:
+        db.query(SendJob).filter(SendJob.id == job_id).update(fields, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def run_send_job(job_id: str) -> Dict:
+    """Generate drafts for everything due, then plan paced send slots tagged with this job"""
+    from services.draft_pregen import pregenerate_drafts
+    from services.email_batch import send_sequence_batch
+
+    _update_job(job_id, status="generating", started_at=datetime.utcnow())
+    logger.info("Send job started", extra={"send_job_id": job_id})
+
+    try:
+        pregen = pregenerate_drafts(lookahead_minutes=0)
+        _update_job(job_id, status="sending",
+                    drafts_created=pregen.get("drafts_created", 0),
+                    drafts_failed=pregen.get("drafts_failed", 0))
+
+        result = send_sequence_batch(send_job_id=job_id)
+        _update_job(job_id, slots_planned=result.get("slots_planned", 0))
+
+    except Exception as e:
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        logger.error("Send job failed", extra={
+            "send_job_id": job_id,
+            "error": str(e),
+            "error_type": type(e).__name__
+        }, exc_info=True)
+        return {"send_job_id": job_id, "status": "failed", "error": str(e)}
+
+    # Jobs stay in "sending" until the dispatcher has fired their last slot
+    db = SessionLocal()
+    try:
+        from services.email_batch import _finish_send_jobs
+        _finish_send_jobs(db)
+        status = db.query(SendJob.status).filter(SendJob.id == job_id).scalar()
+    finally:
+        db.close()
+
+    logger.info("Send job planned", extra={
+        "send_job_id": job_id,
+        "status": status,
+        "drafts_created": pregen.get("drafts_created", 0),
+        "slots_planned": result.get("slots_planned", 0),
+        "emails_sent": result.get("emails_sent", 0)
+    })
+    return {"send_job_id": job_id, "status": status, **result}
+
+def fail_stale_send_jobs(db: Session, now: Optional[datetime] = None,
+                         timeout_seconds: Optional[int] = None) -> int:
+    """
+    Fail jobs left in "generating" by a scheduler that died mid-run; commits
+
+    A job generates under the pipeline lock, so one still generating
+    `timeout_seconds` after it started, seen while holding that lock, is not running
+    anywhere. It is failed rather than re-queued so a job that crashes the scheduler
+    cannot do so in a loop; jobs already "sending" finish once their slots are dispatched.
+    """
+    now = now or datetime.utcnow()
+    timeout_seconds = timeout_seconds if timeout_seconds is not None else int(os.getenv("SEND_JOB_TIMEOUT_SECONDS", 3600))
+
+    stale = db.query(SendJob).filter(
+        SendJob.status == "generating",
+        SendJob.started_at < now - timedelta(seconds=timeout_seconds)
+    ).all()
+    for job in stale:
+        job.status = "failed"
+        job.error = "Interrupted while generating drafts; queue a new send job"
+        job.finished_at = now
+        logger.warning("Failed stale send job", extra={"send_job_id": job.id, "started_at": job.started_at.isoformat()})
+    db.commit()
+    return len(stale)
+
+def run_queued_send_jobs() -> int:
+    """Run queued send jobs in order under the pipeline lock; returns how many ran"""
+    with pipeline_lock() as acquired:
+        if not acquired:
+            logger.debug("Send pipeline busy; queued jobs will be picked up on the next tick")
+            return 0
+
+        db = SessionLocal()
+        try:
+            fail_stale_send_jobs(db)
+        finally:
+            db.close()
+
+        ran = 0
+        while True:
+            db = SessionLocal()
+            try:
+                job_id = db.query(SendJob.id).filter(SendJob.status == "queued").order_by(
+                    SendJob.created_at.asc()
+                ).limit(1).scalar()
+            finally:
+                db.close()
+
+            if not job_id:
+                return ran
+
+            run_send_job(job_id)
+            ran += 1
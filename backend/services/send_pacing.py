@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+import random
+
+from models import SendSlot, SendingProfile
+from services.mailboxes import filter_mailbox_slots, mailbox_key
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class PacingPolicy:
+    """Human-like spacing between sends: jittered, and progressively wider as a run gets longer"""
+    initial_delay_min: int = 5
+    initial_delay_max: int = 60
+    base_delay: int = 30
+    delay_increment: int = 10
+    jitter_min: int = -15
+    jitter_max: int = 60
+    min_delay: int = 15
+    max_delay: int = 400
+
+    @classmethod
+    def for_profile(cls, sending_profile: Optional[SendingProfile]) -> "PacingPolicy":
+        """Build the policy stored on a sending profile, falling back to defaults for unset fields"""
+        policy = cls()
+        if not sending_profile:
+            return policy
+
+        for field in policy.__dataclass_fields__:
+            value = getattr(sending_profile, f"pacing_{field}", None)
+            if value is not None:
+                setattr(policy, field, value)
+        return policy
+
+    def initial_delay(self) -> int:
+        """Delay before the first slot of a new run"""
+        low, high = sorted((self.initial_delay_min, self.initial_delay_max))
+        return random.randint(low, high)
+
+    def delay_after(self, slot_index: int) -> int:
+        """Gap between slot `slot_index` and the one after it"""
+        base_delay = self.base_delay + (slot_index * self.delay_increment)
+        low, high = sorted((self.jitter_min, self.jitter_max))
+        delay_seconds = max(self.min_delay, base_delay + random.randint(low, high))
+        return min(delay_seconds, self.max_delay)
+
+def _last_slot(db: Session, mailbox_id: Optional[int], since: datetime) -> Tuple[Optional[datetime], int]:
+    """Latest recent slot time and run position for a mailbox, so new slots can extend the same run"""
+    query = db.query(func.max(SendSlot.scheduled_for), func.max(SendSlot.slot_index)).filter(
+        SendSlot.status.in_(["planned", "dispatching", "sent"]),
+        SendSlot.scheduled_for >= since
+    )
+
+    last_time, last_index = filter_mailbox_slots(db, query, mailbox_id).one()
+    return last_time, (last_index if last_index is not None else -1)
+
+def plan_send_slots(db: Session, drafts: List[Tuple[int, int, Optional[SendingProfile]]],
+                    now: Optional[datetime] = None, send_job_id: Optional[str] = None) -> List[SendSlot]:
+    """
+    Assign each (lead_sequence_id, sequence_email_id, sending_profile) a paced send slot
+
+    Slots are planned per mailbox and continue any run that is still in progress,
+    so repeated planning passes never bunch sends together. The caller commits.
+    """
+    now = now or datetime.utcnow()
+    by_mailbox: Dict[Optional[int], List[Tuple[int, int, Optional[SendingProfile]]]] = {}
+    for item in drafts:
+        by_mailbox.setdefault(mailbox_key(item[2]), []).append(item)
+
+    planned = []
+    for mailbox_id, items in by_mailbox.items():
+        policy = PacingPolicy.for_profile(items[0][2])
+        last_time, last_index = _last_slot(db, mailbox_id, since=now - timedelta(seconds=policy.max_delay))
+        continuation = last_time + timedelta(seconds=policy.delay_after(last_index)) if last_time else None
+
+        if continuation and continuation > now:
+            slot_index = last_index + 1
+            scheduled_for = continuation
+        else:
+            slot_index = 0
+            scheduled_for = now + timedelta(seconds=policy.initial_delay())
+
+        for lead_sequence_id, sequence_email_id, sending_profile in items:
+            slot = SendSlot(
+                sending_profile_id=sending_profile.id if sending_profile else None,
+                lead_sequence_id=lead_sequence_id,
+                sequence_email_id=sequence_email_id,
+                send_job_id=send_job_id,
+                slot_index=slot_index,
+                scheduled_for=scheduled_for,
+                status="planned"
+            )
+            db.add(slot)
+            planned.append(slot)
+
+            scheduled_for = scheduled_for + timedelta(seconds=policy.delay_after(slot_index))
+            slot_index += 1
+
+        logger.info(f"Planned {len(items)} send slots for mailbox {mailbox_id or 'default'}", extra={
+            "mailbox_id": mailbox_id,
+            "slots_planned": len(items),
+            "last_slot_at": planned[-1].scheduled_for.isoformat()
+        })
+
+    return planned
@@ -0,0 +1,514 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+import os
+import queue
+import threading
+import time
+
+from database import SessionLocal, get_async_sessionmaker
+from models import CampaignEmail, LeadCampaign, LinkClick
+from modern_tracking_service import ModernOpenTracker, modern_tracker
+from services.open_analysis import apply_open_signals
+from services.counters import (
+    CAMPAIGN_EMAIL_OPENS, DAILY_EMAILS_OPENED, DAILY_LINKS_CLICKED, campaign_bucket, counters, day_bucket
+)
+from services.campaign_stats import record_engagement
+from services.activity_feed import EMAIL_CLICKED, EMAIL_OPENED, record_email_activity
+from services.tracking_spool import HitSpool
+from services.response_cache import TRACKING, response_cache
+from services.tracking_tokens import TrackingClaims, decode_tracking_token, is_tracking_token
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class TrackingHit:
+    """What a tracking endpoint saw, queued for the flusher"""
+    kind: str  # "signal" or "click"
+    tracking_id: str
+    signal_type: str
+    user_agent: str
+    ip_address: str
+    seen_at: datetime = field(default_factory=datetime.utcnow)
+    url: Optional[str] = None
+    referer: Optional[str] = None
+    claims: Optional[TrackingClaims] = None  # set when tracking_id is a verified signed token
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+def _opens_by_campaign(db: Session, email_ids: List[int]) -> Dict[int, int]:
+    """Number of the given emails per campaign"""
+    if not email_ids:
+        return {}
+    return dict(db.query(LeadCampaign.sequence_id, func.count(CampaignEmail.id)).join(
+        CampaignEmail, CampaignEmail.lead_sequence_id == LeadCampaign.id
+    ).filter(CampaignEmail.id.in_(email_ids)).group_by(LeadCampaign.sequence_id).all())
+
+def process_hits(db: Session, hits: List[TrackingHit], tracker: ModernOpenTracker = modern_tracker) -> Dict:
+    """
+    Apply a batch of tracking hits in one transaction: bulk-insert the events and clicks,
+    fold each email's signals into its open analysis, and bump opens and clicks with one
+    SQL increment each, first opens and clicks also counting towards the campaign stats.
+    Commits, then adds the day's totals and each campaign's first opens to the sharded
+    counters.
+    """
+    # Signed tokens carry everything needed; only legacy tracking ids are looked up
+    emails = {hit.tracking_id: hit.claims for hit in hits if hit.claims}
+    legacy_ids = {hit.tracking_id for hit in hits if not hit.claims}
+    if legacy_ids:
+        emails.update({
+            row.tracking_pixel_id: row
+            for row in db.query(
+                CampaignEmail.id, CampaignEmail.lead_sequence_id, CampaignEmail.sent_at, CampaignEmail.tracking_pixel_id
+            ).filter(CampaignEmail.tracking_pixel_id.in_(legacy_ids))
+        })
+
+    entries = []
+    signals_by_id = defaultdict(list)
+    clicks_by_email = defaultdict(int)
+    activity = []
+
+    for hit in hits:
+        campaign_email = emails.get(hit.tracking_id)
+        send_time = campaign_email.sent_at if campaign_email and campaign_email.sent_at else hit.seen_at
+        signal = tracker.build_signal(hit.signal_type, hit.user_agent, hit.ip_address, send_time, timestamp=hit.seen_at)
+        entries.append((hit.tracking_id, signal, send_time))
+        signals_by_id[hit.tracking_id].append(signal)
+
+        if hit.kind == "click" and campaign_email:
+            clicks_by_email[campaign_email.id] += 1
+            activity.append((EMAIL_CLICKED, campaign_email.id, hit.seen_at, {"url": hit.url, "tracking_id": hit.tracking_id}))
+            db.add(LinkClick(
+                tracking_id=hit.tracking_id,
+                lead_sequence_id=campaign_email.lead_sequence_id,
+                sequence_email_id=campaign_email.id,
+                original_url=hit.url,
+                ip_address=hit.ip_address,
+                user_agent=hit.user_agent,
+                referer=hit.referer,
+                clicked_at=hit.seen_at
+            ))
+
+    tracker.store.append_many(entries, db=db)
+
+    newly_opened_ids = []
+    for tracking_id, signals in signals_by_id.items():
+        campaign_email = emails.get(tracking_id)
+        send_time = campaign_email.sent_at if campaign_email and campaign_email.sent_at else signals[0].timestamp
+        analysis = apply_open_signals(db, tracking_id, signals, send_time, campaign_email, tracker)
+
+        logger.debug(f"CONFIDENCE_ANALYSIS: {analysis['confidence_score']:.3f} for {tracking_id} ({analysis['total_signals']} signals)", extra={
+            "tracking_id": tracking_id,
+            "confidence_score": analysis['confidence_score'],
+            "threshold_met": analysis['is_opened'],
+            "total_signals": analysis['total_signals']
+        })
+
+        # A browser view is an explicit open whatever the score says
+        opened = analysis['is_opened'] or any(s.signal_type == 'view_browser' for s in signals)
+        if campaign_email and opened:
+            # Conditional so an email only ever counts once towards today's opens
+            if db.query(CampaignEmail).filter(
+                CampaignEmail.id == campaign_email.id,
+                or_(CampaignEmail.opens == 0, CampaignEmail.opens.is_(None))
+            ).update({CampaignEmail.opens: 1}, synchronize_session=False):
+                newly_opened_ids.append(campaign_email.id)
+                activity.append((EMAIL_OPENED, campaign_email.id, signals[-1].timestamp, {"tracking_id": tracking_id}))
+
+    newly_clicked_ids = []
+    for email_id, clicks in clicks_by_email.items():
+        # First clicks are told apart so the campaign stats count each clicked email once
+        if db.query(CampaignEmail).filter(
+            CampaignEmail.id == email_id,
+            or_(CampaignEmail.clicks == 0, CampaignEmail.clicks.is_(None))
+        ).update({CampaignEmail.clicks: clicks}, synchronize_session=False):
+            newly_clicked_ids.append(email_id)
+        else:
+            db.query(CampaignEmail).filter(CampaignEmail.id == email_id).update(
+                {CampaignEmail.clicks: CampaignEmail.clicks + clicks}, synchronize_session=False
+            )
+
+    opens_by_campaign = _opens_by_campaign(db, newly_opened_ids)
+    record_engagement(db, newly_opened_ids, newly_clicked_ids)
+    record_email_activity(db, activity)
+    db.commit()
+    # Plain signals only move open scores; cached views change with new opens and clicks
+    if activity:
+        response_cache.invalidate(TRACKING)
+    newly_opened = len(newly_opened_ids)
+
+    # Daily totals go through the sharded counters rather than one hot daily_stats row
+    bucket = day_bucket()
+    counters.incr(DAILY_EMAILS_OPENED, bucket, newly_opened)
+    counters.incr(DAILY_LINKS_CLICKED, bucket, sum(clicks_by_email.values()))
+    for campaign_id, opens in opens_by_campaign.items():
+        counters.incr(CAMPAIGN_EMAIL_OPENS, campaign_bucket(campaign_id), opens)
+    return {"events": len(hits), "emails": len(signals_by_id), "newly_opened": newly_opened}
+
+def make_hit(kind: str, tracking_id: str, signal_type: str, user_agent: str, ip_address: str,
+             **fields) -> Optional[TrackingHit]:
+    """Build a hit, verifying signed tokens up front; None for a token that fails verification"""
+    claims = decode_tracking_token(tracking_id)
+    if claims is None and is_tracking_token(tracking_id):
+        return None
+    return TrackingHit(kind, tracking_id, signal_type, user_agent, ip_address, claims=claims, **fields)
+
+def hit_to_record(hit: TrackingHit) -> Dict:
+    """Spool form of a hit; claims are re-derived from the token when it is read back"""
+    return {
+        "kind": hit.kind,
+        "tracking_id": hit.tracking_id,
+        "signal_type": hit.signal_type,
+        "user_agent": hit.user_agent,
+        "ip_address": hit.ip_address,
+        "seen_at": hit.seen_at.isoformat(),
+        "url": hit.url,
+        "referer": hit.referer,
+        "spooled_at": time.time()
+    }
+
+def hit_from_record(record: Dict) -> Optional[TrackingHit]:
+    hit = make_hit(
+        record["kind"], record["tracking_id"], record["signal_type"], record["user_agent"], record["ip_address"],
+        seen_at=datetime.fromisoformat(record["seen_at"]), url=record.get("url"), referer=record.get("referer")
+    )
+    if hit is not None:
+        # Lag is measured from when the hit was first spooled, not from when it was read back
+        hit.enqueued_at = time.monotonic() - max(0.0, time.time() - record.get("spooled_at", time.time()))
+    return hit
+
+def _is_outage(error: Exception) -> bool:
+    """Errors that say the database is unreachable rather than that the hits are bad"""
+    return isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError)) or \
+        getattr(error, "connection_invalidated", False)
+
+def _percentiles(samples) -> Dict[str, Optional[float]]:
+    samples = sorted(samples)
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    pick = lambda p: samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+    return {"p50": round(pick(0.50), 2), "p95": round(pick(0.95), 2), "max": round(samples[-1], 2)}
+
+class TrackingIngestBuffer:
+    """
+    Write-behind buffer between the tracking endpoints and the database
+
+    Endpoints submit a TrackingHit and return straight away; a background thread
+    applies queued hits with process_hits every `flush_interval_ms` or as soon as
+    `max_batch` are waiting. When write-behind is disabled, or the queue is full, hits
+    are applied synchronously instead so none are dropped. stop() drains the queue.
+
+    Hits that must survive a crash (link clicks) go through submit_deferred() into the
+    on-disk `spool` instead; the flusher seals and applies spooled segments on every
+    tick and keeps them on disk, backing off, while the database is unreachable.
+    """
+
+    def __init__(self, enabled: bool = True, flush_interval_ms: int = 250, max_batch: int = 500,
+                 max_queue: int = 10000, tracker: ModernOpenTracker = modern_tracker,
+                 spool: Optional[HitSpool] = None, spool_max_backoff_seconds: float = 30):
+        self.enabled = enabled
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self.tracker = tracker
+        self.spool = spool
+        self.spool_max_backoff_seconds = spool_max_backoff_seconds
+        self._spool_lock = threading.Lock()
+        self._spool_outages = 0
+        self._spool_retry_at = 0.0
+        self._queue: "queue.Queue[TrackingHit]" = queue.Queue(maxsize=max_queue)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._flush_ms: Deque[float] = deque(maxlen=500)
+        self._lag_ms: Deque[float] = deque(maxlen=2000)
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.synchronous = 0
+        self.last_flush_at: Optional[datetime] = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._prepare_spool()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="tracking-flusher", daemon=True)
+            self._thread.start()
+        logger.info("Tracking flusher started", extra={
+            "flush_interval_ms": self.flush_interval_ms,
+            "max_batch": self.max_batch
+        })
+
+    def _prepare_spool(self):
+        if self.spool is None:
+            return
+        try:
+            self.spool.prepare()
+        except OSError as e:
+            logger.error(f"Cannot use tracking spool directory {self.spool.directory!r}; clicks will not survive a crash", extra={
+                "error": str(e)
+            })
+            self.spool = None
+
+    def stop(self, timeout: float = 10):
+        """Stop the flusher and apply everything still queued"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        while self.flush():
+            pass
+        self.drain_spool(force=True)
+        logger.info("Tracking flusher stopped", extra={"processed": self.processed, "failed": self.failed})
+
+    def _enqueue(self, hit: TrackingHit) -> bool:
+        """Queue a hit for the flusher; False means the caller must write it itself"""
+        with self._stats_lock:
+            self.submitted += 1
+
+        if self.enabled and not self._stopping.is_set():
+            if not self._thread or not self._thread.is_alive():
+                self.start()
+            try:
+                self._queue.put_nowait(hit)
+                if self._queue.qsize() >= self.max_batch:
+                    self._wake.set()
+                return True
+            except queue.Full:
+                logger.warning("Tracking queue full; writing hit synchronously", extra={
+                    "queue_size": self._queue.maxsize
+                })
+
+        with self._stats_lock:
+            self.synchronous += 1
+        return False
+
+    def submit(self, hit: Optional[TrackingHit]):
+        """Queue a hit; None (a rejected token from make_hit) is ignored"""
+        if hit is None:
+            return
+        if not self._enqueue(hit):
+            self._apply([hit])
+
+    async def submit_async(self, hit: Optional[TrackingHit]):
+        """submit() for async handlers; a fallback write runs on the async engine, not a worker thread"""
+        if hit is None or self._enqueue(hit):
+            return
+
+        started = time.monotonic()
+        async with get_async_sessionmaker()() as db:
+            try:
+                await db.run_sync(process_hits, [hit], self.tracker)
+                applied, failed = 1, 0
+            except Exception as e:
+                await db.rollback()
+                applied, failed = 0, 1
+                logger.error("Dropping tracking hit that could not be recorded", extra={
+                    "tracking_id": hit.tracking_id,
+                    "signal_type": hit.signal_type,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+        self._record_flush([hit], applied, failed, started)
+
+    async def submit_deferred(self, hit: Optional[TrackingHit]):
+        """
+        Spool a hit on local disk for the flusher and return without touching the database
+
+        Recording is at-least-once: a spooled hit is applied after the response, retried
+        while the database is down and replayed after a crash. Falls back to submit_async()
+        when there is no spool or it cannot be written.
+        """
+        if hit is None:
+            return
+        if self.spool is not None:
+            try:
+                self.spool.append(hit_to_record(hit))
+                with self._stats_lock:
+                    self.submitted += 1
+                if not self._thread or not self._thread.is_alive():
+                    self.start()
+                return
+            except OSError as e:
+                logger.error("Could not spool tracking hit; recording it directly", extra={
+                    "tracking_id": hit.tracking_id,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+        await self.submit_async(hit)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval_ms / 1000)
+            self._wake.clear()
+            while self.flush() >= self.max_batch:
+                pass
+            try:
+                self.drain_spool()
+            except Exception as e:
+                logger.error("Draining the tracking spool failed", extra={
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+
+    def drain_spool(self, force: bool = False) -> int:
+        """
+        Seal this process's spool segment and apply every segment no other process holds
+
+        A segment is deleted once its hits are committed. If the database is unreachable the
+        rest of the segment stays on disk and draining pauses with exponential backoff
+        (skipped with `force`). Returns how many spooled hits were applied.
+        """
+        if self.spool is None or (not force and time.monotonic() < self._spool_retry_at):
+            return 0
+
+        applied = 0
+        with self._spool_lock:
+            self.spool.seal()
+            for path, records in self.spool.claim():
+                hits = [hit for hit in map(hit_from_record, records) if hit is not None]
+                left = []
+                for start in range(0, len(hits), self.max_batch):
+                    if not self._apply(hits[start:start + self.max_batch], keep_on_outage=True):
+                        left = hits[start:]
+                        break
+                applied += len(hits) - len(left)
+
+                if not left:
+                    self.spool.done(path)
+                    self._spool_outages = 0
+                    continue
+
+                # Keep what was not committed; re-spool only if part of the segment went through
+                if len(left) < len(hits):
+                    self.spool.write_segment([hit_to_record(hit) for hit in left])
+                    self.spool.done(path)
+                self._spool_outages += 1
+                backoff = min(self.spool_max_backoff_seconds, 0.5 * 2 ** self._spool_outages)
+                self._spool_retry_at = time.monotonic() + backoff
+                logger.warning("Database unavailable; spooled tracking hits kept for a later flush", extra={
+                    "kept": len(left),
+                    "retry_in_seconds": backoff
+                })
+                break
+        return applied
+
+    def flush(self) -> int:
+        """Apply up to one batch of queued hits; returns how many were taken off the queue"""
+        with self._flush_lock:
+            hits = []
+            while len(hits) < self.max_batch:
+                try:
+                    hits.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if hits:
+                self._apply(hits)
+            return len(hits)
+
+    def _apply(self, hits: List[TrackingHit], keep_on_outage: bool = False) -> bool:
+        """
+        Apply hits in one transaction, retrying them one by one if the batch fails
+
+        With `keep_on_outage`, a batch that fails because the database is unreachable is
+        left unapplied and False is returned so the caller can keep the hits.
+        """
+        started = time.monotonic()
+        db = SessionLocal()
+        try:
+            try:
+                process_hits(db, hits, self.tracker)
+                applied, failed = len(hits), 0
+            except Exception as e:
+                db.rollback()
+                if keep_on_outage and _is_outage(e):
+                    return False
+                logger.error("Tracking batch failed; retrying hits one by one", extra={
+                    "batch_size": len(hits),
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+                applied, failed = self._apply_individually(db, hits)
+        finally:
+            db.close()
+        self._record_flush(hits, applied, failed, started)
+        return True
+
+    def _record_flush(self, hits: List[TrackingHit], applied: int, failed: int, started: float):
+        finished = time.monotonic()
+        with self._stats_lock:
+            self.batches += 1
+            self.processed += applied
+            self.failed += failed
+            self.last_flush_at = datetime.utcnow()
+            self._flush_ms.append((finished - started) * 1000)
+            self._lag_ms.extend((finished - hit.enqueued_at) * 1000 for hit in hits)
+
+    def _apply_individually(self, db: Session, hits: List[TrackingHit]):
+        applied = failed = 0
+        for hit in hits:
+            try:
+                process_hits(db, [hit], self.tracker)
+                applied += 1
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                logger.error("Dropping tracking hit that could not be recorded", extra={
+                    "tracking_id": hit.tracking_id,
+                    "signal_type": hit.signal_type,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+        return applied, failed
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "running": bool(self._thread and self._thread.is_alive()),
+                "flush_interval_ms": self.flush_interval_ms,
+                "max_batch": self.max_batch,
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "synchronous": self.synchronous,
+                "batches": self.batches,
+                "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+                "flush_ms": _percentiles(self._flush_ms),
+                # Time from submit to commit, i.e. how stale the open/click counters can be
+                "lag_ms": _percentiles(self._lag_ms),
+                "spool": self.spool.stats() if self.spool is not None else None
+            }
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def create_click_spool() -> Optional[HitSpool]:
+    """
+    Spool under TRACKING_CLICK_SPOOL_DIR (relative paths are taken from the backend
+    directory; default backend/spool/clicks). An empty value records clicks through the
+    in-memory queue. The directory is created when the flusher starts.
+    """
+    directory = os.getenv("TRACKING_CLICK_SPOOL_DIR", os.path.join("spool", "clicks"))
+    if not directory:
+        return None
+    return HitSpool(os.path.join(BACKEND_DIR, directory),
+                    fsync=os.getenv("TRACKING_SPOOL_FSYNC", "false").lower() == "true")
+
+tracking_ingest = TrackingIngestBuffer(
+    enabled=os.getenv("TRACKING_WRITE_BEHIND", "true").lower() == "true",
+    flush_interval_ms=int(os.getenv("TRACKING_FLUSH_INTERVAL_MS", 250)),
+    max_batch=int(os.getenv("TRACKING_FLUSH_MAX_EVENTS", 500)),
+    max_queue=int(os.getenv("TRACKING_QUEUE_SIZE", 10000)),
+    spool=create_click_spool()
+)
@@ -0,0 +1,288 @@
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import case, func, text
+import os
+import re
+
+from models import CampaignEmail, EmailOpenAnalysis, EmailTrackingEvent, LinkClick, TrackingEventRollup
+from models.partitioning import PARTITION_MONTHS_AHEAD, add_months, create_month_partition_sql, month_start
+from modern_tracking_service import modern_tracker
+from services.open_analysis import rebuild_open_analysis
+from services.tracking_tokens import decode_tracking_token
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# Months of raw rows kept, counting the current month; 0 keeps everything
+TRACKING_EVENT_RETENTION_MONTHS = int(os.getenv("TRACKING_EVENT_RETENTION_MONTHS", 6))
+LINK_CLICK_RETENTION_MONTHS = int(os.getenv("LINK_CLICK_RETENTION_MONTHS", 24))
+
+PARTITIONED_TABLES = ("email_tracking_events", "link_clicks")
+RETENTION_MONTHS = {"email_tracking_events": TRACKING_EVENT_RETENTION_MONTHS, "link_clicks": LINK_CLICK_RETENTION_MONTHS}
+MODELS = {"email_tracking_events": EmailTrackingEvent, "link_clicks": LinkClick}
+
+_PARTITION_MONTH = re.compile(r"_y(\d{4})m(\d{2})$")
+
+def _chunks(values: List, size: int = 1000) -> Iterable[List]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def is_partitioned(db: Session, table_name: str) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table"
+    ), {"table": table_name}).first() is not None
+
+def list_month_partitions(db: Session, table_name: str) -> List[Tuple[date, str, int]]:
+    """(month, partition name, estimated rows) of a table's monthly partitions, oldest first"""
+    rows = db.execute(text(
+        "SELECT c.relname, c.reltuples FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table_name}).all()
+    partitions = []
+    for name, estimated_rows in rows:
+        match = _PARTITION_MONTH.search(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name, max(int(estimated_rows), 0)))
+    return sorted(partitions)
+
+def unpartitioned_tables(db: Session) -> List[str]:
+    """Postgres tracking tables with retention configured that are still plain tables, so never expire"""
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    return [
+        table_name for table_name in PARTITIONED_TABLES
+        if RETENTION_MONTHS[table_name] > 0 and not is_partitioned(db, table_name)
+    ]
+
+def convert_to_partitioned(db: Session, table_name: str) -> Dict:
+    """
+    Turn a plain Postgres tracking table into the monthly-partitioned one; commits
+
+    In one transaction the table, its indexes and its id sequence are renamed with an
+    `_unpartitioned` suffix, the partitioned table is created from the model, a partition
+    is created for every month present in the old rows, the rows are copied across and
+    the id sequence is moved past them and the old table's plain indexes are recreated.
+    The old table is kept for the caller to check and drop. Writers to the table wait for
+    the whole copy.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        raise ValueError("Only Postgres tables can be partitioned")
+    if is_partitioned(db, table_name):
+        raise ValueError(f"{table_name} is already partitioned")
+
+    table = MODELS[table_name].__table__
+    time_column = table.info["partition_key"]
+    old_name = f"{table_name}_unpartitioned"
+
+    db.execute(text(f'LOCK TABLE "{table_name}" IN ACCESS EXCLUSIVE MODE'))
+    sequence = db.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table_name}).scalar()
+    indexes = db.execute(text(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table"
+    ), {"table": table_name}).all()
+    old_columns = set(db.execute(text(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = :table"
+    ), {"table": table_name}).scalars().all())
+
+    # The new table wants the same index, constraint and sequence names
+    db.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{old_name}"'))
+    for index_name, _ in indexes:
+        db.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:49]}_unpartitioned"'))
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {table_name}_id_seq_unpartitioned"))
+
+    table.create(bind=db.connection())
+    months = db.execute(text(
+        f'SELECT DISTINCT date_trunc(\'month\', COALESCE("{time_column}", created_at))::date FROM "{old_name}"'
+    )).scalars().all()
+    for month in months:
+        if month is not None:
+            db.execute(text(create_month_partition_sql(table_name, month)))
+
+    columns = [column.name for column in table.columns if column.name in old_columns]
+    select = ", ".join(
+        f'COALESCE("{name}", created_at, NOW())' if name == time_column else f'"{name}"' for name in columns
+    )
+    column_list = ", ".join(f'"{name}"' for name in columns)
+    copied = db.execute(text(
+        f'INSERT INTO "{table_name}" ({column_list}) SELECT {select} FROM "{old_name}"'
+    )).rowcount
+    db.execute(text(
+        f"SELECT setval(pg_get_serial_sequence(:table, 'id'), GREATEST(COALESCE(MAX(id), 0), 1)) FROM \"{table_name}\""
+    ), {"table": table_name})
+    # Recreate the old table's plain indexes; unique ones would need the partition key
+    for _, definition in indexes:
+        if definition.startswith("CREATE INDEX "):
+            db.execute(text(definition.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)))
+    db.commit()
+
+    logger.info("Converted tracking table to monthly partitions", extra={
+        "table": table_name,
+        "rows": copied,
+        "months": len(months),
+        "old_table": old_name
+    })
+    return {"table": table_name, "rows": copied, "months": len(months), "old_table": old_name}
+
+def ensure_partitions(db: Session, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create this month's and the next `months_ahead` months' partitions where missing"""
+    created = []
+    for table_name in PARTITIONED_TABLES:
+        if not is_partitioned(db, table_name):
+            continue
+        existing = {month for month, _, _ in list_month_partitions(db, table_name)}
+        for offset in range(months_ahead + 1):
+            month = add_months(month_start(), offset)
+            if month in existing:
+                continue
+            try:
+                db.execute(text(create_month_partition_sql(table_name, month)))
+                db.commit()
+                created.append(f"{table_name}:{month.isoformat()}")
+            except Exception as e:
+                # Usually rows for that month already sitting in the DEFAULT partition
+                db.rollback()
+                logger.error("Could not create tracking partition", extra={
+                    "table": table_name,
+                    "month": month.isoformat(),
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                }, exc_info=True)
+    return created
+
+def _ensure_open_analysis(db: Session, tracking_ids: List[str]) -> int:
+    """Build missing open analysis rows from raw events, which are about to be dropped"""
+    built = 0
+    for chunk in _chunks(tracking_ids):
+        have = {tracking_id for (tracking_id,) in db.query(EmailOpenAnalysis.tracking_id).filter(
+            EmailOpenAnalysis.tracking_id.in_(chunk), EmailOpenAnalysis.score_sum.isnot(None)
+        )}
+        for tracking_id in chunk:
+            if tracking_id in have:
+                continue
+            campaign_email = decode_tracking_token(tracking_id) or db.query(
+                CampaignEmail.id, CampaignEmail.lead_sequence_id, CampaignEmail.sent_at
+            ).filter(CampaignEmail.tracking_pixel_id == tracking_id).first()
+            if not campaign_email or not campaign_email.sent_at:
+                continue
+            signals = modern_tracker.store.load(tracking_id, db=db)
+            rebuild_open_analysis(db, tracking_id, signals, campaign_email.sent_at, campaign_email)
+            built += 1
+    return built
+
+def rollup_month(db: Session, month: date) -> int:
+    """
+    Summarise one month of raw tracking events and clicks into tracking_event_rollups
+
+    Idempotent: the month's rollups are replaced. Also makes sure every email in the month
+    has its running open analysis built while the raw events still exist. Commits.
+    """
+    start, end = month, add_months(month, 1)
+    timestamp = EmailTrackingEvent.timestamp
+    grouped = db.query(
+        EmailTrackingEvent.tracking_id,
+        EmailTrackingEvent.signal_type,
+        func.count(),
+        func.sum(case((EmailTrackingEvent.is_prefetch.is_(True), 1), else_=0)),
+        func.min(timestamp),
+        func.max(timestamp)
+    ).filter(timestamp >= start, timestamp < end).group_by(
+        EmailTrackingEvent.tracking_id, EmailTrackingEvent.signal_type
+    ).all()
+    clicks = dict(db.query(LinkClick.tracking_id, func.count()).filter(
+        LinkClick.clicked_at >= start, LinkClick.clicked_at < end
+    ).group_by(LinkClick.tracking_id).all())
+
+    summaries: Dict[str, Dict] = defaultdict(lambda: {
+        "event_count": 0, "prefetch_count": 0, "signal_counts": {}, "first_event_at": None, "last_event_at": None
+    })
+    for tracking_id, signal_type, events, prefetch, first_at, last_at in grouped:
+        summary = summaries[tracking_id]
+        summary["event_count"] += events
+        summary["prefetch_count"] += int(prefetch or 0)
+        summary["signal_counts"][signal_type] = events
+        summary["first_event_at"] = min(filter(None, (summary["first_event_at"], first_at)), default=None)
+        summary["last_event_at"] = max(filter(None, (summary["last_event_at"], last_at)), default=None)
+    for tracking_id in clicks:
+        summaries[tracking_id]
+
+    tracking_ids = list(summaries)
+    _ensure_open_analysis(db, tracking_ids)
+    email_ids = {}
+    for chunk in _chunks(tracking_ids):
+        email_ids.update(db.query(EmailOpenAnalysis.tracking_id, EmailOpenAnalysis.sequence_email_id).filter(
+            EmailOpenAnalysis.tracking_id.in_(chunk)
+        ).all())
+
+    db.query(TrackingEventRollup).filter(TrackingEventRollup.month == month).delete(synchronize_session=False)
+    db.bulk_insert_mappings(TrackingEventRollup, [
+        {
+            "month": month,
+            "tracking_id": tracking_id,
+            "sequence_email_id": email_ids.get(tracking_id),
+            "click_count": clicks.get(tracking_id, 0),
+            **summary
+        }
+        for tracking_id, summary in summaries.items()
+    ])
+    db.commit()
+
+    logger.info("Rolled up tracking events", extra={"month": month.isoformat(), "emails": len(summaries)})
+    return len(summaries)
+
+def apply_retention(db: Session, today: Optional[date] = None) -> Dict[str, List[str]]:
+    """
+    Drop monthly partitions older than the retention window, rolling tracking events up first
+
+    Whole partitions are dropped, never DELETEd from. Tables that are not partitioned
+    (SQLite, or a Postgres table created before partitioning) are left alone; the latter
+    are converted with partition_tracking_tables.py.
+    """
+    current = month_start(today)
+    dropped = []
+    for table_name, keep_months in (("email_tracking_events", TRACKING_EVENT_RETENTION_MONTHS),
+                                    ("link_clicks", LINK_CLICK_RETENTION_MONTHS)):
+        if keep_months <= 0 or not is_partitioned(db, table_name):
+            continue
+        cutoff = add_months(current, -(keep_months - 1))
+        for month, name, _ in list_month_partitions(db, table_name):
+            if month >= cutoff:
+                break
+            if table_name == "email_tracking_events":
+                rollup_month(db, month)
+            db.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            db.commit()
+            dropped.append(name)
+            logger.info("Dropped expired tracking partition", extra={"table": table_name, "partition": name})
+    return {"dropped": dropped}
+
+def maintain_tracking_partitions(db: Session) -> Dict:
+    """Scheduler job: create upcoming partitions, then apply retention"""
+    unpartitioned = unpartitioned_tables(db)
+    if unpartitioned:
+        logger.warning("Tracking tables are not partitioned, so retention never removes their rows; "
+                       "run partition_tracking_tables.py to convert them", extra={"tables": unpartitioned})
+    created = ensure_partitions(db)
+    return {"created": created, **apply_retention(db), "unpartitioned": unpartitioned}
+
+def partition_stats(db: Session) -> Dict:
+    unpartitioned = unpartitioned_tables(db)
+    return {
+        table_name: {
+            "partitioned": is_partitioned(db, table_name),
+            "retention_months": RETENTION_MONTHS[table_name],
+            "warning": (
+                "Not partitioned: retention is configured but cannot drop anything; run partition_tracking_tables.py"
+                if table_name in unpartitioned else None
+            ),
+            "partitions": [
+                {"month": month.isoformat(), "name": name, "estimated_rows": rows}
+                for month, name, rows in (list_month_partitions(db, table_name) if is_partitioned(db, table_name) else [])
+            ]
+        }
+        for table_name in PARTITIONED_TABLES
+    }
@@ -0,0 +1,162 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+import os
+
+from database import SessionLocal
+from models import EmailTrackingEvent
+from services.ttl_cache import TTLCache
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+@dataclass
+class TrackingSignal:
+    event_type: str
+    signal_type: str
+    confidence: float
+    metadata: Dict
+    timestamp: datetime
+
+class SignalStore(ABC):
+    """Where ModernOpenTracker keeps the signals it scores opens from"""
+
+    @abstractmethod
+    def append(self, tracking_id: str, signal: TrackingSignal, send_time: datetime,
+               db: Optional[Session] = None):
+        """Store one signal"""
+
+    def append_many(self, signals: List[Tuple[str, TrackingSignal, datetime]], db: Optional[Session] = None):
+        """Store (tracking_id, signal, send_time) triples in one go"""
+        for tracking_id, signal, send_time in signals:
+            self.append(tracking_id, signal, send_time, db=db)
+
+    @abstractmethod
+    def load(self, tracking_id: str, db: Optional[Session] = None) -> List[TrackingSignal]:
+        """Every signal stored for a tracking id, oldest first"""
+
+    def stats(self) -> Dict:
+        return {}
+
+class MemorySignalStore(SignalStore):
+    """Per-process store for scripts and local runs; bounded, but neither durable nor shared"""
+
+    def __init__(self, maxsize: int = 10000, ttl_seconds: float = 3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds, name="tracking_signals")
+
+    def append(self, tracking_id: str, signal: TrackingSignal, send_time: datetime,
+               db: Optional[Session] = None):
+        self.cache.set(tracking_id, self.cache.get(tracking_id, []) + [signal])
+
+    def load(self, tracking_id: str, db: Optional[Session] = None) -> List[TrackingSignal]:
+        return list(self.cache.get(tracking_id, []))
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+class DatabaseSignalStore(SignalStore):
+    """
+    Signals persisted as email_tracking_events rows, with an LRU/TTL cache in front
+
+    The table is the source of truth, so every worker and every restart scores the same
+    signals. Cache entries remember the event ids they include; a load fetches rows from
+    `reorder_window` ids below the highest one and keeps those not seen yet. Ids are taken
+    before commit, so with several flushers a lower id can become visible after a higher
+    one was read; the window picks such rows up instead of skipping them.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl_seconds: float = 3600, reorder_window: int = 10000):
+        self.cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds, name="tracking_signals")
+        self.reorder_window = reorder_window
+
+    def append(self, tracking_id: str, signal: TrackingSignal, send_time: datetime,
+               db: Optional[Session] = None):
+        """Add the event to `db` (flushed; the caller commits) or, without a session, commit it directly"""
+        self.append_many([(tracking_id, signal, send_time)], db=db)
+
+    def _to_event(self, tracking_id: str, signal: TrackingSignal, send_time: datetime) -> EmailTrackingEvent:
+        return EmailTrackingEvent(
+            tracking_id=tracking_id,
+            event_type=signal.event_type,
+            signal_type=signal.signal_type,
+            ip_address=signal.metadata.get("ip_address"),
+            user_agent=signal.metadata.get("user_agent"),
+            timestamp=signal.timestamp,
+            delay_from_send=int((signal.timestamp - send_time).total_seconds()),
+            is_prefetch=signal.confidence < 0.3,
+            confidence_score=round(signal.confidence, 2),
+            # user_agent/ip_address already have columns; don't store them twice per hit
+            event_metadata={
+                **{key: value for key, value in signal.metadata.items() if key not in ("user_agent", "ip_address")},
+                "confidence": signal.confidence
+            }
+        )
+
+    def append_many(self, signals: List[Tuple[str, TrackingSignal, datetime]], db: Optional[Session] = None):
+        events = [self._to_event(*entry) for entry in signals]
+        if db is not None:
+            db.add_all(events)
+            db.flush()
+            return
+
+        own_db = SessionLocal()
+        try:
+            own_db.add_all(events)
+            own_db.commit()
+        finally:
+            own_db.close()
+
+    def _to_signal(self, event: EmailTrackingEvent) -> TrackingSignal:
+        metadata = {"user_agent": event.user_agent, "ip_address": event.ip_address, **(event.event_metadata or {})}
+        confidence = metadata.get("confidence")
+        if confidence is None:
+            confidence = float(event.confidence_score or 0.0)
+        return TrackingSignal(
+            event_type=event.event_type,
+            signal_type=event.signal_type,
+            confidence=confidence,
+            metadata=metadata,
+            timestamp=event.timestamp
+        )
+
+    def load(self, tracking_id: str, db: Optional[Session] = None) -> List[TrackingSignal]:
+        # Cached as (event id, signal) pairs in id order
+        entries = self.cache.get(tracking_id, ())
+        seen = {event_id for event_id, _ in entries}
+        last_event_id = entries[-1][0] if entries else 0
+
+        own_db = None
+        if db is None:
+            db = own_db = SessionLocal()
+        try:
+            newer = [event for event in db.query(EmailTrackingEvent).filter(
+                EmailTrackingEvent.tracking_id == tracking_id,
+                EmailTrackingEvent.id > max(last_event_id - self.reorder_window, 0)
+            ).order_by(EmailTrackingEvent.id.asc()) if event.id not in seen]
+        finally:
+            if own_db is not None:
+                own_db.close()
+
+        if newer:
+            entries = tuple(sorted(entries + tuple((event.id, self._to_signal(event)) for event in newer),
+                                   key=lambda entry: entry[0]))
+        if entries:
+            self.cache.set(tracking_id, entries)
+        return [signal for _, signal in entries]
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+def create_signal_store() -> SignalStore:
+    """Store named by TRACKING_SIGNAL_STORE ("database" or "memory")"""
+    kind = os.getenv("TRACKING_SIGNAL_STORE", "database")
+    maxsize = int(os.getenv("TRACKING_SIGNAL_CACHE_SIZE", 10000))
+    ttl_seconds = float(os.getenv("TRACKING_SIGNAL_CACHE_TTL_SECONDS", 3600))
+
+    if kind == "memory":
+        return MemorySignalStore(maxsize=maxsize, ttl_seconds=ttl_seconds)
+    if kind != "database":
+        logger.warning(f"Unknown TRACKING_SIGNAL_STORE {kind!r}; using the database store")
+    return DatabaseSignalStore(maxsize=maxsize, ttl_seconds=ttl_seconds)
@@ -0,0 +1,151 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+
+from services.leases import WORKER_ID
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+class HitSpool:
+    """
+    Append-only JSON-lines spool on local disk for hits that must not be lost
+
+    Each process appends to its own `.open` segment, which it holds an exclusive flock
+    on. seal() renames the segment to `.jsonl` so any process can claim it; a claimed
+    segment is deleted only after its hits are committed. Segments left `.open` by a
+    process that died are unlocked by the kernel and claimed like sealed ones, so a
+    crash at worst replays hits (at-least-once), never drops them.
+
+    The directory is created by prepare(), which the app calls at startup.
+    """
+
+    def __init__(self, directory: str, fsync: bool = False, worker_id: str = WORKER_ID):
+        self.directory = directory
+        self.fsync = fsync
+        self.worker_id = re.sub(r"[^A-Za-z0-9_-]", "_", worker_id)
+        self._lock = threading.Lock()
+        self._file = None
+        self._path: Optional[str] = None
+        self._records = 0
+        self._seq = 0
+        self.appended = 0
+        self.replayed = 0
+        self.segments_done = 0
+
+    def prepare(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _segment_name(self, suffix: str) -> str:
+        self._seq += 1
+        return os.path.join(self.directory, f"{time.time_ns()}-{self.worker_id}-{self._seq}{suffix}")
+
+    def append(self, record: Dict):
+        """Write one record to this process's segment; returns once the write reached the OS (or disk, with fsync)"""
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._path = self._segment_name(".open")
+                self._file = open(self._path, "a", encoding="utf-8")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._records += 1
+            self.appended += 1
+
+    def seal(self):
+        """Hand the current segment over to the drainers; the next append starts a new one"""
+        with self._lock:
+            if self._file is None:
+                return
+            os.rename(self._path, self._path[:-len(".open")] + ".jsonl")
+            self._file.close()
+            self._file, self._path, self._records = None, None, 0
+
+    def write_segment(self, records: List[Dict]):
+        """Spool records as an already sealed segment, e.g. hits that could not be applied yet"""
+        if not records:
+            return
+        with self._lock:
+            path = self._segment_name(".jsonl")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+
+    def _candidates(self) -> List[str]:
+        with self._lock:
+            own = self._path
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in names
+            if name.endswith(".jsonl") or (name.endswith(".open") and os.path.join(self.directory, name) != own)
+        )
+
+    def claim(self) -> Iterator[Tuple[str, List[Dict]]]:
+        """
+        Yield (path, records) for each segment nobody else holds, oldest first
+
+        The segment stays locked while the caller applies it; the caller calls done(path)
+        once the records are committed (or re-spooled). A torn last line from a crash is skipped.
+        """
+        for path in self._candidates():
+            try:
+                f = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                # Another process may have finished and deleted it between our open and lock
+                try:
+                    if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+
+                records = []
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        logger.warning("Skipping unreadable spool line", extra={"segment": path})
+                self.replayed += len(records)
+                yield path, records
+            finally:
+                f.close()
+
+    def done(self, path: str):
+        """Delete a claimed segment; call while it is still claimed"""
+        os.unlink(path)
+        self.segments_done += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                names = []
+            return {
+                "directory": self.directory,
+                "fsync": self.fsync,
+                "segments_waiting": sum(1 for name in names if name.endswith((".jsonl", ".open"))),
+                "open_segment_records": self._records,
+                "appended": self.appended,
+                "replayed": self.replayed,
+                "segments_done": self.segments_done
+            }
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+import base64
+import hashlib
+import hmac
+import os
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+TOKEN_PREFIX = "t1"
+
+@dataclass(frozen=True)
+class TrackingClaims:
+    """What a signed tracking token says about the email it was sent in"""
+    campaign_email_id: int
+    lead_sequence_id: int
+    campaign_id: int
+    sent_at: datetime
+
+    # Same attribute names as CampaignEmail, so claims can stand in for the row
+    @property
+    def id(self) -> int:
+        return self.campaign_email_id
+
+def _secret() -> Optional[bytes]:
+    secret = os.getenv("TRACKING_TOKEN_SECRET") or os.getenv("SECRET_KEY")
+    return secret.encode("utf-8") if secret else None
+
+def _sign(payload: str, secret: bytes) -> str:
+    digest = hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+def issue_tracking_token(campaign_email_id: int, lead_sequence_id: int, campaign_id: int,
+                         sent_at: datetime) -> Optional[str]:
+    """
+    Compact HMAC-signed tracking token, e.g. t1.2a.f.3.6720abcd.<signature>
+
+    Ids and the send time (epoch seconds, UTC) are hex encoded so the token stays short
+    and URL-safe. Returns None when no signing secret is configured; the caller keeps
+    using the draft's random tracking id then.
+    """
+    secret = _secret()
+    if not secret:
+        return None
+    epoch = int(sent_at.replace(tzinfo=timezone.utc).timestamp())
+    payload = f"{TOKEN_PREFIX}.{campaign_email_id:x}.{lead_sequence_id:x}.{campaign_id:x}.{epoch:x}"
+    return f"{payload}.{_sign(payload, secret)}"
+
+def is_tracking_token(tracking_id: str) -> bool:
+    return bool(tracking_id) and tracking_id.startswith(f"{TOKEN_PREFIX}.")
+
+def decode_tracking_token(tracking_id: str) -> Optional[TrackingClaims]:
+    """Verified claims of a signed token; None for legacy UUIDs and for tokens that fail verification"""
+    if not is_tracking_token(tracking_id):
+        return None
+
+    secret = _secret()
+    payload, _, signature = tracking_id.rpartition(".")
+    if not secret or not hmac.compare_digest(signature, _sign(payload, secret)):
+        logger.warning("Rejected tracking token with a bad signature", extra={"tracking_id": tracking_id[:64]})
+        return None
+
+    try:
+        _, campaign_email_id, lead_sequence_id, campaign_id, epoch = payload.split(".")
+        return TrackingClaims(
+            campaign_email_id=int(campaign_email_id, 16),
+            lead_sequence_id=int(lead_sequence_id, 16),
+            campaign_id=int(campaign_id, 16),
+            sent_at=datetime.fromtimestamp(int(epoch, 16), tz=timezone.utc).replace(tzinfo=None)
+        )
+    except ValueError:
+        logger.warning("Rejected malformed tracking token", extra={"tracking_id": tracking_id[:64]})
+        return None
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Open Scoring What-If Script
+
+Rescores every stored tracking event under alternative weights/thresholds and prints
+per-campaign open rates next to the current rules. Scoring is vectorised with NumPy
+(services/open_scoring.py), so a full-history run is one table scan plus a few array
+operations. Nothing is written to the database.
+
+Example:
+    python simulate_open_scoring.py --threshold 0.4 --weight logo=0.6 --client apple_mpp=0.3
+"""
+
+import sys
+import os
+import json
+import argparse
+from typing import Dict
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import SessionLocal
+from services.open_scoring import ScoringParams, simulate_open_rates
+
+def _pairs(values, cast=float) -> Dict:
+    pairs = {}
+    for value in values or []:
+        key, _, number = value.partition("=")
+        if not key or not number:
+            raise argparse.ArgumentTypeError(f"expected key=value, got {value!r}")
+        pairs[key] = cast(number)
+    return pairs
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "yes", "true")
+
+def print_report(report: Dict):
+    print(f"📊 {report['signals']} signals across {report['emails_with_signals']} emails "
+          f"(threshold {report['open_threshold']}, {report['elapsed_ms']}ms)")
+    print(f"   {report['emails_changed']} emails change opened/not-opened")
+    print()
+    print(f"{'Campaign':<30} {'Sent':>7} {'Recorded':>9} {'Current':>9} {'Simulated':>10} {'Change':>8}")
+    for row in report["campaigns"] + [{"campaign_name": "All campaigns", **report["totals"]}]:
+        print(f"{row['campaign_name'][:30]:<30} {row['emails_sent']:>7} {row['recorded_opens']:>9} "
+              f"{row['baseline_open_rate']:>8.1f}% {row['simulated_open_rate']:>9.1f}% {row['open_rate_change']:>+7.1f}%")
+    print()
+    print("Simulated confidence histogram (0.0 → 1.0):", report["confidence_histogram"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate open rates under different open scoring parameters")
+    parser.add_argument("--campaign", type=int, default=None, help="Only this campaign id")
+    parser.add_argument("--threshold", type=float, default=None, help="Open confidence threshold")
+    parser.add_argument("--weight", action="append", metavar="TYPE=WEIGHT", help="Signal type weight (repeatable)")
+    parser.add_argument("--client", action="append", metavar="LABEL=CONF", help="Client label confidence (repeatable)")
+    parser.add_argument("--automated", action="append", metavar="LABEL=yes|no",
+                        help="Treat a client label as prefetch or not (repeatable)")
+    parser.add_argument("--prefetch-penalty", type=float, default=None)
+    parser.add_argument("--prefetch-timing-factor", type=float, default=None)
+    parser.add_argument("--diversity-bonus", type=float, default=None, help="Bonus per distinct signal type")
+    parser.add_argument("--diversity-cap", type=float, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+
+    args = parser.parse_args()
+    try:
+        params = ScoringParams.from_tracker().with_overrides(
+            open_threshold=args.threshold,
+            signal_weights=_pairs(args.weight),
+            client_confidences=_pairs(args.client),
+            automated_clients=_pairs(args.automated, cast=_flag),
+            prefetch_penalty=args.prefetch_penalty,
+            prefetch_timing_factor=args.prefetch_timing_factor,
+            diversity_bonus_per_type=args.diversity_bonus,
+            diversity_bonus_cap=args.diversity_cap
+        )
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    db = SessionLocal()
+    try:
+        report = simulate_open_rates(db, params, campaign_id=args.campaign)
+    finally:
+        db.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -85,6 +85,22 @@ CREATE TABLE sending_profiles (
     sender_website VARCHAR(255),
     signature TEXT,
     is_default BOOLEAN DEFAULT FALSE,
+    -- Send pacing policy (seconds)
+    pacing_initial_delay_min INTEGER DEFAULT 5,
+    pacing_initial_delay_max INTEGER DEFAULT 60,
+    pacing_base_delay INTEGER DEFAULT 30,
+    pacing_delay_increment INTEGER DEFAULT 10,
+    pacing_jitter_min INTEGER DEFAULT -15,
+    pacing_jitter_max INTEGER DEFAULT 60,
+    pacing_min_delay INTEGER DEFAULT 15,
+    pacing_max_delay INTEGER DEFAULT 400,
+    -- Own mailbox (secrets Fernet-encrypted with CREDENTIALS_ENCRYPTION_KEY); NULL uses the GMAIL_* mailbox
+    gmail_client_id VARCHAR(255),
+    gmail_client_secret_encrypted TEXT,
+    gmail_refresh_token_encrypted TEXT,
+    -- Per-mailbox quotas; NULL falls back to DAILY_EMAIL_LIMIT / HOURLY_EMAIL_LIMIT
+    daily_send_limit INTEGER,
+    hourly_send_limit INTEGER,
     created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
 );
@@ -100,6 +116,7 @@ CREATE TABLE email_sequences (
     description TEXT,
     sending_profile_id INTEGER REFERENCES sending_profiles(id),
     status VARCHAR(50) DEFAULT 'active',
+    email_opens INTEGER DEFAULT 0, -- legacy total; newer opens are in counter_shards (campaign.email_opens)
     created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
 );
@@ -117,7 +134,8 @@ CREATE TABLE sequence_steps (
     delay_hours INTEGER DEFAULT 0,
     is_active BOOLEAN DEFAULT TRUE,
     include_previous_emails BOOLEAN DEFAULT FALSE,
-    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
 );
 
 -- Lead enrollment in sequences
@@ -132,6 +150,8 @@ CREATE TABLE lead_sequences (
     next_send_at TIMESTAMP WITHOUT TIME ZONE,
     completed_at TIMESTAMP WITHOUT TIME ZONE,
     stop_reason VARCHAR(255),
+    claimed_by VARCHAR(255), -- worker currently holding the scheduling lease
+    lease_expires_at TIMESTAMP WITHOUT TIME ZONE,
     created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
     UNIQUE(lead_id, sequence_id)
@@ -142,9 +162,15 @@ CREATE TABLE sequence_emails (
     id SERIAL PRIMARY KEY,
     lead_sequence_id INTEGER REFERENCES lead_sequences(id) ON DELETE CASCADE,
     step_id INTEGER REFERENCES sequence_steps(id) ON DELETE CASCADE,
-    status VARCHAR(50) DEFAULT 'pending',
+    status VARCHAR(50) DEFAULT 'pending', -- pending, draft, invalidated, sent, failed
     subject VARCHAR(255),
     content TEXT,
+    spam_score DECIMAL(5,2),
+    spam_report TEXT,
+    spam_check_skipped BOOLEAN DEFAULT FALSE, -- generated while Rspamd was unavailable
+    generated_at TIMESTAMP WITHOUT TIME ZONE,
+    draft_fingerprint VARCHAR(64),
+    gmail_message_id VARCHAR(255),
     sent_at TIMESTAMP WITHOUT TIME ZONE,
     opens INTEGER DEFAULT 0,
     clicks INTEGER DEFAULT 0,
@@ -152,6 +178,78 @@ CREATE TABLE sequence_emails (
     created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
 );
 
+-- Queued runs of the send pipeline triggered through the API
+CREATE TABLE send_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    trigger VARCHAR(50) DEFAULT 'manual',
+    requested_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(50) DEFAULT 'queued', -- queued, generating, sending, done, failed
+    drafts_created INTEGER DEFAULT 0,
+    drafts_failed INTEGER DEFAULT 0,
+    slots_planned INTEGER DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITHOUT TIME ZONE,
+    finished_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+-- Sharded counters (daily sends/opens/clicks); a counter is the sum of its shards
+CREATE TABLE counter_shards (
+    name VARCHAR(64) NOT NULL,
+    bucket VARCHAR(64) NOT NULL, -- e.g. the day, YYYY-MM-DD
+    shard INTEGER NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (name, bucket, shard)
+);
+
+-- Running per-campaign/per-step totals behind the campaign list (step_number 0 = whole campaign)
+CREATE TABLE campaign_step_stats (
+    sequence_id INTEGER NOT NULL REFERENCES email_sequences(id) ON DELETE CASCADE,
+    step_number INTEGER NOT NULL,
+    enrolled INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    stopped INTEGER NOT NULL DEFAULT 0,
+    replied INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    opened INTEGER NOT NULL DEFAULT 0,
+    clicked INTEGER NOT NULL DEFAULT 0,
+    last_sent_at TIMESTAMP WITHOUT TIME ZONE,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (sequence_id, step_number)
+);
+
+-- Append-only dashboard activity feed, denormalised so the feed is a single range scan
+CREATE TABLE activity_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(32) NOT NULL, -- email_sent, email_opened, email_clicked, lead_unsubscribed
+    occurred_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    campaign_id INTEGER,
+    campaign_name VARCHAR(255),
+    lead_id INTEGER,
+    lead_email VARCHAR(255),
+    sequence_email_id INTEGER,
+    details JSON
+);
+
+-- Planned, paced send times for ready drafts (fired by the scheduler's dispatcher)
+CREATE TABLE send_slots (
+    id SERIAL PRIMARY KEY,
+    sending_profile_id INTEGER REFERENCES sending_profiles(id) ON DELETE SET NULL,
+    lead_sequence_id INTEGER REFERENCES lead_sequences(id) ON DELETE CASCADE,
+    sequence_email_id INTEGER REFERENCES sequence_emails(id) ON DELETE CASCADE,
+    send_job_id VARCHAR(36) REFERENCES send_jobs(id) ON DELETE SET NULL,
+    slot_index INTEGER DEFAULT 0,
+    scheduled_for TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    status VARCHAR(50) DEFAULT 'planned', -- planned, dispatching, sent, failed, cancelled, unconfirmed
+    error TEXT,
+    dispatched_at TIMESTAMP WITHOUT TIME ZONE,
+    gmail_message_id VARCHAR(255),
+    dispatch_started_at TIMESTAMP WITHOUT TIME ZONE,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+);
+
 -- ============================================================================
 -- EMAIL REPLIES AND INTERACTIONS
 -- ============================================================================
@@ -172,8 +270,11 @@ CREATE TABLE email_replies (
 -- ============================================================================
 
 -- Link clicks tracking
+-- link_clicks and email_tracking_events are range-partitioned by month (see
+-- services/tracking_partitions.py): the scheduler creates months ahead, rolls old
+-- tracking events up into tracking_event_rollups and drops expired partitions whole.
 CREATE TABLE link_clicks (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     tracking_id VARCHAR(255) NOT NULL,
     lead_sequence_id INTEGER REFERENCES lead_sequences(id) ON DELETE SET NULL,
     sequence_email_id INTEGER REFERENCES sequence_emails(id) ON DELETE SET NULL,
@@ -181,25 +282,62 @@ CREATE TABLE link_clicks (
     ip_address VARCHAR(45),
     user_agent TEXT,
     referer TEXT,
-    clicked_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
-    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-);
+    clicked_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, clicked_at)
+) PARTITION BY RANGE (clicked_at);
+
+CREATE TABLE link_clicks_default PARTITION OF link_clicks DEFAULT;
 
 -- Email tracking events (opens, etc.)
 CREATE TABLE email_tracking_events (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     tracking_id VARCHAR(255) NOT NULL,
     event_type VARCHAR(50) NOT NULL,
     signal_type VARCHAR(50) NOT NULL,
     ip_address VARCHAR(45),
     user_agent TEXT,
     referer TEXT,
-    timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
     delay_from_send INTEGER,
     is_prefetch BOOLEAN DEFAULT FALSE,
     confidence_score DECIMAL(3,2) DEFAULT 0.0,
-    event_metadata JSONB,
-    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
+    event_metadata JSONB, -- scoring details; user_agent/ip_address live in their columns only
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE email_tracking_events_default PARTITION OF email_tracking_events DEFAULT;
+
+-- Monthly partitions for the first months; the scheduler keeps creating them ahead
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR i IN 0..2 LOOP
+        month_start := (date_trunc('month', NOW()) + (i || ' months')::INTERVAL)::DATE;
+        EXECUTE format('CREATE TABLE %I PARTITION OF link_clicks FOR VALUES FROM (%L) TO (%L)',
+            'link_clicks_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+            month_start, (month_start + INTERVAL '1 month')::DATE);
+        EXECUTE format('CREATE TABLE %I PARTITION OF email_tracking_events FOR VALUES FROM (%L) TO (%L)',
+            'email_tracking_events_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+            month_start, (month_start + INTERVAL '1 month')::DATE);
+    END LOOP;
+END $$;
+
+-- Per-email monthly summaries of tracking events whose raw partition has expired
+CREATE TABLE tracking_event_rollups (
+    month DATE NOT NULL,
+    tracking_id VARCHAR(255) NOT NULL,
+    sequence_email_id INTEGER REFERENCES sequence_emails(id) ON DELETE SET NULL,
+    event_count INTEGER NOT NULL DEFAULT 0,
+    prefetch_count INTEGER NOT NULL DEFAULT 0,
+    click_count INTEGER NOT NULL DEFAULT 0,
+    signal_counts JSONB, -- {signal_type: events}
+    first_event_at TIMESTAMP WITHOUT TIME ZONE,
+    last_event_at TIMESTAMP WITHOUT TIME ZONE,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (month, tracking_id)
 );
 
 -- Email open analysis (aggregated tracking data)
@@ -217,6 +355,11 @@ CREATE TABLE email_open_analysis (
     unique_ip_count INTEGER DEFAULT 0,
     prefetch_signals INTEGER DEFAULT 0,
     human_signals INTEGER DEFAULT 0,
+    score_sum DOUBLE PRECISION, -- running stats; NULL until built from the signal history
+    timing_prefetch_signals INTEGER,
+    signal_type_mask INTEGER,
+    other_signal_types JSONB, -- signal types without a bit in signal_type_mask, by name
+    ip_sketch VARCHAR(64), -- 256-bit linear-counting bitmap of signal IPs, hex
     analysis_data JSONB,
     created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
@@ -272,6 +415,7 @@ CREATE INDEX idx_lead_sequences_lead_id ON lead_sequences(lead_id);
 CREATE INDEX idx_lead_sequences_sequence_id ON lead_sequences(sequence_id);
 CREATE INDEX idx_lead_sequences_status ON lead_sequences(status);
 CREATE INDEX idx_lead_sequences_next_send_at ON lead_sequences(next_send_at);
+CREATE INDEX idx_lead_sequences_lease_expires_at ON lead_sequences(lease_expires_at);
 
 -- Sequence emails indexes
 CREATE INDEX idx_sequence_emails_lead_sequence_id ON sequence_emails(lead_sequence_id);
@@ -279,6 +423,16 @@ CREATE INDEX idx_sequence_emails_step_id ON sequence_emails(step_id);
 CREATE INDEX idx_sequence_emails_status ON sequence_emails(status);
 CREATE INDEX idx_sequence_emails_tracking_pixel ON sequence_emails(tracking_pixel_id);
 CREATE INDEX idx_sequence_emails_sent_at ON sequence_emails(sent_at);
+CREATE INDEX idx_activity_events_occurred_at ON activity_events(occurred_at);
+-- Opened emails by send time, for /leads/opened-emails
+CREATE INDEX idx_sequence_emails_opened ON sequence_emails(sent_at, lead_sequence_id) WHERE opens > 0;
+
+-- Send slots indexes
+CREATE INDEX idx_send_slots_status_scheduled_for ON send_slots(status, scheduled_for);
+CREATE INDEX idx_send_slots_sending_profile_id ON send_slots(sending_profile_id);
+CREATE INDEX idx_send_slots_sequence_email_id ON send_slots(sequence_email_id);
+CREATE INDEX idx_send_slots_send_job_id ON send_slots(send_job_id);
+CREATE INDEX idx_send_jobs_status ON send_jobs(status);
 
 -- Email replies indexes
 CREATE INDEX idx_email_replies_lead_id ON email_replies(lead_id);
@@ -295,6 +449,8 @@ CREATE INDEX idx_email_tracking_events_tracking_id ON email_tracking_events(trac
 CREATE INDEX idx_email_tracking_events_event_type ON email_tracking_events(event_type);
 CREATE INDEX idx_email_tracking_events_timestamp ON email_tracking_events(timestamp);
 
+CREATE INDEX idx_tracking_event_rollups_sequence_email_id ON tracking_event_rollups(sequence_email_id);
+
 CREATE INDEX idx_email_open_analysis_tracking_id ON email_open_analysis(tracking_id);
 CREATE INDEX idx_email_open_analysis_lead_sequence_id ON email_open_analysis(lead_sequence_id);
 CREATE INDEX idx_email_open_analysis_sequence_email_id ON email_open_analysis(sequence_email_id);
@@ -316,9 +472,12 @@ COMMENT ON TABLE email_sequences IS 'Email campaigns with multiple steps (sequen
 COMMENT ON TABLE sequence_steps IS 'Individual steps within an email sequence';
 COMMENT ON TABLE lead_sequences IS 'Tracks which leads are enrolled in which sequences';
 COMMENT ON TABLE sequence_emails IS 'Individual email sends with actual content and tracking';
+COMMENT ON TABLE send_jobs IS 'Send pipeline runs queued by POST /campaigns/send and drained by the scheduler';
+COMMENT ON TABLE send_slots IS 'Jittered, progressively spaced send times planned per sending profile';
 COMMENT ON TABLE email_replies IS 'Replies received from leads';
 COMMENT ON TABLE link_clicks IS 'Tracks when links in emails are clicked';
 COMMENT ON TABLE email_tracking_events IS 'Raw tracking events for email opens and interactions';
+COMMENT ON TABLE tracking_event_rollups IS 'Monthly per-email summaries of expired raw tracking events';
 COMMENT ON TABLE email_open_analysis IS 'Aggregated analysis of email open behavior';
 COMMENT ON TABLE daily_stats IS 'Daily aggregated statistics for reporting';
 
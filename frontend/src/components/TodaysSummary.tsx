@@ -19,7 +19,7 @@ import { apiClient } from '../utils/api'
 
 interface ActivityEvent {
   id: number
-  type: 'email_sent' | 'email_opened' | 'email_clicked' | 'campaign_started' | 'lead_added'
+  type: 'email_sent' | 'email_opened' | 'email_clicked' | 'lead_unsubscribed' | 'campaign_started' | 'lead_added'
   title: string
   description: string
   timestamp: string
@@ -50,6 +50,7 @@ const getEventIcon = (type: string) => {
     case 'email_clicked': return MousePointer
     case 'campaign_started': return Zap
     case 'lead_added': return Target
+    case 'lead_unsubscribed': return AlertCircle
     default: return Activity
   }
 }
@@ -61,6 +62,7 @@ const getEventColor = (type: string) => {
     case 'email_clicked': return 'bg-purple-100 text-purple-600'
     case 'campaign_started': return 'bg-orange-100 text-orange-600'
     case 'lead_added': return 'bg-gray-100 text-gray-600'
+    case 'lead_unsubscribed': return 'bg-red-100 text-red-600'
     default: return 'bg-gray-100 text-gray-600'
   }
 }
@@ -78,6 +80,61 @@ const formatTimeAgo = (timestamp: string) => {
   return eventTime.toLocaleDateString()
 }
 
+const MAX_RECENT_EVENTS = 20
+const SUMMARY_REFRESH_MS = 5 * 60 * 1000
+const STREAM_RETRY_MS = 3000
+
+// Reads /api/dashboard/activity/stream (server-sent events) through fetch, since EventSource
+// can't send the Authorization header. Reconnects with Last-Event-ID so nothing is missed.
+const streamActivity = (onEvent: (event: ActivityEvent) => void) => {
+  const controller = new AbortController()
+  let lastEventId: string | null = null
+  let stopped = false
+
+  const connect = async () => {
+    while (!stopped) {
+      try {
+        const response = await apiClient.get('/api/dashboard/activity/stream', {
+          headers: lastEventId ? { 'Last-Event-ID': lastEventId } : {},
+          signal: controller.signal
+        })
+        if (!response.ok || !response.body) throw new Error(`Activity stream failed: ${response.status}`)
+        const reader = response.body.getReader()
+        const decoder = new TextDecoder()
+        let buffer = ''
+        while (true) {
+          const { done, value } = await reader.read()
+          if (done) break
+          buffer += decoder.decode(value, { stream: true })
+          const messages = buffer.split('\n\n')
+          buffer = messages.pop() || ''
+          for (const message of messages) {
+            let id: string | null = null
+            let data = ''
+            for (const line of message.split('\n')) {
+              if (line.startsWith('id: ')) id = line.slice(4)
+              else if (line.startsWith('data: ')) data += line.slice(6)
+            }
+            if (!data) continue
+            if (id) lastEventId = id
+            onEvent(JSON.parse(data))
+          }
+        }
+      } catch (error) {
+        if (stopped) return
+        console.error('Activity stream disconnected:', error)
+      }
+      await new Promise(resolve => setTimeout(resolve, STREAM_RETRY_MS))
+    }
+  }
+
+  connect()
+  return () => {
+    stopped = true
+    controller.abort()
+  }
+}
+
 export function TodaysSummary() {
   const [activity, setActivity] = useState<TodayActivity>({
     recent_events: [],
@@ -98,11 +155,28 @@ export function TodaysSummary() {
     }
   }
 
+  const addLiveEvent = (event: ActivityEvent) => {
+    setActivity(prev => {
+      if (prev.recent_events.some(existing => existing.id === event.id)) return prev
+      const hourly_send_rate = [...prev.hourly_send_rate]
+      if (event.type === 'email_sent') hourly_send_rate[parseInt(event.timestamp.slice(11, 13), 10)] += 1  // same (server) clock as the summary
+      return {
+        ...prev,
+        recent_events: [event, ...prev.recent_events].sort((a, b) => b.id - a.id).slice(0, MAX_RECENT_EVENTS),
+        hourly_send_rate
+      }
+    })
+  }
+
   useEffect(() => {
     fetchTodayActivity()
-    // Set up polling every 30 seconds for live updates
-    const interval = setInterval(fetchTodayActivity, 30000)
-    return () => clearInterval(interval)
+    // Events arrive over the activity stream; highlights and metrics only need an occasional refresh
+    const interval = setInterval(fetchTodayActivity, SUMMARY_REFRESH_MS)
+    const stopStream = streamActivity(addLiveEvent)
+    return () => {
+      clearInterval(interval)
+      stopStream()
+    }
   }, [])
 
   if (loading) {
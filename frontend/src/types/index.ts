@@ -50,6 +50,7 @@ export interface CampaignProgress {
   stopped_leads: number;
   replied_leads: number;
   avg_step: number;
+  email_opens: number;
 }
 
 export interface Campaign {